@@ -0,0 +1,229 @@
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+from Interpreter.Tokenizer.tokenizer import tokenize
+from Interpreter.Parser.parser import Parser
+from Interpreter.Parser.standardizer import StandardizeAST
+from Interpreter.Optimizer.optimizer import Optimizer
+from Interpreter.Environment.Environment import Environment
+from Interpreter.Environment.resolver import LexicalResolver
+from Interpreter.CSE.generateCS import CSGenerator
+from Interpreter.CSE.CSEMachine import CSEMachine
+from Interpreter.Exception.RPALException import RPALException
+from Interpreter.myrpal import PRIMITIVE_ENVIRONMENT_VARIABLES
+
+# Changed whenever the layout of the JSON report changes
+BENCHMARK_FORMAT_VERSION = 2
+# Directory of the curated RPAL programs
+CORPUS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+CORPUS_SUFFIX = ".rpal"
+# Timed runs of every program
+DEFAULT_REPEATS = int(os.environ.get("RPAL_BENCH_REPEATS", 10))
+# Untimed runs of every program before the timed ones, so imports and caches are warm
+WARMUP_RUNS = 1
+# Phases of the pipeline, in the order they run
+PHASES = ["tokenize", "parse", "standardize", "optimize", "resolve", "generate", "interpret"]
+
+def loadCorpus(directory=CORPUS_DIRECTORY, names=None):
+    """
+    Reads the RPAL programs of the corpus.
+    Args:
+        directory (str): The directory holding the .rpal files.
+        names (list, optional): The programs to read, by file name without suffix. Defaults to all.
+    Returns:
+        dict: The source code of every program, by name, in name order.
+    """
+    available = sorted(name[:-len(CORPUS_SUFFIX)] for name in os.listdir(directory) if name.endswith(CORPUS_SUFFIX))
+    if names:
+        unknown = [name for name in names if name not in available]
+        if unknown:
+            raise RPALException(f"Unknown benchmark programs: {', '.join(unknown)}")
+        available = [name for name in available if name in names]
+    corpus = {}
+    for name in available:
+        with open(os.path.join(directory, name + CORPUS_SUFFIX)) as file:
+            corpus[name] = file.read()
+    return corpus
+
+def summarize(samples):
+    """
+    Returns the mean, variance and minimum of the timings of a phase, in seconds.
+    """
+    return {
+        "mean": statistics.mean(samples),
+        "variance": statistics.variance(samples) if len(samples) > 1 else 0.0,
+        "min": min(samples),
+    }
+
+class PhaseBenchmark:
+    """
+    Times every phase of the CSE pipeline separately on RPAL programs: the tokenizer, the
+    parser, the standardizer, the optimizer, the resolver, the control structure generator and
+    the CSE machine, and measures the peak memory of every phase in one more run. Every run
+    starts again from the source code, since the later phases rewrite the tree in place. The
+    garbage collector is paused while a run is timed, as timeit does, and the output of Print
+    is captured instead of written.
+    """
+    def __init__(self, repeats=DEFAULT_REPEATS, warmup=WARMUP_RUNS, optimize=1):
+        """
+        Args:
+            repeats (int): The timed runs of every program.
+            warmup (int): The untimed runs of every program before the timed ones.
+            optimize (int): The optimization level of the ST.
+        """
+        if repeats < 1:
+            raise RPALException("A benchmark needs at least one timed run.")
+        self.repeats = repeats
+        self.warmup = warmup
+        self.optimize = optimize
+
+    def runOnce(self, code, memory=False):
+        """
+        Runs the pipeline on the source code once.
+        Returns the seconds spent in every phase, the printed output, the machine statistics and
+        the peak memory of every phase. The peaks are only measured with memory, while
+        tracemalloc is tracing: the most bytes a phase held beyond those allocated when it started.
+        """
+        times = {}
+        peaks = {}
+        clock = time.perf_counter
+
+        def phase(name, function, *arguments):
+            if memory:
+                tracemalloc.reset_peak()
+                allocated = tracemalloc.get_traced_memory()[0]
+            start = clock()
+            result = function(*arguments)
+            times[name] = clock() - start
+            if memory:
+                peaks[name] = tracemalloc.get_traced_memory()[1] - allocated
+            return result
+
+        tokens = phase("tokenize", tokenize, code.splitlines())
+        ast = phase("parse", Parser(tokens).E)
+        phase("standardize", StandardizeAST().standardize, ast)
+        phase("optimize", Optimizer(self.optimize).optimize, ast)
+        primitiveEnvironment = Environment(0, variables=PRIMITIVE_ENVIRONMENT_VARIABLES)
+        phase("resolve", LexicalResolver(primitiveEnvironment.names).resolve, ast)
+        controls = phase("generate", CSGenerator().generate, ast)
+        output = io.StringIO()
+        machine = CSEMachine(controls, primitiveEnvironment)
+        with contextlib.redirect_stdout(output):
+            phase("interpret", machine.interpret)
+        return times, output.getvalue(), machine.statistics(), peaks
+
+    def measureMemory(self, code):
+        """
+        Runs the pipeline once under tracemalloc, which would slow down the timed runs.
+        Returns the peak memory of every phase, in bytes.
+        """
+        tracemalloc.start()
+        try:
+            return self.runOnce(code, memory=True)[3]
+        finally:
+            tracemalloc.stop()
+
+    def measure(self, code, memory=True):
+        """
+        Benchmarks one program.
+        Returns the summary of every phase and of the whole pipeline, the printed output and
+        the machine statistics of the last run and, with memory, the peak memory of every phase.
+        """
+        samples = {phase: [] for phase in PHASES}
+        totals = []
+        enabled = gc.isenabled()
+        try:
+            for run in range(self.warmup + self.repeats):
+                gc.collect()
+                gc.disable()
+                times, output, machineStatistics, _ = self.runOnce(code)
+                if enabled:
+                    gc.enable()
+                if run < self.warmup:
+                    continue
+                for phase in PHASES:
+                    samples[phase].append(times[phase])
+                totals.append(sum(times.values()))
+        finally:
+            if enabled:
+                gc.enable()
+        result = {
+            "phases": {phase: summarize(samples[phase]) for phase in PHASES},
+            "total": summarize(totals),
+            "output": output,
+            "statistics": machineStatistics,
+        }
+        if memory:
+            result["memory"] = self.measureMemory(code)
+        return result
+
+    def run(self, corpus):
+        """
+        Entry point for benchmarking a corpus.
+        Args:
+            corpus (dict): The source code of every program, by name.
+        Returns:
+            dict: The report, ready to be written as JSON.
+        """
+        return {
+            "format": BENCHMARK_FORMAT_VERSION,
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "repeats": self.repeats,
+            "optimize": self.optimize,
+            "programs": {name: self.measure(code) for name, code in corpus.items()},
+        }
+
+def printSummary(report, file=sys.stderr):
+    """
+    Writes the mean time of every phase of every program, in milliseconds, and the steps of
+    the CSE machine as a table.
+    """
+    columns = PHASES + ["total"]
+    width = max([len(name) for name in report["programs"]] + [7])
+    print("program".ljust(width) + "".join(column.rjust(13) for column in columns) + "steps".rjust(13), file=file)
+    for name, result in report["programs"].items():
+        means = [result["phases"][phase]["mean"] for phase in PHASES] + [result["total"]["mean"]]
+        steps = result["statistics"].get("steps", "-")
+        print(name.ljust(width) + "".join(f"{mean * 1000:13.3f}" for mean in means) + f"{steps:>13}", file=file)
+
+def main(arguments=None):
+    """
+    Runs the benchmark suite from the command line, from the server directory:
+        python -m Interpreter.Benchmark.benchmark [-r REPEATS] [-O LEVEL] [-o FILE] [program ...]
+    The JSON report is written to FILE, or to the standard output, and a table of mean times
+    to the standard error.
+    """
+    parser = argparse.ArgumentParser(description="Time every phase of the RPAL pipeline on the benchmark corpus.")
+    parser.add_argument("programs", nargs="*", help="programs of the corpus to run, all by default")
+    parser.add_argument("-r", "--repeats", type=int, default=DEFAULT_REPEATS, help="timed runs of every program")
+    parser.add_argument("-O", "--optimize", type=int, default=1, help="optimization level of the ST")
+    parser.add_argument("-o", "--output", help="file the JSON report is written to")
+    parser.add_argument("--corpus", default=CORPUS_DIRECTORY, help="directory of the .rpal programs")
+    options = parser.parse_args(arguments)
+
+    try:
+        corpus = loadCorpus(options.corpus, options.programs)
+    except RPALException as e:
+        parser.error(str(e))
+    report = PhaseBenchmark(options.repeats, optimize=options.optimize).run(corpus)
+    printSummary(report)
+    if options.output:
+        with open(options.output, "w") as file:
+            json.dump(report, file, indent=2)
+            file.write("\n")
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+if __name__ == "__main__":
+    main()
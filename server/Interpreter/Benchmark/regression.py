@@ -0,0 +1,190 @@
+import argparse
+import json
+import math
+import os
+import sys
+
+from Interpreter.Benchmark.benchmark import BENCHMARK_FORMAT_VERSION, DEFAULT_REPEATS, PHASES, PhaseBenchmark, loadCorpus
+from Interpreter.Exception.RPALException import RPALException
+
+# Baseline the runs are compared against; record it on the reference commit and machine
+BASELINE_PATH = os.environ.get("RPAL_BENCH_BASELINE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json"))
+# Slowdown of a mean time tolerated, relative to the baseline
+TIME_TOLERANCE = 0.10
+# A slowdown must also exceed this many standard errors of the difference of the means
+NOISE_SIGMAS = 3
+# Slowdowns smaller than this, in seconds, are noise whatever their relative size
+MIN_TIME_DIFFERENCE = 0.0005
+# Growth of a peak memory tolerated, relative to the baseline
+MEMORY_TOLERANCE = 0.10
+# Growths smaller than this, in bytes, are noise whatever their relative size
+MIN_MEMORY_DIFFERENCE = 16 * 1024
+# Counters of the CSE machine that are deterministic and compared exactly
+EXACT_STATISTICS = ["steps", "environments"]
+
+# Status of a compared measure; the first two fail the gate
+REGRESSED = "REGRESSED"
+CHANGED = "CHANGED"
+IMPROVED = "improved"
+UNCHANGED = "ok"
+
+def loadReport(path):
+    """
+    Reads a benchmark report written by the benchmark suite.
+    Raises an exception if it was written in another format.
+    """
+    try:
+        with open(path) as file:
+            report = json.load(file)
+    except (OSError, ValueError) as e:
+        raise RPALException(f"Cannot read the benchmark report {path}: {e}")
+    if report.get("format") != BENCHMARK_FORMAT_VERSION:
+        raise RPALException(f"The benchmark report {path} has format {report.get('format')}, not {BENCHMARK_FORMAT_VERSION}; record it again.")
+    return report
+
+def compareTime(baseline, current, baselineRuns, currentRuns):
+    """
+    Compares the summaries of the timings of a phase. A slowdown is a regression when it
+    exceeds TIME_TOLERANCE of the baseline mean, NOISE_SIGMAS standard errors of the difference
+    and MIN_TIME_DIFFERENCE.
+    """
+    difference = current["mean"] - baseline["mean"]
+    error = math.sqrt(baseline["variance"] / baselineRuns + current["variance"] / currentRuns)
+    threshold = max(TIME_TOLERANCE * baseline["mean"], NOISE_SIGMAS * error, MIN_TIME_DIFFERENCE)
+    if difference > threshold:
+        return REGRESSED
+    if -difference > threshold:
+        return IMPROVED
+    return UNCHANGED
+
+def compareMemory(baseline, current):
+    difference = current - baseline
+    threshold = max(MEMORY_TOLERANCE * baseline, MIN_MEMORY_DIFFERENCE)
+    if difference > threshold:
+        return REGRESSED
+    if -difference > threshold:
+        return IMPROVED
+    return UNCHANGED
+
+def relativeChange(baseline, current):
+    if baseline == 0:
+        return "-"
+    return f"{(current - baseline) / baseline * 100:+.1f}%"
+
+class RegressionGate:
+    """
+    Compares a benchmark report with a baseline report of the same format and optimization
+    level. The mean time of every phase and of the whole pipeline, and the peak memory of every
+    phase, may vary within noise thresholds; the step and environment counts of the CSE machine
+    and the printed output are deterministic and must be equal. A program missing from either
+    report is not compared.
+    """
+    def __init__(self, baseline):
+        """
+        Args:
+            baseline (dict): The baseline benchmark report.
+        """
+        self.baseline = baseline
+
+    def compareProgram(self, name, baseline, current, baselineRuns, currentRuns):
+        """
+        Returns the rows (program, measure, baseline, current, change, status) of one program.
+        """
+        rows = []
+        for phase in PHASES + ["total"]:
+            before = baseline["total"] if phase == "total" else baseline["phases"][phase]
+            after = current["total"] if phase == "total" else current["phases"][phase]
+            status = compareTime(before, after, baselineRuns, currentRuns)
+            rows.append((name, f"{phase} ms", f"{before['mean'] * 1000:.3f}", f"{after['mean'] * 1000:.3f}", relativeChange(before["mean"], after["mean"]), status))
+        for phase in PHASES:
+            before = baseline["memory"][phase]
+            after = current["memory"][phase]
+            rows.append((name, f"{phase} KiB", f"{before / 1024:.1f}", f"{after / 1024:.1f}", relativeChange(before, after), compareMemory(before, after)))
+        for counter in EXACT_STATISTICS:
+            before = baseline["statistics"].get(counter)
+            after = current["statistics"].get(counter)
+            rows.append((name, counter, str(before), str(after), relativeChange(before, after) if before and after is not None else "-", UNCHANGED if before == after else CHANGED))
+        sameOutput = baseline["output"] == current["output"]
+        rows.append((name, "output", "", "", "", UNCHANGED if sameOutput else CHANGED))
+        return rows
+
+    def compare(self, report):
+        """
+        Entry point for comparing a benchmark report with the baseline.
+        Args:
+            report (dict): The benchmark report of the run.
+        Returns:
+            list: The rows (program, measure, baseline, current, change, status) of every
+            compared measure.
+        """
+        if report.get("format") != self.baseline.get("format"):
+            raise RPALException("The report and the baseline have different formats.")
+        if report.get("optimize") != self.baseline.get("optimize"):
+            raise RPALException(f"The baseline was recorded at optimization level {self.baseline.get('optimize')}, the run at {report.get('optimize')}.")
+        rows = []
+        for name, current in report["programs"].items():
+            baseline = self.baseline["programs"].get(name)
+            if baseline is not None:
+                rows.extend(self.compareProgram(name, baseline, current, self.baseline["repeats"], report["repeats"]))
+        return rows
+
+def failures(rows):
+    return [row for row in rows if row[5] in (REGRESSED, CHANGED)]
+
+def printTable(rows, file=sys.stdout):
+    """
+    Writes the total time and the steps of every program, and every measure that did not stay
+    within its threshold, as a table.
+    """
+    shown = [row for row in rows if row[1] in ("total ms", "steps") or row[5] != UNCHANGED]
+    header = ("program", "measure", "baseline", "current", "change", "status")
+    widths = [max(len(str(row[i])) for row in shown + [header]) for i in range(len(header))]
+    for row in [header] + shown:
+        print("  ".join(str(cell).ljust(width) if i < 2 else str(cell).rjust(width) for i, (cell, width) in enumerate(zip(row, widths))), file=file)
+
+def main(arguments=None):
+    """
+    Records or checks the benchmark baseline from the command line, from the server directory:
+        python -m Interpreter.Benchmark.regression record [-r REPEATS] [-O LEVEL] [-b FILE] [program ...]
+        python -m Interpreter.Benchmark.regression check [-r REPEATS] [-b FILE] [--report FILE] [program ...]
+    Options and program names may come in any order after the command.
+    check runs the suite at the optimization level of the baseline, or reads a report written
+    by the suite, and exits with status 1 when any measure regressed or changed.
+    """
+    parser = argparse.ArgumentParser(description="Compare RPAL benchmark runs against a stored baseline.")
+    parser.add_argument("command", choices=["record", "check"], help="record a new baseline, or check a run against it")
+    parser.add_argument("programs", nargs="*", help="programs of the corpus to run, all by default")
+    parser.add_argument("-b", "--baseline", default=BASELINE_PATH, help="baseline file")
+    parser.add_argument("-r", "--repeats", type=int, default=DEFAULT_REPEATS, help="timed runs of every program")
+    parser.add_argument("-O", "--optimize", type=int, default=1, help="optimization level of the ST, when recording")
+    parser.add_argument("--report", help="benchmark report to check instead of running the suite")
+    options = parser.parse_intermixed_args(arguments)
+
+    try:
+        if options.command == "record":
+            report = PhaseBenchmark(options.repeats, optimize=options.optimize).run(loadCorpus(names=options.programs))
+            with open(options.baseline, "w") as file:
+                json.dump(report, file, indent=2)
+                file.write("\n")
+            print(f"Recorded the baseline of {len(report['programs'])} programs in {options.baseline}")
+            return
+        baseline = loadReport(options.baseline)
+        if options.report:
+            report = loadReport(options.report)
+        else:
+            report = PhaseBenchmark(options.repeats, optimize=baseline["optimize"]).run(loadCorpus(names=options.programs))
+        rows = RegressionGate(baseline).compare(report)
+    except RPALException as e:
+        parser.error(str(e))
+
+    if report.get("python") != baseline.get("python"):
+        print(f"Note: the baseline was recorded with Python {baseline.get('python')}, the run uses {report.get('python')}.", file=sys.stderr)
+    printTable(rows)
+    failed = failures(rows)
+    if failed:
+        print(f"\n{len(failed)} measures regressed or changed beyond tolerance.")
+        sys.exit(1)
+    print("\nNo regressions.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import argparse
+import json
+import math
+import sys
+
+from Interpreter.Benchmark.benchmark import PHASES, PhaseBenchmark
+from Interpreter.Benchmark.workloads import DEFAULT_SIZES, WORKLOADS, generateProgram
+from Interpreter.Exception.RPALException import RPALException
+
+# Changed whenever the layout of the JSON report changes
+SCALING_FORMAT_VERSION = 1
+# Timed runs at every size; the fastest is kept
+DEFAULT_REPEATS = 3
+# Growth exponent above which a phase scales super-linearly; leaves room for timing noise
+# and for the n log n of sorting-like work
+SUPERLINEAR_EXPONENT = 1.3
+# Phases faster than this at the largest size, in seconds, are too noisy to be flagged
+TIME_FLOOR = 0.002
+# Phases allocating less than this at the largest size, in bytes, are not flagged
+MEMORY_FLOOR = 64 * 1024
+
+def fitGrowth(sizes, values):
+    """
+    Fits values = c * size ** k by least squares on the logarithms.
+    Returns the exponent k: about 1 for linear growth, 2 for quadratic growth. Returns None
+    when fewer than two sizes have a positive value.
+    """
+    points = [(math.log(size), math.log(value)) for size, value in zip(sizes, values) if value > 0]
+    if len(points) < 2:
+        return None
+    meanX = sum(x for x, _ in points) / len(points)
+    meanY = sum(y for _, y in points) / len(points)
+    spread = sum((x - meanX) ** 2 for x, _ in points)
+    if spread == 0:
+        return None
+    return sum((x - meanX) * (y - meanY) for x, y in points) / spread
+
+def isSuperLinear(exponent, largest, floor):
+    return exponent is not None and exponent > SUPERLINEAR_EXPONENT and largest >= floor
+
+class ScalingBenchmark:
+    """
+    Runs the generated workloads at growing sizes and fits the growth of the time and the peak
+    memory of every phase of the pipeline to a power of the size. A phase whose exponent exceeds
+    SUPERLINEAR_EXPONENT, and whose cost at the largest size is above the noise floor, is
+    flagged. Time is the fastest of the timed runs; memory is measured in one more run under
+    tracemalloc, which would slow down the timed ones.
+    """
+    def __init__(self, repeats=DEFAULT_REPEATS, optimize=1):
+        """
+        Args:
+            repeats (int): The timed runs at every size.
+            optimize (int): The optimization level of the ST.
+        """
+        self.benchmark = PhaseBenchmark(repeats, optimize=optimize)
+
+    def runWorkload(self, workload, sizes):
+        """
+        Measures one workload at every size, in increasing order. A size the interpreter runs
+        out of Python stack on ends the workload; it is reported as its limit.
+        """
+        measured = []
+        times = {phase: [] for phase in PHASES}
+        peaks = {phase: [] for phase in PHASES}
+        limit = None
+        for size in sorted(sizes):
+            code = generateProgram(workload, size)
+            try:
+                result = self.benchmark.measure(code)
+            except RecursionError:
+                limit = size
+                break
+            measured.append(size)
+            for phase in PHASES:
+                times[phase].append(result["phases"][phase]["min"])
+                peaks[phase].append(result["memory"][phase])
+
+        growth = {}
+        flagged = []
+        for phase in PHASES:
+            timeExponent = fitGrowth(measured, times[phase])
+            memoryExponent = fitGrowth(measured, peaks[phase])
+            growth[phase] = {"time": timeExponent, "memory": memoryExponent}
+            if measured and isSuperLinear(timeExponent, times[phase][-1], TIME_FLOOR):
+                flagged.append(f"{phase} time")
+            if measured and isSuperLinear(memoryExponent, peaks[phase][-1], MEMORY_FLOOR):
+                flagged.append(f"{phase} memory")
+        return {
+            "sizes": measured,
+            "limit": limit,
+            "time": times,
+            "memory": peaks,
+            "growth": growth,
+            "superLinear": flagged,
+        }
+
+    def run(self, workloads):
+        """
+        Entry point for measuring the growth of workloads.
+        Args:
+            workloads (dict): The sizes to run every workload at, by workload name.
+        Returns:
+            dict: The report, ready to be written as JSON.
+        """
+        return {
+            "format": SCALING_FORMAT_VERSION,
+            "superLinearExponent": SUPERLINEAR_EXPONENT,
+            "optimize": self.benchmark.optimize,
+            "workloads": {name: self.runWorkload(name, sizes) for name, sizes in workloads.items()},
+        }
+
+def formatExponent(exponent):
+    return "-" if exponent is None else f"{exponent:.2f}"
+
+def printSummary(report, file=sys.stderr):
+    """
+    Writes the time and memory exponents of every phase of every workload as a table; a
+    flagged exponent is followed by '!'.
+    """
+    print("workload".ljust(10) + "".join(phase.rjust(13) for phase in PHASES), file=file)
+    for name, result in report["workloads"].items():
+        for measure in ("time", "memory"):
+            cells = []
+            for phase in PHASES:
+                mark = "!" if f"{phase} {measure}" in result["superLinear"] else " "
+                cells.append((formatExponent(result["growth"][phase][measure]) + mark).rjust(13))
+            print(f"{name if measure == 'time' else '':<10}" + "".join(cells) + f"  {measure}", file=file)
+        if result["limit"] is not None:
+            print(f"{'':<10}stopped at size {result['limit']}: Python recursion limit", file=file)
+
+def main(arguments=None):
+    """
+    Runs the scaling workloads from the command line, from the server directory:
+        python -m Interpreter.Benchmark.scaling [-r REPEATS] [-s SIZE ...] [-o FILE] [workload ...]
+    The JSON report is written to FILE, or to the standard output, and the table of growth
+    exponents to the standard error. Exits with status 1 when any phase scales super-linearly.
+    """
+    parser = argparse.ArgumentParser(description="Fit the growth of every phase of the RPAL pipeline on generated workloads.")
+    parser.add_argument("workloads", nargs="*", help=f"workloads to run, all by default: {', '.join(WORKLOADS)}")
+    parser.add_argument("-s", "--sizes", type=int, nargs="+", help="sizes to run every workload at, instead of its defaults")
+    parser.add_argument("-r", "--repeats", type=int, default=DEFAULT_REPEATS, help="timed runs at every size")
+    parser.add_argument("-O", "--optimize", type=int, default=1, help="optimization level of the ST")
+    parser.add_argument("-o", "--output", help="file the JSON report is written to")
+    options = parser.parse_args(arguments)
+
+    names = options.workloads or list(WORKLOADS)
+    unknown = [name for name in names if name not in WORKLOADS]
+    if unknown:
+        parser.error(f"Unknown workloads: {', '.join(unknown)}")
+    try:
+        report = ScalingBenchmark(options.repeats, options.optimize).run({name: options.sizes or DEFAULT_SIZES[name] for name in names})
+    except RPALException as e:
+        parser.error(str(e))
+    printSummary(report)
+    if options.output:
+        with open(options.output, "w") as file:
+            json.dump(report, file, indent=2)
+            file.write("\n")
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if any(result["superLinear"] for result in report["workloads"].values()):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Generators of valid RPAL programs whose size is controlled by one parameter, so the cost of
+every phase of the pipeline can be measured as the size grows:
+    lines      N   a program of N lines, one tuple component per line
+    depth      D   D nested 'let' scopes
+    tuple      L   a tuple literal of L components on a single line
+    aug        L   a tuple of L components built with 'aug'
+    recursion  R   a non-tail recursive function applied to depth R
+    string     S   a string literal of S characters walked with Stern
+"""
+
+import sys
+
+from Interpreter.Exception.RPALException import RPALException
+
+def linesProgram(size):
+    lines = ["let t = ("]
+    for i in range(1, size + 1):
+        lines.append(f"    {i} * 2 + {i % 7}" + ("," if i < size else ""))
+    lines.append(") in Print (Order t, t 1)")
+    return "\n".join(lines) + "\n"
+
+def depthProgram(size):
+    lines = ["let x0 = 1 in"]
+    for i in range(1, size):
+        lines.append(f"let x{i} = x{i - 1} + {i % 5} in")
+    lines.append(f"Print x{size - 1}")
+    return "\n".join(lines) + "\n"
+
+def tupleProgram(size):
+    components = ", ".join(str(i) for i in range(1, size + 1))
+    return f"let t = ({components}) in Print (Order t, t {size})\n"
+
+def augProgram(size):
+    return (
+        "let rec build n t = n eq 0 -> t | build (n - 1) (t aug n)\n"
+        f"in Print (Order (build {size} nil))\n"
+    )
+
+def recursionProgram(size):
+    return (
+        "let rec sum n = n eq 0 -> 0 | n + sum (n - 1)\n"
+        f"in Print (sum {size})\n"
+    )
+
+def stringProgram(size):
+    text = ("abcdefghij" * (size // 10 + 1))[:size]
+    return (
+        "let rec walk n s = n eq 0 -> 0 | 1 + walk (n - 1) (Stern s)\n"
+        f"in Print (walk {size} '{text}')\n"
+    )
+
+# Program generator of every workload, by name
+WORKLOADS = {
+    "lines": linesProgram,
+    "depth": depthProgram,
+    "tuple": tupleProgram,
+    "aug": augProgram,
+    "recursion": recursionProgram,
+    "string": stringProgram,
+}
+# Sizes every workload is measured at by default; the parser recurses once per nested scope,
+# so depth stays below the Python recursion limit
+DEFAULT_SIZES = {
+    "lines": [250, 500, 1000, 2000, 4000],
+    "depth": [25, 50, 100, 200],
+    "tuple": [250, 500, 1000, 2000, 4000],
+    "aug": [250, 500, 1000, 2000, 4000],
+    "recursion": [250, 500, 1000, 2000, 4000],
+    "string": [250, 500, 1000, 2000, 4000],
+}
+
+def generateProgram(workload, size):
+    """
+    Returns the RPAL program of the workload at the given size.
+    Args:
+        workload (str): The name of the workload, one of WORKLOADS.
+        size (int): The value of its size parameter, at least 1.
+    Returns:
+        str: The source code of the program.
+    """
+    if workload not in WORKLOADS:
+        raise RPALException(f"Unknown workload: {workload}")
+    if size < 1:
+        raise RPALException("The size of a workload must be at least 1.")
+    return WORKLOADS[workload](size)
+
+if __name__ == "__main__":
+    # python -m Interpreter.Benchmark.workloads <workload> <size> writes the program
+    if len(sys.argv) != 3:
+        sys.exit(f"Usage: python -m Interpreter.Benchmark.workloads <{'|'.join(WORKLOADS)}> <size>")
+    sys.stdout.write(generateProgram(sys.argv[1], int(sys.argv[2])))
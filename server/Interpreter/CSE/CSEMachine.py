@@ -1,7 +1,11 @@
 from Interpreter.Environment.Environment import Environment
 from Interpreter.Exception.RPALException import RPALException
-from Interpreter.CSE.generateCS import ControlStructure, Eta, Lambda, Tau
+from Interpreter.CSE.generateCS import Constant, ControlStructure, Eta, Lambda, ParallelTau, Reference, Tau
+from Interpreter.CSE.memo import MemoCache, MemoStatistics, addStore, memoKey, storeResults
+from Interpreter.CSE.parallel import ParallelEvaluator, PendingComponent
+from Interpreter.CSE.values import Closure, Dummy, Nil, Tuple, conc, isString, makeTuple, stem, stern, stripQuotes
 from Interpreter.Tokenizer.tokenizer import Token
+import weakref
 
 # List of supported binary and unary operators
 BINARY_OPERATORS = ["+", "-", "*", "/", "eq", "gr", "ge", "ls", "le","aug","**"]
@@ -10,6 +14,78 @@ BUILTIN_FUNCTIONS = ['print']
 OTHER_KEYWORDS = ['nil', 'Y',"Print"]
 BUILTIN_OPERATORS = ['conc', 'stem', 'stern', 'isInteger', 'isString', 'isTruthValue', 'isFunction', 'isTuple', 'isDummy','order', 'null']
 
+def closureText(closure):
+    """
+    Returns the printed form of a lambda closure.
+    """
+    if len(closure.variables) == 1:
+        variable = closure.variables[0]
+        if type(variable) is Token:
+            variable = variable.getValue()
+        return f"[lambda closure: {variable}: {closure.k}]"
+    variables = [v.getValue() if isinstance(v, Token) else v for v in closure.variables]
+    return f"[lambda closure: {variables}: {closure.k}]"
+
+def printableValue(value):
+    """
+    Converts a machine value to the text written by Print.
+    """
+    if type(value) is Closure:
+        return closureText(value)
+    elif type(value) is Tuple:
+        temp = []
+        for item in value:
+            if type(item) is Closure:
+                temp.append(closureText(item))
+            else:
+                temp.append(str(item))
+        return "(" + ", ".join(temp) + ")"
+    return str(value).strip("'")
+
+def elementText(item):
+    """
+    Returns the text of an element of the control stack or of the stack, as the machine
+    traces show it.
+    """
+    if type(item) is Token:
+        return str(item.getValue())
+    elif type(item) is Reference:
+        return item.getName()
+    elif type(item) is ControlStructure:
+        return f"delta({item.number})"
+    elif type(item) is Environment:
+        return f"e({item.number})"
+    elif type(item) is Lambda:
+        return f"<lambda({item.variables} {item.k})>"
+    elif type(item) is Closure:
+        return f"<{item.c.number} lambda({item.variables} {item.k})>"
+    elif type(item) is Eta:
+        return f"<{item.c.number} eta({item.variables} {item.k})>"
+    elif type(item) is Tau:
+        return f"tau({item.elementNumber})"
+    elif type(item) is Constant:
+        return str(item.value)
+    elif type(item) is Tuple:
+        return printableValue(item)
+    return str(item)
+
+def recursiveClosure(function, body, number):
+    """
+    Builds the value of Y applied to function when function is (lambda f. body) and body is
+    a lambda: the closure of body in an environment where f is bound to that same closure.
+    Recursive calls then apply the closure directly instead of unfolding an Eta every time.
+    Args:
+        function (Closure): The closure Y is applied to, binding the recursive name.
+        body (Lambda): The lambda that function returns.
+        number (int): The number of the environment binding the recursive name.
+    Returns:
+        Closure: The recursive closure.
+    """
+    environment = Environment(number, function.c, names=function.names, values=[None])
+    closure = Closure(body.k, body.variables, body.names, environment)
+    environment.values[0] = closure
+    return closure
+
 class CSEMachine:
     """
     The CSEMachine class implements the Control Stack Environment (CSE) machine
@@ -17,32 +93,52 @@ class CSEMachine:
     It manages control structures, environments, and a stack to interpret and execute code.
     """
 
-    def __init__(self, controls, environment):
+    def __init__(self, controls, environment, trackEnvironments=False, parallel=False, entry=0):
         """
         Initializes the CSEMachine with the given control structures and environment.
         Sets up the control stack and main stack for execution.
+        Environments are only kept alive by the closures and stacks that use them; with
+        trackEnvironments the live ones can also be looked up by number for debugging.
+        With parallel, the costly components of the tuples marked by TupleParallelizer are
+        evaluated in worker processes; otherwise they are evaluated in order.
+        entry is the number of the control structure evaluated, 0 for the whole program.
         """
         self.controls = controls
+        # Control structures indexed by their number, so closures resolve their delta in O(1)
+        self.controlsByNumber = [None] * len(controls)
+        for control in controls:
+            if control.number >= len(controls):
+                raise RPALException(f"Control structure number {control.number} is out of range.")
+            self.controlsByNumber[control.number] = control
+        # The control stack holds frames [elements, remaining, tailCall]: the top control element
+        # is elements[remaining - 1], so entering a delta never copies its elements
         self.controlStack = []
         self.stack = []
+        # (environment, index of its marker in stack, pending memo stores) for every marker
+        # on the control stack
+        self.frames = []
+        self.memoStatistics = MemoStatistics()
         self.currentEnvironment = environment
-        self.environments = [ environment ]  # List to keep track of all environments
+        self.environments = weakref.WeakValueDictionary() if trackEnvironments else None
+        if self.environments is not None:
+            self.environments[environment.number] = environment
         self.totalEnvironments = 1
+        # Rules applied so far, deterministic for a program and its optimization level
+        self.steps = 0
+        self.parallelEvaluator = ParallelEvaluator(controls) if parallel else None
 
-        self.controlStack.append(self.currentEnvironment)
-        defaultControl = self.findControlStructure(0)
+        self.enterEnvironment(self.currentEnvironment)
+        defaultControl = self.findControlStructure(entry)
         if defaultControl is None:
-            raise RPALException("Control structure with number 0 not found.")
+            raise RPALException(f"Control structure with number {entry} not found.")
         if type(defaultControl) is not ControlStructure:
-            raise RPALException("Control structure with number 0 is not a valid ControlStructure.")
+            raise RPALException(f"Control structure with number {entry} is not a valid ControlStructure.")
         if len(defaultControl.elements) == 0:
-            raise RPALException("Control structure with number 0 has no elements.")
+            raise RPALException(f"Control structure with number {entry} has no elements.")
         if type(defaultControl) is not ControlStructure:
-            raise RPALException("Control structure with number 0 is not a valid ControlStructure.")
+            raise RPALException(f"Control structure with number {entry} is not a valid ControlStructure.")
         self.insertControlStructure(defaultControl)
 
-        self.stack.append(self.currentEnvironment)
-
         #print("Initial Conditions:")
         #self.printStack('control')
         #self.printStack('main')
@@ -51,103 +147,161 @@ class CSEMachine:
     def printStack(self,stack):
         if stack == 'control':
             print("Control Stack:",end=" ")
-            for item in self.controlStack:
-                printable = ''
-                if type(item) is Token:
-                    printable = item.getValue()
-                elif type(item) is ControlStructure:
-                    printable = f"delta({item.number})"
-                elif type(item) is Environment:
-                    printable = f"e({item.number})"
-                elif type(item) is Lambda:
-                    if item.c is not None:
-                        printable = f"<{item.c} lambda({item.variables} {item.k})>"
-                    else:
-                        printable = f"<lambda({item.variables} {item.k})>"
-                elif type(item) is Eta:
-                    printable = f"<{item.c} eta({item.variables} {item.k})>"
-                elif type(item) is Tau:
-                    printable = f"tau({item.elementNumber})"
-                else:
-                    printable = str(item)
-                print(printable, end=",")
+            for item in self.controlElements():
+                print(elementText(item), end=",")
         else:
             print("Main Stack:",end=" ")
             for item in self.stack:
-                printable = ''
-                if type(item) is Token:
-                    printable = item.getValue()
-                elif type(item) is ControlStructure:
-                    printable = f"delta({item.number})"
-                elif type(item) is Environment:
-                    printable = f"e({item.number})"
-                elif type(item) is Lambda:
-                    if item.c is not None:
-                        printable = f"<{item.c} lambda({item.variables} {item.k})>"
-                    else:
-                        printable = f"<lambda({item.variables} {item.k})>"
-                elif type(item) is Eta:
-                    printable = f"<{item.c} eta({item.variables} {item.k})>"
-                elif type(item) is Tau:
-                    printable = f"tau({item.elementNumber})"
-                else:
-                    printable = str(item)
-                print(printable, end=",")
+                print(elementText(item), end=",")
         print()
 
     def findEnvironment(self, number):
         """
-        Finds and returns the environment with the specified number.
+        Finds and returns the live environment with the specified number.
+        Only available when the machine tracks environments.
         Raises an exception if not found.
         """
-        for env in self.environments:
-            if env.number == number:
-                return env
-        raise RPALException(f"Environment with number {number} not found.")
+        if self.environments is None:
+            raise RPALException("Environments are not tracked by this machine.")
+        env = self.environments.get(number)
+        if env is None:
+            raise RPALException(f"Environment with number {number} not found.")
+        return env
+
+    def newEnvironment(self, parent, names, values):
+        """
+        Creates the next numbered environment and makes it the current one.
+        """
+        newEnv = Environment(self.totalEnvironments, parent, names=names, values=values)
+        self.totalEnvironments += 1
+        if self.environments is not None:
+            self.environments[newEnv.number] = newEnv
+        self.currentEnvironment = newEnv
+        return newEnv
     def findControlStructure(self, number):
         """
-        Finds and returns the control structure with the specified number.
+        Returns the control structure with the specified number.
         Raises an exception if not found.
         """
-        for control in self.controls:
-            if control.number == number:
-                return control
+        if 0 <= number < len(self.controlsByNumber) and self.controlsByNumber[number] is not None:
+            return self.controlsByNumber[number]
         raise RPALException(f"Control structure with number {number} not found.")
     
     def insertControlStructure(self, control):
+        """
+        Pushes a frame stepping through the elements of the control structure.
+        """
         if type(control) is not ControlStructure:
             raise RPALException("Control structure must be an instance of ControlStructure.")
         if len(control.elements) == 0:
             raise RPALException("Control structure must have at least one element.")
-        for element in control.elements:
-            self.controlStack.append(element)
+        self.controlStack.append([control.elements, len(control.elements), control.tailCall])
+
+    def pushControl(self, element):
+        """
+        Pushes a single element (an environment marker or 'gamma') onto the control stack.
+        """
+        self.controlStack.append([[element], 1, False])
+
+    def peekControl(self):
+        """
+        Returns the element on top of the control stack without removing it.
+        """
+        frame = self.controlStack[-1]
+        return frame[0][frame[1] - 1]
+
+    def popControl(self):
+        """
+        Removes and returns the element on top of the control stack.
+        Exhausted frames are dropped, so the top frame always has an element left.
+        """
+        frame = self.controlStack[-1]
+        index = frame[1] - 1
+        if index == 0:
+            self.controlStack.pop()
+        else:
+            frame[1] = index
+        return frame[0][index]
+
+    def enterEnvironment(self, environment, stores=None):
+        """
+        Pushes the marker of an environment onto the control stack and the stack, recording
+        where it is so that rule 5 finds it without searching.
+        stores lists the (cache, key) pairs the result of the environment is memoized under.
+        """
+        self.pushControl(environment)
+        self.frames.append((environment, len(self.stack), stores))
+        self.stack.append(environment)
+
+    def isTailCall(self):
+        """
+        Checks whether the 'gamma' on top of the control stack is the last element of a
+        control structure the generator marked as ending with a tail call.
+        """
+        frame = self.controlStack[-1]
+        return frame[2] and frame[1] == 1
+
+    def leaveForTailCall(self):
+        """
+        Exits the caller's environment before a tail call. Only the caller's environment
+        marker is left above its own caller, so the callee returns straight to that caller
+        and tail-recursive loops run in constant stack space.
+        Returns the pending memo stores of the caller, which the callee's result answers too.
+        """
+        if len(self.controlStack) == 0 or len(self.stack) == 0:
+            return None
+        marker = self.peekControl()
+        if type(marker) is Environment and self.stack[-1] is marker:
+            self.popControl()
+            self.stack.pop()
+            return self.frames.pop()[2]
+        return None
+
+    def statistics(self):
+        """
+        Returns the counters of the run, such as the rules applied and the memo hits of the
+        recursive functions.
+        """
+        counters = dict(self.memoStatistics.asDict(), steps=self.steps, environments=self.totalEnvironments)
+        if self.parallelEvaluator is not None:
+            counters.update(self.parallelEvaluator.statistics())
+        return counters
+
+    def controlElements(self):
+        """
+        Yields the control stack elements from bottom to top, as if every frame were expanded.
+        """
+        for elements, remaining, _ in self.controlStack:
+            for i in range(remaining):
+                yield elements[i]
     
 
     def rule1(self):
         """
         CSE Rule 1: Handles variable lookup.
         Pops a variable name from the control stack, looks up its value in the current environment,
-        and pushes the value onto the stack.
+        and pushes the value onto the stack. A literal was converted to its value at compile time.
         """
-        name = self.controlStack.pop()
+        name = self.popControl()
 
-        value = self.currentEnvironment.lookUpValue(name)
+        if type(name) is Reference:
+            # Resolved at compile time: walk up depth environments and read the slot
+            value = self.currentEnvironment.lookUpSlot(name.depth, name.index)
+        elif type(name) is Constant:
+            value = name.value
+        else:
+            value = self.currentEnvironment.lookUpValue(name)
         self.stack.append(value)
         return
 
     def rule2(self):
         """
         CSE Rule 2: Handles lambda.
-        Pops a Lambda control structure from the control stack, sets its environment,
-        and pushes it onto the stack.
+        Pops a Lambda control structure from the control stack and pushes its Closure in the
+        current environment onto the stack.
         """
-        lambdaControl = self.controlStack.pop()
-        if (type(lambdaControl) is not Lambda):
-            raise RPALException("Expected a Lambda control structure.")
-        
-        lambdaControl.setC(self.currentEnvironment.number)
-        self.stack.append(lambdaControl)
-        return
+        lambdaControl = self.popControl()
+        self.stack.append(Closure(lambdaControl.k, lambdaControl.variables, lambdaControl.names, self.currentEnvironment))
     
     def rule3(self):
         """
@@ -163,35 +317,33 @@ class CSEMachine:
         Notes:
             - For 'conc', both operands must be strings. The function strips single quotes before concatenation.
             - For 'isTuple', only non-empty lists are considered tuples.
-            - For 'null', if the value is "nil", returns True. Otherwise, expects a list and checks if it is empty.
+            - For 'null', returns True for Nil and for an empty Tuple, False for any other Tuple; any other value is an error.
         """
-        self.controlStack.pop()
+        self.popControl()
         #print("popping gamma")
         operator = self.stack.pop()
         if operator == 'conc':
-            self.controlStack.pop()  # Pop 'gamma' control structure since it is a binary operation
+            self.popControl()  # Pop 'gamma' control structure since it is a binary operation
             #print("concatenating strings")
             value1 = self.stack.pop()
             value2 = self.stack.pop()
-            if type(value1) is not str or type(value2) is not str:
+            if not isString(value1) or not isString(value2):
                 raise RPALException("Both operands must be strings for 'conc' operation.")
-            result = value1.strip("'") + value2.strip("'")
+            result = conc(value1, value2)
             self.stack.append(result)
         elif operator == 'stem':
             #print("getting first character of string")
             value = self.stack.pop()
-            if type(value) is not str:
+            if not isString(value):
                 raise RPALException("Operand must be a string for 'stem' operation.")
-            value = value.strip("'")
-            result = value[0] if len(value) > 0 else ''
+            result = stem(value)
             self.stack.append(result)
         elif operator == 'stern':
             #print("getting rest of string after first character")
             value = self.stack.pop()
-            if type(value) is not str:
+            if not isString(value):
                 raise RPALException("Operand must be a string for 'stern' operation.")
-            value = value.strip("'")
-            result = value[1:] if len(value) > 1 else ''
+            result = stern(value)
             self.stack.append(result)
         elif operator == 'isInteger':
             #print("checking if value is an integer")
@@ -201,7 +353,7 @@ class CSEMachine:
         elif operator == 'isString':
             #print("checking if value is a string")
             value = self.stack.pop()
-            result = isinstance(value, str)
+            result = isString(value)
             self.stack.append(result)
         elif operator == 'isTruthValue':
             #print("checking if value is a truth value")
@@ -211,31 +363,31 @@ class CSEMachine:
         elif operator == 'isFunction':
             #print("checking if value is a function")
             value = self.stack.pop()
-            result = isinstance(value, Lambda) or isinstance(value, Eta)
+            result = type(value) is Closure or type(value) is Eta
             self.stack.append(result)
         elif operator == 'isTuple':
             #print("checking if value is a tuple")
             value = self.stack.pop()
-            result = isinstance(value, list) and len(value) > 0
+            result = isinstance(value, Tuple) and len(value) > 0
             self.stack.append(result)
         elif operator == 'isDummy':
             #print("checking if value is a dummy token")
             value = self.stack.pop()
-            result = isinstance(value, Token) and value.getType() == "DUMMY"
+            result = value is Dummy
             self.stack.append(result)
         elif operator == "order":
             value = self.stack.pop()
-            if type(value) is not list:
+            if type(value) is not Tuple:
                 raise RPALException("Operand must be a list for 'order' operation.")
             result = len(value)
             self.stack.append(result)
         elif operator == "null":
             #print("checking if value is nil")
             value = self.stack.pop()
-            if value == "nil":
+            if value is Nil:
                 result = True
             else:
-                if type(value) is not list:
+                if type(value) is not Tuple:
                     raise RPALException("Operand must be a list for 'null' operation.")
                 result = (len(value) == 0)
             self.stack.append(result)
@@ -247,67 +399,56 @@ class CSEMachine:
         Pops 'gamma' from the control stack, applies a Lambda function to a value,
         creates a new environment, and updates the control and main stacks accordingly.
         """
-        self.controlStack.pop()
+        tailCall = self.isTailCall()
+        self.popControl()
         lambdaControl = self.stack.pop()
-        #print(f"< lambda {lambdaControl.k}, {lambdaControl.variables} > is popped from the stack")
-        if (type(lambdaControl) is not Lambda):
-            raise RPALException("Expected a Lambda control structure.")
-        
-        variable = lambdaControl.variables[0] if len(lambdaControl.variables) == 1 else lambdaControl.variables
-        if type(variable) is Token:
-            variable = variable.getValue()
-        
         value = self.stack.pop()
-        
-        if type(value) is Token:
-            value = value.getValue()
         #find the control structure for the lambda
         newControl = self.findControlStructure(lambdaControl.k)
-
-        if type(newControl) is not ControlStructure:
-            raise RPALException(f"Control structure with number {lambdaControl.k} is not a valid ControlStructure.")
-        #print('searching for parent environment with number', lambdaControl.c)
-        
-        parentEnv = self.findEnvironment(lambdaControl.c)
-        if type(parentEnv) is not Environment:
-            raise RPALException(f"Parent environment with number {lambdaControl.c} is not a valid Environment.")
+        parentEnv = lambdaControl.c
+        # A memoized recursive closure answers from its cache when it knows the argument
+        key = memoKey(value) if lambdaControl.cache is not None else None
+        if key is not None:
+            found, result = lambdaControl.cache.lookUp(key)
+            if found:
+                self.stack.append(result)
+                return
+        stores = None
+        if tailCall:
+            stores = self.leaveForTailCall()
+        if key is not None:
+            stores = addStore(stores, lambdaControl.cache, key)
         # Create a new environment for the lambda binding with new variable
-        newEnv = Environment(self.totalEnvironments, parentEnv, {variable: value})
-        #print(f"Creating new environment {newEnv.number} with parent {parentEnv.number} and variable binding {variable}: {value}")
-        self.currentEnvironment = newEnv
-        self.environments.append(newEnv)
-        self.totalEnvironments += 1
+        newEnv = self.newEnvironment(parentEnv, lambdaControl.names, [value])
+        #print(f"Creating new environment {newEnv.number} with parent {parentEnv.number} and variable binding {lambdaControl.names}: {value}")
         #print(f"Total environments: {self.totalEnvironments}")
 
-        self.controlStack.append(newEnv)
+        self.enterEnvironment(newEnv, stores)
         self.insertControlStructure(newControl)
-
-        self.stack.append(newEnv)
         return
     
     def rule5(self):
         """
         CSE Rule 5: Handles environment removal.
         Pops the environment from the control stack and removes the corresponding environment from the stack.
-        """
-        self.controlStack.pop()
-        # Traverse the stack to find and pop the first Environment object
-        for i in range(len(self.stack)-1, -1, -1):
-            if type(self.stack[i]) is Environment:
-                self.stack.pop(i)
-                break
-        
-        # Traverse the control stack to find the first Environment object
-        nextEnv = None
-        #print("searching for next environment in control stack")
-        #print(self.controlStack)
-        for i in range(len(self.controlStack)-1, -1, -1):
-            #print(f"Checking control stack item at index {i}: {self.controlStack[i]}")
-            if type(self.controlStack[i]) is Environment:
-                nextEnv = self.controlStack[i]
-                #print(f"Found next environment: {nextEnv.number}")
-                break
-        self.currentEnvironment = nextEnv
+        The marker positions come from the frame stack, so no stack is searched.
+        """
+        self.popControl()
+        environment, index, stores = self.frames.pop()
+        if index < len(self.stack) and self.stack[index] is environment:
+            # Only the result of the environment is above its marker, so this is O(1)
+            del self.stack[index]
+            if stores is not None and index < len(self.stack):
+                storeResults(stores, self.stack[-1])
+        else:
+            # A malformed tuple consumed the marker (rule 9): remove the nearest one instead
+            for i in range(len(self.stack)-1, -1, -1):
+                if type(self.stack[i]) is Environment:
+                    self.stack.pop(i)
+                    break
+
+        # The next environment is the one whose marker is now on top of the frame stack
+        self.currentEnvironment = self.frames[-1][0] if len(self.frames) > 0 else None
         #print(f"Current environment set to {self.currentEnvironment.number} after rule 5 execution.")
 
     def rule6(self):
@@ -316,15 +457,11 @@ class CSEMachine:
         Pops an operator from the control stack and two operands from the stack,
         applies the operation, and pushes the result onto the stack.
         """
-        operator = self.controlStack.pop()
+        operator = self.popControl()
 
         operand1 = self.stack.pop()
         operand2 = self.stack.pop()
-        if type(operand1) is Token:
-            operand1 = operand1.getValue()
-        if type(operand2) is Token:
-            operand2 = operand2.getValue()
-        
+
         if operator == "+":
             result = operand1 + operand2
         elif operator == "-":
@@ -346,10 +483,12 @@ class CSEMachine:
         elif operator == "le":
             result = (operand1 <= operand2)
         elif operator == "aug":
-            if operand1 == "nil":
-                result = [operand2]
-            elif type(operand1) is list:
-                result = operand1 + [operand2]
+            if operand1 is Nil:
+                result = makeTuple([operand2])
+            elif type(operand1) is Tuple:
+                result = operand1.aug(operand2)
+            else:
+                raise RPALException("Left operand of 'aug' must be a tuple or nil.")
         elif operator == "**":
             if type(operand1) is not int or type(operand2) is not int:
                 raise RPALException("Both operands must be integers for '**' operation.")
@@ -364,12 +503,9 @@ class CSEMachine:
         Pops an operator from the control stack and an operand from the stack,
         applies the operation, and pushes the result onto the stack.
         """
-        operator = self.controlStack.pop()
+        operator = self.popControl()
         operand = self.stack.pop()
 
-        if type(operand) is Token:
-            operand = operand.getValue()
-
         if operator == "not":
             result = not operand
         elif operator == "neg":
@@ -386,30 +522,30 @@ class CSEMachine:
         Pops 'beta' from the control stack and evaluates the condition from the stack.
         Depending on the condition, inserts the appropriate control structure (delta_then/delta_else branch).
         """
-        beta = self.controlStack.pop()
+        beta = self.popControl()
         if beta != "beta":
             raise RPALException("Expected 'beta' in control stack.")
         evaluated = self.stack.pop()
         if evaluated:
-            self.controlStack.pop()  # Remove the 'else' branch (not taken)
-            deltaThen = self.controlStack.pop()  # Get the 'then' branch control structure
+            self.popControl()  # Remove the 'else' branch (not taken)
+            deltaThen = self.popControl()  # Get the 'then' branch control structure
             self.insertControlStructure(deltaThen)
         else:
-            deltaElse = self.controlStack.pop()  # Get the 'else' branch control structure
-            self.controlStack.pop()  # Remove the 'then' branch (not taken)
+            deltaElse = self.popControl()  # Get the 'else' branch control structure
+            self.popControl()  # Remove the 'then' branch (not taken)
             self.insertControlStructure(deltaElse)
 
     def rule9(self):
         """
         CSE Rule 9: Handles tuple construction (tau).
         Pops a Tau control structure from the control stack and collects the specified number of elements from the stack,
-        then pushes the constructed tuple (as a list) onto the stack.
+        then pushes the constructed Tuple onto the stack.
         """
-        tau = self.controlStack.pop()
+        tau = self.popControl()
         if type(tau) is not Tau:
             raise RPALException("Expected 'tau' in control stack.")
         
-        if len(self.stack) > 0 and self.stack[-1] == "nil":
+        if len(self.stack) > 0 and self.stack[-1] is Nil:
             return
 
 
@@ -422,26 +558,61 @@ class CSEMachine:
             element = self.stack.pop()
             if type(element) is Environment:
                 return
-            if type(element) is Token:
-                element = element.getValue()
-            if type(element) is str:
-                element = element.strip("'")
+            if isString(element):
+                element = stripQuotes(element)
             listOfElements.append(element)
 
-        self.stack.append(listOfElements)
+        self.stack.append(makeTuple(listOfElements))
+
+    def parallelRule9(self):
+        """
+        CSE Rule 9 on a tuple whose components may be evaluated in parallel.
+        Pops the ParallelTau, starts evaluating its costly components in worker processes and
+        pushes a Tau followed by every component, as if the tuple had been generated in line:
+        the components are still evaluated right to left, the costly ones by waiting for
+        their workers, and the Tau then builds the tuple as usual.
+        """
+        tau = self.popControl()
+        remote = [component for component, costly in zip(tau.components, tau.remote) if costly]
+        pending = None
+        if self.parallelEvaluator is not None:
+            pending = self.parallelEvaluator.submit(remote, self.currentEnvironment)
+        if pending is not None:
+            pending = dict(zip((component.number for component in remote), pending))
+        self.pushControl(Tau(tau.elementNumber))
+        for component in tau.components:
+            if pending is not None and component.number in pending:
+                self.pushControl(pending[component.number])
+            else:
+                self.insertControlStructure(component)
+
+    def awaitComponent(self):
+        """
+        Replaces a component evaluated by a worker with its value, and counts the steps and
+        environments of the worker as if the machine had evaluated it. A component the worker
+        could not evaluate is evaluated in place.
+        """
+        pending = self.popControl()
+        evaluated, value, steps, environments = self.parallelEvaluator.result(pending)
+        if evaluated:
+            self.steps += steps
+            self.totalEnvironments += environments
+            self.stack.append(value)
+        else:
+            self.insertControlStructure(pending.control)
 
     def rule10(self):
         """
         CSE Rule 10: Handles tuple element selection.
-        Pops 'gamma' from the control stack, a tuple (list) from the stack, and an index from the stack.
+        Pops 'gamma' from the control stack, a Tuple from the stack, and an index from the stack.
         Pushes the selected tuple element onto the stack (1-based indexing).
         """
-        gamma = self.controlStack.pop()
+        gamma = self.popControl()
         tupleElements = self.stack.pop()
 
         if type(gamma) is not str or gamma != "gamma":
             raise RPALException("Expected 'gamma' in control stack.")
-        if type(tupleElements) is not list:
+        if type(tupleElements) is not Tuple:
             raise RPALException("Expected a list of elements on the stack for 'gamma' operation.")
         index = self.stack.pop()
         if not isinstance(index, int):
@@ -458,84 +629,82 @@ class CSEMachine:
         Pops 'gamma' from the control stack, a Lambda from the stack, and a list of argument values from the stack.
         Binds arguments to lambda variables, creates a new environment, and inserts the lambda's control structure.
         """
-        gamma = self.controlStack.pop()
+        tailCall = self.isTailCall()
+        gamma = self.popControl()
         lambdaControl = self.stack.pop()
         if type(gamma) is not str or gamma != "gamma":
             raise RPALException("Expected 'gamma' in control stack.")
-        if type(lambdaControl) is not Lambda:
-            raise RPALException("Expected a Lambda control structure on the stack for 'gamma' operation.")
         values = self.stack.pop()
-        if type(values) is not list:
+        if type(values) is not Tuple:
             raise RPALException("Expected a list of names on the stack for 'gamma' operation.")
         if len(values) != len(lambdaControl.variables):
             raise RPALException("Number of names does not match number of variables in lambda.")
 
-        dataDict = {}
-        for var, name in zip(lambdaControl.variables, values):
-            if type(var) is Token:
-                var = var.getValue()
-            if type(name) is Token:
-                name = name.getValue()
-            dataDict[var] = name
-        parentEnv = self.findEnvironment(lambdaControl.c)
-        if type(parentEnv) is not Environment:
-            raise RPALException(f"Parent environment with number {lambdaControl.c} is not a valid Environment.")
+        slots = values.elements()
+        parentEnv = lambdaControl.c
+        # A memoized recursive closure answers from its cache when it knows the argument
+        key = memoKey(values) if lambdaControl.cache is not None else None
+        if key is not None:
+            found, result = lambdaControl.cache.lookUp(key)
+            if found:
+                self.stack.append(result)
+                return
+        stores = None
+        if tailCall:
+            stores = self.leaveForTailCall()
+        if key is not None:
+            stores = addStore(stores, lambdaControl.cache, key)
         # Create a new environment for the lambda application
-        newEnv = Environment(self.totalEnvironments, parentEnv, dataDict)
-        #print(f"Creating new environment {newEnv.number} with parent {parentEnv.number} and variable bindings: {dataDict}")
-        self.currentEnvironment = newEnv
-        self.environments.append(newEnv)
-        self.totalEnvironments += 1
-        self.controlStack.append(newEnv)
-        self.stack.append(newEnv)
-        newControl = self.findControlStructure(lambdaControl.k)
-        if type(newControl) is not ControlStructure:
-            raise RPALException(f"Control structure with number {lambdaControl.k} is not a valid ControlStructure.")
-        self.insertControlStructure(newControl)
-
-        return
+        newEnv = self.newEnvironment(parentEnv, lambdaControl.names, slots)
+        #print(f"Creating new environment {newEnv.number} with parent {parentEnv.number} and variable bindings: {slots}")
+        self.enterEnvironment(newEnv, stores)
+        self.insertControlStructure(self.findControlStructure(lambdaControl.k))
 
     def rule12(self):
         """
         CSE Rule 12: Handles Y combinator application for recursion.
         Pops 'gamma' from the control stack, 'Y' from the stack, and a Lambda from the stack.
-        Wraps the lambda in an Eta structure and pushes it onto the stack.
+        If the lambda returns a function, pushes that function bound to itself; otherwise
+        wraps the lambda in an Eta structure and pushes it onto the stack.
         """
-        gamma = self.controlStack.pop()
+        gamma = self.popControl()
         if gamma != "gamma":
             raise RPALException("Expected 'gamma' in control stack.")
         yStar = self.stack.pop()
         if yStar != "Y":
             raise RPALException("Expected 'Y' for yStar in control stack.")
         lambdaControl = self.stack.pop()
-        if type(lambdaControl) is not Lambda:
+        if type(lambdaControl) is not Closure:
             raise RPALException("Expected a Lambda control structure on the stack for 'gamma' operation.")
+        body = self.findControlStructure(lambdaControl.k).elements
+        if len(lambdaControl.names) == 1 and len(body) == 1 and type(body[0]) is Lambda:
+            # rec f = fn ...: bind f to the function itself, so a recursive call is one application
+            closure = recursiveClosure(lambdaControl, body[0], self.totalEnvironments)
+            self.totalEnvironments += 1
+            if body[0].memoize:
+                closure.cache = MemoCache(self.memoStatistics)
+            if self.environments is not None:
+                self.environments[closure.c.number] = closure.c
+            self.stack.append(closure)
+            return
         eta  = Eta(lambdaControl)
         self.stack.append(eta)
 
     def rule13(self):
         """
         CSE Rule 13: Handles Eta structure application (for recursion).
-        Converts the Eta on the stack to a Lambda, pushes it back, and adds 'gamma' to the control stack
+        Pushes the closure of the Eta on the stack above it, and adds 'gamma' to the control stack
         to trigger further application.
         """
-        eta = self.stack[-1]
-        if type(eta) is not Eta:
-            raise RPALException("Expected an Eta instance on the stack.")
-
-        newLambda = eta.toLambda()
-
-        self.stack.append(newLambda)
-        self.controlStack.append("gamma")
-
-        return
+        self.stack.append(self.stack[-1].toClosure())
+        self.pushControl("gamma")
     
     def builtinFunction(self):
         """
         Handles built-in functions.
         Pops a built-in function name from the control stack and applies it to the top of the stack.
         """
-        self.controlStack.pop()  # Pop 'gamma'
+        self.popControl()  # Pop 'gamma'
         functionName = self.stack.pop()
         if functionName not in BUILTIN_FUNCTIONS:
             raise RPALException(f"Unknown built-in function: {functionName}")
@@ -544,37 +713,7 @@ class CSEMachine:
         
         if functionName == "print":
             # print("Output of the above program is: ")
-            if type(value) is Token:
-                value = value.getValue()
-            elif type(value) is Lambda:
-                if len(value.variables) == 1:
-                    variable = value.variables[0]
-                    if type(variable) is Token:
-                        variable = variable.getValue()
-                    value = f"[lambda closure: {variable}: {value.k}]"
-                else:
-                    variables = [v.getValue() if isinstance(v, Token) else v for v in value.variables]
-                    value = f"[lambda closure: {variables}: {value.k}]"
-            elif type(value) is list:
-                temp = []
-                for item in value:
-                    if type(item) is Token:
-                        temp.append(item.getValue())
-                    else:
-                        if type(item) is Lambda:
-                            if len(item.variables) == 1:
-                                variable = item.variables[0]
-                                if type(variable) is Token:
-                                    variable = variable.getValue()
-                                temp.append(f"[lambda closure: {variable}: {item.k}]")
-                            else:
-                                variables = [v.getValue() if isinstance(v, Token) else v for v in item.variables]
-                                temp.append(f"[lambda closure: {variables}: {item.k}]")
-                        else:
-                            temp.append(str(item))
-                value = "(" + ", ".join(temp) + ")"
-            else:
-                value = str(value).strip("'")
+            value = printableValue(value)
             self.stack.append(value)
             print(value, end="")
 
@@ -588,80 +727,105 @@ class CSEMachine:
         Processes the control stack and applies the appropriate rules until the control stack is empty.
         Returns the final result of the computation.
         """
-        while len(self.controlStack) > 0:
-            #NOTE : The rule numbers are similar to the ones in the lecture note.
-            if type(self.controlStack[-1]) is Token or self.controlStack[-1] in OTHER_KEYWORDS:
-                #print("Rule 1")
-                self.rule1()
-                #self.printStack('control')
-                #self.printStack('main')
-            elif type(self.controlStack[-1]) is Lambda:
-                #print("Rule 2")
-                self.rule2()
-                #self.printStack('control')
-                #self.printStack('main')
-            elif self.controlStack[-1] == "gamma" and type(self.stack[-1]) is str and self.stack[-1] in BUILTIN_OPERATORS:
-                #print("Rule 3")
-                self.rule3()
-                #self.printStack('control')
-                #self.printStack('main')
-            elif self.controlStack[-1] == "gamma" and type(self.stack[-1]) is Lambda and len(self.stack[-1].variables) == 1:
-                #print("Rule 4")
-                self.rule4()
-                #self.printStack('control')
-                #self.printStack('main')
-            elif type(self.controlStack[-1]) is Environment:
-                #print("Rule 5")
-                self.rule5()
-                #self.printStack('control')
-                #self.printStack('main')
-            elif self.controlStack[-1] in BINARY_OPERATORS:
-                #print("Rule 6")
-                self.rule6()
-                #self.printStack('control')
-                #self.printStack('main')
-            elif self.controlStack[-1] in UNARY_OPERATORS:
-                #print("Rule 7")
-                self.rule7()
-                #self.printStack('control')
-                #self.printStack('main')
-            elif self.controlStack[-1] == "beta":
-                #print("Rule 8")
-                self.rule8()
-                #self.printStack('control')
-                #self.printStack('main')
-            elif type(self.controlStack[-1]) is Tau:
-                #print("Rule 9")
-                self.rule9()
-                #self.printStack('control')
-                #self.printStack('main')
-            elif self.controlStack[-1] == "gamma" and type(self.stack[-1]) is list and len(self.stack[-1]) > 0:
-                #print("Rule 10")
-                self.rule10()
-                #self.printStack('control')
-                #self.printStack('main')
-            elif self.controlStack[-1] == "gamma" and type(self.stack[-1]) is Lambda and len(self.stack[-1].variables) > 1:
-                #print("Rule 11")
-                self.rule11()
-                #self.printStack('control')
-                #self.printStack('main')
-            elif self.controlStack[-1] == "gamma" and type(self.stack[-1]) is str and self.stack[-1] == "Y":
-                #print("Rule 12")
-                self.rule12()
-                #self.printStack('control')
-                #self.printStack('main')
-            elif self.controlStack[-1] == "gamma" and type(self.stack[-1]) is Eta:
-                #print("Rule 13")
-                self.rule13()
-                #self.printStack('control')
-                #self.printStack('main')
-            elif self.controlStack[-1] == "gamma" and self.stack[-1] in BUILTIN_FUNCTIONS:
-                #print("Rule Builtin Function")
-                self.builtinFunction()
-                #self.printStack('control')
-                #self.printStack('main')
-            else:
-                raise RPALException(f"Illegal Function Appication")
+        try:
+            return self.run()
+        finally:
+            if self.parallelEvaluator is not None:
+                self.parallelEvaluator.close()
+
+    def run(self):
+        """
+        Processes the control stack until it is empty and returns the final result.
+        """
+        # Counted in a local, which is cheaper than an attribute on every step
+        steps = 0
+        try:
+            while len(self.controlStack) > 0:
+                steps += 1
+                control = self.peekControl()
+                #NOTE : The rule numbers are similar to the ones in the lecture note.
+                if type(control) is Reference or type(control) is Constant or type(control) is Token or control in OTHER_KEYWORDS:
+                    #print("Rule 1")
+                    self.rule1()
+                    #self.printStack('control')
+                    #self.printStack('main')
+                elif type(control) is Lambda:
+                    #print("Rule 2")
+                    self.rule2()
+                    #self.printStack('control')
+                    #self.printStack('main')
+                elif control == "gamma" and type(self.stack[-1]) is str and self.stack[-1] in BUILTIN_OPERATORS:
+                    #print("Rule 3")
+                    self.rule3()
+                    #self.printStack('control')
+                    #self.printStack('main')
+                elif control == "gamma" and type(self.stack[-1]) is Closure and len(self.stack[-1].variables) == 1:
+                    #print("Rule 4")
+                    self.rule4()
+                    #self.printStack('control')
+                    #self.printStack('main')
+                elif type(control) is Environment:
+                    #print("Rule 5")
+                    self.rule5()
+                    #self.printStack('control')
+                    #self.printStack('main')
+                elif control in BINARY_OPERATORS:
+                    #print("Rule 6")
+                    self.rule6()
+                    #self.printStack('control')
+                    #self.printStack('main')
+                elif control in UNARY_OPERATORS:
+                    #print("Rule 7")
+                    self.rule7()
+                    #self.printStack('control')
+                    #self.printStack('main')
+                elif control == "beta":
+                    #print("Rule 8")
+                    self.rule8()
+                    #self.printStack('control')
+                    #self.printStack('main')
+                elif type(control) is Tau:
+                    #print("Rule 9")
+                    self.rule9()
+                    #self.printStack('control')
+                    #self.printStack('main')
+                elif type(control) is ParallelTau:
+                    # Not a step: the tuple is evaluated in as many steps as when it is in line
+                    steps -= 1
+                    self.parallelRule9()
+                elif type(control) is PendingComponent:
+                    # Not a step: awaitComponent adds the steps of the worker
+                    steps -= 1
+                    self.awaitComponent()
+                elif control == "gamma" and type(self.stack[-1]) is Tuple and len(self.stack[-1]) > 0:
+                    #print("Rule 10")
+                    self.rule10()
+                    #self.printStack('control')
+                    #self.printStack('main')
+                elif control == "gamma" and type(self.stack[-1]) is Closure and len(self.stack[-1].variables) > 1:
+                    #print("Rule 11")
+                    self.rule11()
+                    #self.printStack('control')
+                    #self.printStack('main')
+                elif control == "gamma" and type(self.stack[-1]) is str and self.stack[-1] == "Y":
+                    #print("Rule 12")
+                    self.rule12()
+                    #self.printStack('control')
+                    #self.printStack('main')
+                elif control == "gamma" and type(self.stack[-1]) is Eta:
+                    #print("Rule 13")
+                    self.rule13()
+                    #self.printStack('control')
+                    #self.printStack('main')
+                elif control == "gamma" and self.stack[-1] in BUILTIN_FUNCTIONS:
+                    #print("Rule Builtin Function")
+                    self.builtinFunction()
+                    #self.printStack('control')
+                    #self.printStack('main')
+                else:
+                    raise RPALException(f"Illegal Function Appication")
+        finally:
+            self.steps += steps
         
         
         return self.stack[-1] if len(self.stack) > 0 else None
@@ -1,34 +1,36 @@
 from Interpreter.Exception.RPALException import RPALException
+from Interpreter.CSE.values import Closure
 from Interpreter.Tokenizer.tokenizer import Token
 
 class Lambda:
     """
     Represents a lambda abstraction in the control structure.
     Stores the index of the control structure (k) and the variables it binds.
+    Evaluating it builds a Closure.
     """
-    def __init__(self, k, variables):
+    # Set on the lambda of a pure recursive function, see RecursionMemoizer
+    memoize = False
+
+    def __init__(self, k, variables, names=None):
         self.k = k
         if isinstance(variables, list):
             self.variables = variables
         else:
             self.variables = [variables]
-        self.c = None  # Placeholder for the evironment associated with this lambda
+        # Names of the environment slots created when the lambda is applied
+        if names is None:
+            names = tuple(v.getValue() if isinstance(v, Token) else v for v in self.variables)
+        self.names = names
 
-    def setC(self, c):
-        """
-        Sets the environment number associated with this lambda.
-        Args:
-            c: The environment to associate with this lambda.
-        """
-        self.c = c
-    def getC(self):
-        """
-        Returns the environment number associated with this lambda.
-        """
-        return self.c
-    
-    
-    
+class Constant:
+    """
+    Represents a literal in the control structure: the integer, string or truth value of
+    its token, converted once when the control structures are generated.
+    """
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
 
 class Tau:
     """
@@ -46,40 +48,70 @@ class Tau:
     
     
 
+class ParallelTau:
+    """
+    Represents a tuple (tau) node whose components the machine may evaluate in worker
+    processes, see TupleParallelizer. Each component is a control structure of its own;
+    remote tells which components are costly enough to be sent to a worker.
+    """
+    def __init__(self, elementNumber, components, remote):
+        self.elementNumber = elementNumber
+        self.components = components
+        self.remote = remote
+
 class Eta:
-    def __init__(self, lambdaNode):
+    """
+    Represents the value of Y applied to a closure that does not return a lambda.
+    Applying it applies the closure to the eta itself first.
+    """
+    __slots__ = ("k", "variables", "names", "c")
+
+    def __init__(self, closure):
         """
-        Represents an eta structure in the control structure.
-        Stores the lambda structure associated with this eta.
         Args:
-            lambda (Lambda): The lambda to associate with this eta.
+            closure (Closure): The closure Y is applied to.
         """
-        if not isinstance(lambdaNode, Lambda):
+        if type(closure) is not Closure:
             raise RPALException("Eta must be associated with a Lambda")
-        self.k = lambdaNode.k
-        self.variables = lambdaNode.variables
-        self.c = lambdaNode.c
+        self.k = closure.k
+        self.variables = closure.variables
+        self.names = closure.names
+        self.c = closure.c
 
-        return
-    
-    def toLambda(self):
+    def toClosure(self):
         """
-        Generates a Lambda instance from this eta reduction.
-        Returns:
-            Lambda: The Lambda instance associated with this eta.
+        Returns the closure the eta was built from.
         """
-        lambdaNode = Lambda(self.k, self.variables)
-        lambdaNode.setC(self.c)
-        return lambdaNode
+        return Closure(self.k, self.variables, self.names, self.c)
+
+class Reference:
+    """
+    Represents an identifier resolved to a lexical address in the control structure.
+    Stores the identifier (a Token, or 'nil'/'Y'), how many environments up its binding
+    lives (depth) and its slot index in that environment.
+    """
+    def __init__(self, name, depth, index):
+        self.name = name
+        self.depth = depth
+        self.index = index
+
+    def getName(self):
+        """
+        Returns the identifier as a string.
+        """
+        return self.name.getValue() if isinstance(self.name, Token) else self.name
 
 class ControlStructure:
     """
     Represents a control structure (delta) which contains a sequence of structures.
     Each control structure has a unique number.
+    tailCall is set when its last executed element (elements[0]) is a 'gamma' whose result
+    is the result of the enclosing lambda, so the machine can reuse the caller's frame.
     """
     def __init__(self, number):
         self.number = number
         self.elements = []
+        self.tailCall = False
 
 class CSGenerator:
     """
@@ -97,10 +129,17 @@ class CSGenerator:
                     print(f"<lambda {element.k}, {element.variables}>", end=" ")
                 elif isinstance(element, Tau):
                     print(f"<tau({element.elementNumber})>", end=" ")
+                elif isinstance(element, ParallelTau):
+                    numbers = [component.number for component in element.components]
+                    print(f"<tau({element.elementNumber}) of deltas {numbers}>", end=" ")
                 elif isinstance(element, ControlStructure):
                     print(f"<delta {element.number}>", end=" ")
                 elif isinstance(element, Token):
                     print(f"<{element.value}>", end=" ")
+                elif isinstance(element, Reference):
+                    print(f"<{element.getName()}@{element.depth}.{element.index}>", end=" ")
+                elif isinstance(element, Constant):
+                    print(f"<{element.value!r}>", end=" ")
                 else:
                     print(f"<{element}>", end=" ")
             print()  # New line after each control structure
@@ -113,12 +152,13 @@ class CSGenerator:
         """
         return self.controlStructures
     
-    def createControlStructure(self, number, node):
+    def createControlStructure(self, number, node, tail=False):
         """
         Creates a new ControlStructure instance with the specified identifier and associates it with the provided AST node.
         Args:
             number (int): The unique identifier for the control structure.
             node (ASTNode): The AST node to associate with this control structure.
+            tail (bool): Whether the value of the node is the value of the enclosing lambda.
         Returns:
             ControlStructure: The newly created ControlStructure instance.
         """
@@ -126,16 +166,19 @@ class CSGenerator:
         cs = ControlStructure(number)
         self.controlStructures.append(cs)
         #print("total control structures:", len(self.controlStructures))
-        self.addToControlStructure(cs, node)
+        self.addToControlStructure(cs, node, tail)
+        # The application evaluated last in a tail position is a tail call
+        cs.tailCall = tail and len(cs.elements) > 0 and type(cs.elements[0]) is str and cs.elements[0] == "gamma"
         return cs  # Return the created control structure for reference
 
-    def addToControlStructure(self, cs, node):
+    def addToControlStructure(self, cs, node, tail=False):
         """
         Recursively adds elements to the given control structure based on the AST node.
         Handles different node types: lambda, ->, tau, and others.
         Args:
             cs (ControlStructure): The control structure to add elements to.
             node (ASTNode): The AST node to process.
+            tail (bool): Whether the control structure is in a tail position.
         """
         # Handle lambda abstraction nodes
         if node.head == "lambda":
@@ -146,10 +189,12 @@ class CSGenerator:
                 if len(variables) < 1:
                     raise RPALException("Lambda node with ',' must have at least one variable")
                 # Create a new control structure for the lambda body
-                self.createControlStructure(k, node.child[1])
+                self.createControlStructure(k, node.child[1], tail=True)
                 variablesToPrint = [var.head.getValue() if isinstance(var.head, Token) else var.head for var in variables]
                 #print(f"adding<lambda {k}, {variablesToPrint}> to control structure {cs.number}")
-                cs.elements.append(Lambda(k, [var.head for var in variables]))
+                lambdaControl = Lambda(k, [var.head for var in variables])
+                lambdaControl.memoize = node.memoize
+                cs.elements.append(lambdaControl)
                 return
 
             # Single variable lambda
@@ -159,10 +204,12 @@ class CSGenerator:
             k = len(self.controlStructures)
             # Create a new control structure for the lambda body
             #print(f"creating control structure for lambda with k={k} {node.child[1].head}, variable={variable}")
-            self.createControlStructure(k, node.child[1])
+            self.createControlStructure(k, node.child[1], tail=True)
             #printVariable = variable.getValue() if isinstance(variable, Token) else variable
             #print(f"adding<lambda {k}, {#printVariable}> to control structure {cs.number}")
-            cs.elements.append(Lambda(k, variable))
+            lambdaControl = Lambda(k, variable)
+            lambdaControl.memoize = node.memoize
+            cs.elements.append(lambdaControl)
             #print(f"adding<lambda {k}, {variable}> to control structure {cs.number}")
             return
         
@@ -170,12 +217,14 @@ class CSGenerator:
         if node.head == "->":
             if len(node.child) != 3:
                 raise RPALException("Node with head '->' must have exactly three children")
+            # The branches are in a tail position if the conditional is the last thing evaluated
+            branchTail = tail and len(cs.elements) == 0
             #print("creating delta then")
             # Create control structure for 'then' branch
-            deltaThen = self.createControlStructure(len(self.controlStructures), node.child[1])
+            deltaThen = self.createControlStructure(len(self.controlStructures), node.child[1], branchTail)
             #print("creating delta else")
             # Create control structure for 'else' branch
-            deltaElse = self.createControlStructure(len(self.controlStructures), node.child[2])
+            deltaElse = self.createControlStructure(len(self.controlStructures), node.child[2], branchTail)
             #print(f"adding< detla(then){deltaThen.number}, delta(else){deltaElse.number}> to control structure {cs.number}")
             cs.elements.append(deltaThen)
             cs.elements.append(deltaElse)
@@ -192,6 +241,11 @@ class CSGenerator:
         if node.head == "tau":
             if len(node.child) < 2:
                 raise RPALException("Node with head 'tau' must have at least two children")
+            if node.parallel is not None:
+                # Each component gets its own control structure, so a worker can evaluate it
+                components = [self.createControlStructure(len(self.controlStructures), child) for child in node.child]
+                cs.elements.append(ParallelTau(len(node.child), components, list(node.parallel)))
+                return
             #print(f"adding<tau({len(node.child)})> to control structure {cs.number}")
             cs.elements.append(Tau(len(node.child)))
             # Add each child of the tuple to the control structure
@@ -205,6 +259,13 @@ class CSGenerator:
         label = node.head
         #printLabel = label.getValue() if isinstance(label, Token) else label
         #print(f"adding<{#printLabel}> to control structure {cs.number}")
+        if node.address is not None:
+            # Identifier resolved by the LexicalResolver
+            label = Reference(label, node.address[0], node.address[1])
+        elif type(label) is Token and label.getType() == "INT":
+            label = Constant(int(label.getValue()))
+        elif type(label) is Token and label.getType() in ("STRING", "TRUTHVALUE"):
+            label = Constant(label.getValue())
         cs.elements.append(label)
         # Recursively add children in preorder traversal if they exist
         if node.child and len(node.child) > 0:
@@ -0,0 +1,108 @@
+from collections import OrderedDict
+
+from Interpreter.CSE.values import Text, Tuple
+
+# Largest number of results kept for one recursive function
+MEMO_CACHE_SIZE = 65536
+# Largest number of integers, strings and truth values in an argument that is used as a key
+MAX_KEY_SIZE = 64
+# Longest string in an argument that is used as a key
+MAX_KEY_STRING_LENGTH = 256
+
+def memoKey(value):
+    """
+    Returns a hashable key equal for structurally equal argument values, or None if the value
+    holds something other than integers, strings, truth values and tuples, or is too large
+    to be worth hashing on every call.
+    Truth values are tagged, so true and 1 are different keys.
+    """
+    budget = [MAX_KEY_SIZE]
+
+    def key(value):
+        budget[0] -= 1
+        if budget[0] < 0:
+            return None
+        if type(value) is int:
+            return value
+        if type(value) is bool:
+            return ("truth", value)
+        if type(value) is str or type(value) is Text:
+            if len(value) > MAX_KEY_STRING_LENGTH:
+                return None
+            return str(value)
+        if type(value) is Tuple:
+            keys = ["tau"]
+            for item in value:
+                itemKey = key(item)
+                if itemKey is None:
+                    return None
+                keys.append(itemKey)
+            return tuple(keys)
+        return None
+
+    return key(value)
+
+class MemoStatistics:
+    """
+    Counts the memo lookups of every recursive function memoized during a run.
+    """
+    def __init__(self):
+        self.functions = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def asDict(self):
+        return {
+            "memoFunctions": self.functions,
+            "memoHits": self.hits,
+            "memoMisses": self.misses,
+            "memoEvictions": self.evictions,
+        }
+
+class MemoCache:
+    """
+    Results of one recursive closure, indexed by memoKey of the argument.
+    The least recently used result is evicted once MEMO_CACHE_SIZE results are kept.
+    """
+    def __init__(self, statistics):
+        self.results = OrderedDict()
+        self.statistics = statistics
+        statistics.functions += 1
+
+    def lookUp(self, key):
+        """
+        Returns (True, result) if the result for key is known, otherwise (False, None).
+        """
+        results = self.results
+        if key in results:
+            results.move_to_end(key)
+            self.statistics.hits += 1
+            return True, results[key]
+        self.statistics.misses += 1
+        return False, None
+
+    def store(self, key, result):
+        results = self.results
+        results[key] = result
+        if len(results) > MEMO_CACHE_SIZE:
+            results.popitem(last=False)
+            self.statistics.evictions += 1
+
+def addStore(stores, cache, key):
+    """
+    Returns the pending stores of a frame with the result of cache for key added.
+    A tail call hands the stores of the frame it leaves to the callee, so the list only ever
+    belongs to one frame and is extended in place.
+    """
+    if stores is None:
+        return [(cache, key)]
+    stores.append((cache, key))
+    return stores
+
+def storeResults(stores, result):
+    """
+    Records the result of a frame for every memoized call it answers.
+    """
+    for cache, key in stores:
+        cache.store(key, result)
@@ -0,0 +1,126 @@
+import multiprocessing
+import os
+import pickle
+import threading
+import time
+
+# Worker processes evaluating tuple components; fewer than 2 evaluates every tuple in order
+PARALLEL_WORKERS = int(os.environ.get("RPAL_PARALLEL_WORKERS", os.cpu_count() or 1))
+# Seconds between two checks of a worker that the machine which started it still runs
+PARENT_CHECK_INTERVAL = 1
+
+# Control structures of the program, set once in every worker process
+workerControls = None
+
+def watchParent(parent):
+    """
+    Stops the worker once the machine that started it is gone, for example when the request
+    timed out and its process was terminated while a component was still being evaluated.
+    """
+    while True:
+        time.sleep(PARENT_CHECK_INTERVAL)
+        if os.getppid() != parent:
+            os._exit(1)
+
+def startWorker(controls, parent):
+    global workerControls
+    workerControls = controls
+    threading.Thread(target=watchParent, args=(parent,), daemon=True).start()
+
+def evaluateComponent(number, environment):
+    """
+    Evaluates the component in control structure number in a worker process.
+    Returns (True, value, steps, environments) when the component left exactly its value on
+    the stack, with the steps and environments it took in the machine, and (False, None, 0, 0)
+    otherwise: the machine then evaluates the component itself, so errors and the stack effects
+    of malformed programs are those of an evaluation in order.
+    """
+    # Imported here since the machine imports this module
+    from Interpreter.CSE.CSEMachine import CSEMachine
+    from Interpreter.Environment.Environment import Environment
+    try:
+        machine = CSEMachine(workerControls, pickle.loads(environment), entry=number)
+        value = machine.interpret()
+    except Exception:
+        return (False, None, 0, 0)
+    if len(machine.stack) != 1 or len(machine.frames) != 0 or type(value) is Environment:
+        return (False, None, 0, 0)
+    # The last step left the environment the worker started in, which an evaluation in
+    # order does not enter
+    return (True, value, machine.steps - 1, machine.totalEnvironments - 1)
+
+class PendingComponent:
+    """
+    Represents a tuple component evaluated by a worker in the control structure. The machine
+    replaces it with the value of the component, or with the component itself when the worker
+    could not evaluate it.
+    """
+    def __init__(self, result, control):
+        self.result = result
+        self.control = control
+
+class ParallelEvaluator:
+    """
+    Process pool evaluating the costly components of the tuples marked by TupleParallelizer.
+    The pool is started on the first tuple and stopped with the machine. Every worker gets
+    the control structures once; a component is sent as the number of its control structure
+    and the environment it is evaluated in, pickled once per tuple.
+    Sending work to the pool is an optimization only: a component whose environment or value
+    cannot be pickled is evaluated by the machine.
+    """
+    def __init__(self, controls, workers=PARALLEL_WORKERS):
+        """
+        Args:
+            controls (list): The control structures of the program.
+            workers (int): The number of worker processes.
+        """
+        self.controls = controls
+        self.workers = workers
+        self.pool = None
+        self.components = 0
+        self.fallbacks = 0
+
+    def submit(self, components, environment):
+        """
+        Starts evaluating the components in the environment.
+        Returns a PendingComponent for each of them, or None if none can be sent to the pool.
+        """
+        if self.workers < 2:
+            return None
+        try:
+            payload = pickle.dumps(environment, pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError, RecursionError):
+            return None
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(self.workers, initializer=startWorker, initargs=(self.controls, os.getpid()))
+        self.components += len(components)
+        return [PendingComponent(self.pool.apply_async(evaluateComponent, (component.number, payload)), component) for component in components]
+
+    def result(self, pending):
+        """
+        Waits for the worker evaluating the component.
+        Returns (True, value, steps, environments), or (False, None, 0, 0) when the machine
+        must evaluate it.
+        """
+        try:
+            evaluated, value, steps, environments = pending.result.get()
+        except Exception:
+            evaluated, value, steps, environments = False, None, 0, 0
+        if not evaluated:
+            self.fallbacks += 1
+        return evaluated, value, steps, environments
+
+    def statistics(self):
+        return {
+            "parallelComponents": self.components,
+            "parallelFallbacks": self.fallbacks,
+        }
+
+    def close(self):
+        """
+        Stops the workers, including those evaluating components whose value is not needed.
+        """
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
@@ -0,0 +1,258 @@
+import os
+import time
+
+from Interpreter.CSE.CSEMachine import CSEMachine
+from Interpreter.CSE.generateCS import Lambda
+from Interpreter.CSE.trace import TRACED_RULES
+from Interpreter.Tokenizer.tokenizer import Token
+
+# Functions listed in the summary of a profile
+PROFILE_TOP = int(os.environ.get("RPAL_PROFILE_TOP", 10))
+# Deepest call stack kept in the collapsed stacks; deeper calls are folded into the frame at
+# this depth, and a function calling itself directly is folded into its own frame
+MAX_STACK_DEPTH = 100
+
+def functionLabels(controls):
+    """
+    Returns the label and the source line of the function of every control structure that is
+    the body of a lambda, by control structure number; the program is control structure 0.
+    """
+    labels = {0: ("program", None)}
+    for control in controls:
+        for element in control.elements:
+            if type(element) is Lambda and element.k not in labels:
+                line = None
+                for variable in element.variables:
+                    if type(variable) is Token:
+                        line = variable.getLineNumber()
+                        break
+                names = " ".join(str(name) for name in element.names)
+                where = f"line {line}, delta {element.k}" if line is not None else f"delta {element.k}"
+                labels[element.k] = (f"lambda {names} ({where})", line)
+    return labels
+
+class FunctionProfile:
+    """
+    The cost of one function: its calls, the steps, seconds and environments of its own
+    bodies (self) and of its calls with everything they called (inclusive). A recursive call
+    is only counted once in the inclusive cost of the outermost call.
+    """
+    __slots__ = ("k", "label", "line", "calls", "steps", "inclusiveSteps", "time", "inclusiveTime", "environments", "active")
+
+    def __init__(self, k, label, line):
+        self.k = k
+        self.label = label
+        self.line = line
+        self.calls = 0
+        self.steps = 0
+        self.inclusiveSteps = 0
+        self.time = 0.0
+        self.inclusiveTime = 0.0
+        self.environments = 0
+        self.active = 0
+
+    def export(self):
+        return {
+            "function": self.label,
+            "delta": self.k,
+            "line": self.line,
+            "calls": self.calls,
+            "selfSteps": self.steps,
+            "inclusiveSteps": self.inclusiveSteps,
+            "selfTime": self.time,
+            "inclusiveTime": self.inclusiveTime,
+            "environments": self.environments,
+        }
+
+class Profiler:
+    """
+    Attributes the steps, time and environments of a run of the CSE machine to the lambdas
+    whose bodies were running. Calls are seen when a body is entered and left, so a step costs
+    only the count of the rule applied. The self cost of every call is also added to its call
+    stack, kept as a tree of frames, for the collapsed stacks flame graph tools read.
+    """
+    def __init__(self, controls):
+        """
+        Args:
+            controls (list): The control structures of the program.
+        """
+        self.labels = functionLabels(controls)
+        self.functions = {}
+        # Open calls: [profile, frame, steps, time, environments, child steps, child time, child environments]
+        self.calls = []
+        # Frames of the call stack tree, by index: function, parent, depth, children, self steps, self time
+        self.frameFunction = [None]
+        self.frameParent = [-1]
+        self.frameDepth = [0]
+        self.frameChildren = [{}]
+        self.frameSteps = [0]
+        self.frameTime = [0.0]
+
+    def function(self, k):
+        profile = self.functions.get(k)
+        if profile is None:
+            label, line = self.labels.get(k, (f"delta {k}", None))
+            profile = self.functions[k] = FunctionProfile(k, label, line)
+        return profile
+
+    def frame(self, k):
+        """
+        Returns the frame of a call to k from the innermost open call.
+        """
+        parent = self.calls[-1][1] if self.calls else 0
+        if self.frameFunction[parent] == k or self.frameDepth[parent] >= MAX_STACK_DEPTH:
+            return parent
+        frame = self.frameChildren[parent].get(k)
+        if frame is None:
+            frame = len(self.frameFunction)
+            self.frameChildren[parent][k] = frame
+            self.frameFunction.append(k)
+            self.frameParent.append(parent)
+            self.frameDepth.append(self.frameDepth[parent] + 1)
+            self.frameChildren.append({})
+            self.frameSteps.append(0)
+            self.frameTime.append(0.0)
+        return frame
+
+    def enter(self, k, steps, environments):
+        """
+        Opens a call to the body of the lambda k after the given step count and number of
+        environments created.
+        """
+        profile = self.function(k)
+        profile.calls += 1
+        profile.active += 1
+        self.calls.append([profile, self.frame(k), steps, time.perf_counter(), environments, 0, 0.0, 0])
+
+    def leave(self, steps, environments):
+        """
+        Closes the innermost open call.
+        """
+        profile, frame, startSteps, startTime, startEnvironments, childSteps, childTime, childEnvironments = self.calls.pop()
+        totalSteps = steps - startSteps
+        totalTime = time.perf_counter() - startTime
+        totalEnvironments = environments - startEnvironments
+        profile.steps += totalSteps - childSteps
+        profile.time += totalTime - childTime
+        profile.environments += totalEnvironments - childEnvironments
+        profile.active -= 1
+        if profile.active == 0:
+            profile.inclusiveSteps += totalSteps
+            profile.inclusiveTime += totalTime
+        self.frameSteps[frame] += totalSteps - childSteps
+        self.frameTime[frame] += totalTime - childTime
+        if self.calls:
+            caller = self.calls[-1]
+            caller[5] += totalSteps
+            caller[6] += totalTime
+            caller[7] += totalEnvironments
+
+    def close(self, steps, environments):
+        """
+        Closes the calls still open, when the run ended or failed.
+        """
+        while self.calls:
+            self.leave(steps, environments)
+
+    def top(self, count=PROFILE_TOP):
+        """
+        Returns the count functions with the most steps of their own, with their costs.
+        """
+        functions = sorted(self.functions.values(), key=lambda profile: (-profile.steps, profile.k))
+        return [profile.export() for profile in functions[:count]]
+
+    def collapsed(self, weight="steps"):
+        """
+        Returns the collapsed stacks of the run, one 'frame;frame;frame cost' line per call
+        stack, as read by flamegraph.pl and speedscope. The cost is the self steps of the stack,
+        or its self time in microseconds with weight "time".
+        """
+        lines = []
+        for frame in range(1, len(self.frameFunction)):
+            cost = self.frameSteps[frame] if weight == "steps" else int(self.frameTime[frame] * 1000000)
+            if cost <= 0:
+                continue
+            names = []
+            current = frame
+            while current > 0:
+                names.append(self.function(self.frameFunction[current]).label)
+                current = self.frameParent[current]
+            lines.append(";".join(reversed(names)) + f" {cost}")
+        return "\n".join(lines)
+
+    def export(self, count=PROFILE_TOP):
+        """
+        Returns the JSON-ready profile: the top functions and the collapsed stacks by steps.
+        """
+        return {
+            "top": self.top(count),
+            "collapsed": self.collapsed(),
+        }
+
+def countedRule(method):
+    """
+    Wraps a rule of the machine so that its step is counted.
+    """
+    def rule(self):
+        self.profileSteps += 1
+        method(self)
+    rule.__name__ = method.__name__
+    rule.__doc__ = method.__doc__
+    return rule
+
+class ProfilingCSEMachine(CSEMachine):
+    """
+    CSE machine attributing its steps, time and environments to the lambdas of the program in
+    a Profiler. A call starts when a body is inserted after the marker of a new environment
+    and ends with rule 5, or when a tail call leaves the environment, so the profiler is only
+    told about calls; every step only adds to a counter. Components of tuples evaluated in
+    worker processes are not profiled.
+    """
+    def __init__(self, controls, environment, profiler=None, **options):
+        """
+        Args:
+            controls (list): The control structures of the program.
+            environment (Environment): The primitive environment.
+            profiler (Profiler, optional): The profiler of the run. Defaults to a new one.
+            options: The options of CSEMachine.
+        """
+        self.profiler = profiler if profiler is not None else Profiler(controls)
+        self.profileSteps = 0
+        # Environments created before the call being entered, until its body is inserted
+        self.entering = None
+        super().__init__(controls, environment, **options)
+
+    def interpret(self):
+        try:
+            return super().interpret()
+        finally:
+            self.profiler.close(self.profileSteps, self.totalEnvironments)
+
+    def enterEnvironment(self, environment, stores=None):
+        super().enterEnvironment(environment, stores)
+        # The environment of a call is counted as created by the call
+        created = environment.number == self.totalEnvironments - 1
+        self.entering = self.totalEnvironments - 1 if created else self.totalEnvironments
+
+    def insertControlStructure(self, control):
+        super().insertControlStructure(control)
+        if self.entering is not None:
+            self.profiler.enter(control.number, self.profileSteps, self.entering)
+            self.entering = None
+
+    def leaveForTailCall(self):
+        frames = len(self.frames)
+        stores = super().leaveForTailCall()
+        if len(self.frames) < frames:
+            self.profiler.leave(self.profileSteps, self.totalEnvironments)
+        return stores
+
+    def rule5(self):
+        self.profileSteps += 1
+        super().rule5()
+        self.profiler.leave(self.profileSteps, self.totalEnvironments)
+
+# Expanding a parallel tuple and awaiting a component are not steps of the machine
+for ruleMethod in TRACED_RULES:
+    if ruleMethod not in ("rule5", "parallelRule9", "awaitComponent"):
+        setattr(ProfilingCSEMachine, ruleMethod, countedRule(getattr(CSEMachine, ruleMethod)))
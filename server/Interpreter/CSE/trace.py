@@ -0,0 +1,319 @@
+import json
+import os
+from bisect import bisect_right
+from collections import deque
+from itertools import islice
+
+from Interpreter.CSE.CSEMachine import CSEMachine, elementText
+from Interpreter.Exception.RPALException import RPALException
+
+# Steps kept by a recorder; older steps are dropped as the machine runs
+TRACE_CAPACITY = int(os.environ.get("RPAL_TRACE_CAPACITY", 10000))
+# Steps between two full snapshots of the machine; a state is rebuilt from the snapshot
+# before it, so this bounds the steps replayed
+CHECKPOINT_INTERVAL = 1000
+# Longest text of an element in an exported trace; longer tuples and strings are cut
+TRACE_TEXT_LENGTH = 80
+# Steps exported by default: the last ones, so a long run does not send its whole buffer
+TRACE_WINDOW = CHECKPOINT_INTERVAL
+# Elements of each stack kept from the top in an exported state; the ones below are counted
+TRACE_STATE_DEPTH = 200
+
+# Rules of the machine, by method, and their names in the trace
+TRACED_RULES = {
+    "rule1": "Rule 1",
+    "rule2": "Rule 2",
+    "rule3": "Rule 3",
+    "rule4": "Rule 4",
+    "rule5": "Rule 5",
+    "rule6": "Rule 6",
+    "rule7": "Rule 7",
+    "rule8": "Rule 8",
+    "rule9": "Rule 9",
+    "parallelRule9": "Rule 9 (parallel)",
+    "awaitComponent": "Parallel component",
+    "rule10": "Rule 10",
+    "rule11": "Rule 11",
+    "rule12": "Rule 12",
+    "rule13": "Rule 13",
+    "builtinFunction": "Builtin function",
+}
+
+def environmentNumber(machine):
+    """
+    Returns the number of the current environment, None once the program has left the last one.
+    """
+    environment = machine.currentEnvironment
+    return environment.number if environment is not None else None
+
+def shortText(item):
+    text = elementText(item)
+    if len(text) > TRACE_TEXT_LENGTH:
+        return text[:TRACE_TEXT_LENGTH - 3] + "..."
+    return text
+
+class TracedStack(list):
+    """
+    Stack of a traced machine. Remembers the lowest height it was popped to since the last
+    step, so the elements a step pushed are the ones above that height, found without
+    comparing the whole stack.
+    """
+    def __init__(self, items=()):
+        super().__init__(items)
+        self.low = len(self)
+
+    def pop(self, index=-1):
+        value = super().pop(index)
+        position = index if index >= 0 else len(self) + 1 + index
+        if position < self.low:
+            self.low = position
+        return value
+
+    def __delitem__(self, index):
+        start = index.start if type(index) is slice else index
+        if start is None:
+            start = 0
+        elif start < 0:
+            start += len(self)
+        super().__delitem__(index)
+        if start < self.low:
+            self.low = start
+
+    def delta(self, height):
+        """
+        Returns the number of elements the step popped off a stack of the given height and
+        the elements it pushed, and starts the next step.
+        """
+        low = min(self.low, len(self))
+        pushed = tuple(self[low:])
+        self.low = len(self)
+        return height - low, pushed
+
+class TraceStep:
+    """
+    The change one step made to the machine: the rule applied, the number of elements popped
+    off the control stack and the stack and the elements pushed onto them, bottom to top,
+    the current environment after the step and the number of environments it created.
+    """
+    __slots__ = ("step", "rule", "controlPopped", "controlPushed", "stackPopped", "stackPushed", "environment", "created")
+
+    def __init__(self, step, rule, controlPopped, controlPushed, stackPopped, stackPushed, environment, created):
+        self.step = step
+        self.rule = rule
+        self.controlPopped = controlPopped
+        self.controlPushed = controlPushed
+        self.stackPopped = stackPopped
+        self.stackPushed = stackPushed
+        self.environment = environment
+        self.created = created
+
+    def export(self):
+        return {
+            "step": self.step,
+            "rule": self.rule,
+            "controlPopped": self.controlPopped,
+            "controlPushed": [shortText(item) for item in self.controlPushed],
+            "stackPopped": self.stackPopped,
+            "stackPushed": [shortText(item) for item in self.stackPushed],
+            "environment": self.environment,
+            "created": self.created,
+        }
+
+class TraceState:
+    """
+    The full state of the machine after a step: the control stack and the stack, bottom to
+    top, and the number of the current environment.
+    """
+    __slots__ = ("step", "rule", "control", "stack", "environment")
+
+    def __init__(self, step, rule, control, stack, environment):
+        self.step = step
+        self.rule = rule
+        self.control = control
+        self.stack = stack
+        self.environment = environment
+
+    def export(self, depth=None):
+        """
+        Returns the JSON-ready state, with only the top depth elements of each stack, if given,
+        and the number of elements left out below them.
+        """
+        control = self.control if depth is None else self.control[max(len(self.control) - depth, 0):]
+        stack = self.stack if depth is None else self.stack[max(len(self.stack) - depth, 0):]
+        return {
+            "step": self.step,
+            "rule": self.rule,
+            "control": [shortText(item) for item in control],
+            "controlOmitted": len(self.control) - len(control),
+            "stack": [shortText(item) for item in stack],
+            "stackOmitted": len(self.stack) - len(stack),
+            "environment": self.environment,
+        }
+
+class TraceRecorder:
+    """
+    Records the steps of a TracingCSEMachine as deltas in a ring buffer of the last capacity
+    steps, with a full snapshot of the machine every checkpointInterval steps. Recording a step
+    costs the elements it pushed, not the size of the stacks, and the state after any step
+    still in the buffer is rebuilt from the snapshot before it.
+    Elements are kept by reference; they are only turned into text when the trace is exported.
+    """
+    def __init__(self, capacity=TRACE_CAPACITY, checkpointInterval=CHECKPOINT_INTERVAL):
+        """
+        Args:
+            capacity (int): The number of steps kept.
+            checkpointInterval (int): The number of steps between two snapshots.
+        """
+        if checkpointInterval < 1 or capacity < checkpointInterval:
+            raise RPALException("The trace must hold at least the steps between two checkpoints.")
+        self.capacity = capacity
+        self.checkpointInterval = checkpointInterval
+        self.steps = deque(maxlen=capacity)
+        # Snapshots in step order, with their steps for bisecting
+        self.checkpoints = []
+        self.checkpointSteps = []
+        self.lastStep = 0
+
+    def checkpoint(self, machine, rule):
+        self.checkpoints.append(TraceState(self.lastStep, rule, tuple(machine.controlElements()), tuple(machine.stack), environmentNumber(machine)))
+        self.checkpointSteps.append(self.lastStep)
+
+    def start(self, machine):
+        """
+        Takes the snapshot of the machine before its first step.
+        """
+        self.checkpoint(machine, None)
+
+    def record(self, machine, rule, controlPopped, controlPushed, stackPopped, stackPushed, created):
+        """
+        Appends the delta of the step the machine just made.
+        """
+        self.lastStep += 1
+        self.steps.append(TraceStep(self.lastStep, rule, controlPopped, controlPushed, stackPopped, stackPushed, environmentNumber(machine), created))
+        if self.lastStep % self.checkpointInterval == 0:
+            self.checkpoint(machine, rule)
+        # Snapshots from before the first kept step can no longer be replayed from
+        earliest = self.steps[0].step - 1
+        while self.checkpointSteps[0] < earliest:
+            del self.checkpoints[0]
+            del self.checkpointSteps[0]
+
+    def firstStep(self):
+        """
+        Returns the earliest step whose state can be rebuilt.
+        """
+        return self.checkpointSteps[0]
+
+    def stateAt(self, step):
+        """
+        Rebuilds the state of the machine after the given step.
+        Args:
+            step (int): The step, 0 for the state before the first step.
+        Returns:
+            TraceState: The state of the machine after that step.
+        """
+        first = self.firstStep()
+        if step < first or step > self.lastStep:
+            raise RPALException(f"Step {step} is not in the trace, which holds steps {first} to {self.lastStep}.")
+        snapshot = self.checkpoints[bisect_right(self.checkpointSteps, step) - 1]
+        control = list(snapshot.control)
+        stack = list(snapshot.stack)
+        environment = snapshot.environment
+        rule = snapshot.rule
+        offset = self.steps[0].step if self.steps else step + 1
+        for delta in islice(self.steps, snapshot.step + 1 - offset, step + 1 - offset):
+            if delta.controlPopped:
+                del control[len(control) - delta.controlPopped:]
+            control.extend(delta.controlPushed)
+            if delta.stackPopped:
+                del stack[len(stack) - delta.stackPopped:]
+            stack.extend(delta.stackPushed)
+            environment = delta.environment
+            rule = delta.rule
+        return TraceState(step, rule, control, stack, environment)
+
+    def export(self, start=None, count=None, depth=TRACE_STATE_DEPTH):
+        """
+        Returns a JSON-ready trace: the state after the step start and the deltas of the count
+        steps after it. By default start is the earliest step kept, or the one count steps
+        before the last with count, and count covers every step after start. A start outside
+        the steps kept is moved to the nearest one. The state only holds the top depth elements
+        of each stack, all of them with None.
+        """
+        first = self.firstStep()
+        if start is None:
+            start = first if count is None else self.lastStep - count
+        start = min(max(start, first), self.lastStep)
+        state = self.stateAt(start)
+        stop = self.lastStep if count is None else min(self.lastStep, start + count)
+        offset = self.steps[0].step if self.steps else start + 1
+        return {
+            "firstStep": self.firstStep(),
+            "lastStep": self.lastStep,
+            "state": state.export(depth),
+            "steps": [delta.export() for delta in islice(self.steps, start + 1 - offset, stop + 1 - offset)],
+        }
+
+    def write(self, path, start=None, count=None, depth=None):
+        """
+        Writes the exported trace to a JSON file, with the full state by default.
+        """
+        with open(path, "w") as file:
+            json.dump(self.export(start, count, depth), file)
+
+def tracedRule(method, name):
+    """
+    Wraps a rule of the machine so that its step is recorded. Rules run one per step, so the
+    wrapper marks the steps without any change to the machine's loop.
+    """
+    def rule(self):
+        height = len(self.stack)
+        environments = self.totalEnvironments
+        self.controlPopped = 0
+        self.controlPushed = []
+        method(self)
+        stackPopped, stackPushed = self.stack.delta(height)
+        self.recorder.record(self, name, self.controlPopped, tuple(self.controlPushed), stackPopped, stackPushed, self.totalEnvironments - environments)
+    rule.__name__ = method.__name__
+    rule.__doc__ = method.__doc__
+    return rule
+
+class TracingCSEMachine(CSEMachine):
+    """
+    CSE machine recording every step in a TraceRecorder. The control stack changes are seen
+    by the methods that push and pop its elements and the stack is a TracedStack, so the
+    untraced machine runs without any tracing cost.
+    """
+    def __init__(self, controls, environment, recorder=None, **options):
+        """
+        Args:
+            controls (list): The control structures of the program.
+            environment (Environment): The primitive environment.
+            recorder (TraceRecorder, optional): The recorder of the steps. Defaults to a new one.
+            options: The options of CSEMachine.
+        """
+        self.recorder = recorder if recorder is not None else TraceRecorder()
+        self.controlPopped = 0
+        self.controlPushed = []
+        super().__init__(controls, environment, **options)
+        self.stack = TracedStack(self.stack)
+        self.recorder.start(self)
+
+    def popControl(self):
+        element = super().popControl()
+        if self.controlPushed:
+            self.controlPushed.pop()
+        else:
+            self.controlPopped += 1
+        return element
+
+    def pushControl(self, element):
+        super().pushControl(element)
+        self.controlPushed.append(element)
+
+    def insertControlStructure(self, control):
+        super().insertControlStructure(control)
+        self.controlPushed.extend(control.elements)
+
+for ruleMethod, ruleName in TRACED_RULES.items():
+    setattr(TracingCSEMachine, ruleMethod, tracedRule(getattr(CSEMachine, ruleMethod), ruleName))
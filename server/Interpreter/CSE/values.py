@@ -0,0 +1,376 @@
+from array import array
+
+# Range of the integers stored in a typed buffer
+MIN_INT64 = -(1 << 63)
+MAX_INT64 = (1 << 63) - 1
+# Strings up to this length are plain Python strings; longer ones produced by Stern and
+# Conc are Text views. Every operator name fits, so applying a string behaves the same.
+SHORT_TEXT_LENGTH = 16
+
+class Keyword:
+    """
+    Represents the values of the nil and dummy keywords. Each is a singleton, compared by
+    identity, so no string is ever taken for them.
+    """
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+    __str__ = __repr__
+
+    def __reduce__(self):
+        # Unpickled as the singleton of this module, for the worker processes
+        return self.name.capitalize()
+
+Nil = Keyword("nil")
+Dummy = Keyword("dummy")
+
+class Closure:
+    """
+    Represents the value of a lambda: the number k of its body, the variables it binds, the
+    names of their slots and c, the environment it was evaluated in. The machine that created
+    the closure decides what c holds; the python engine keeps the Python function of the
+    lambda there.
+    cache holds the results of a memoized recursive closure, see MemoCache.
+    """
+    __slots__ = ("k", "variables", "names", "c", "cache")
+
+    def __init__(self, k, variables, names, c=None):
+        self.k = k
+        self.variables = variables
+        self.names = names
+        self.c = c
+        self.cache = None
+
+def isInt64(value):
+    return type(value) is int and MIN_INT64 <= value <= MAX_INT64
+
+def makeTuple(elements):
+    """
+    Builds a tuple holding the elements, in a typed buffer when they are all integers.
+    Args:
+        elements (list): The elements; the tuple takes ownership of the list.
+    Returns:
+        Tuple: The new tuple.
+    """
+    if all(isInt64(element) for element in elements):
+        return Tuple(array('q', elements))
+    return Tuple(elements)
+
+class Tuple:
+    """
+    Represents an RPAL tuple value.
+    Tuples are immutable: a tuple is the first length items of its buffer, and the items
+    below length are never changed. A tuple extended by 'aug' shares the buffer of the
+    original when the original ends at the end of the buffer, which is the case for the
+    usual loop that builds a tuple one element at a time, so 'aug' is O(1) amortized.
+    Otherwise the prefix is copied first.
+    Tuples of 64-bit integers keep them unboxed in an array('q') buffer; the first element
+    that does not fit turns the buffer of the new tuple into a list.
+    Tuples compare, concatenate and print like the Python lists they replace.
+    """
+    __slots__ = ("items", "length")
+
+    def __init__(self, items, length=None):
+        """
+        Args:
+            items (list or array): The buffer holding the elements; the tuple takes ownership of it.
+            length (int, optional): Number of elements of the buffer in the tuple. Defaults to all.
+        """
+        self.items = items
+        self.length = len(items) if length is None else length
+
+    def aug(self, value):
+        """
+        Returns a new tuple with value appended.
+        """
+        items = self.items
+        if len(items) != self.length:
+            # Another tuple already extends this buffer past our end
+            items = items[:self.length]
+        if type(items) is array:
+            if isInt64(value):
+                items.append(value)
+                return Tuple(items)
+            items = items.tolist()
+        items.append(value)
+        return Tuple(items)
+
+    def toList(self):
+        """
+        Returns the elements as a new Python list, converting nested tuples and texts too.
+        """
+        return [plainValue(item) for item in self]
+
+    def elements(self):
+        """
+        Returns the elements as a new Python list.
+        """
+        if type(self.items) is array:
+            return self.items[:self.length].tolist()
+        return self.items[:self.length]
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        items = self.items
+        for index in range(self.length):
+            yield items[index]
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.length
+        if index < 0 or index >= self.length:
+            raise IndexError("tuple index out of range")
+        return self.items[index]
+
+    def __eq__(self, other):
+        if type(other) is not Tuple:
+            return NotImplemented
+        if self.length != other.length:
+            return False
+        if self.items is other.items:
+            return True
+        if type(self.items) is array and type(other.items) is array:
+            # Both unboxed: compare the buffers
+            if len(self.items) == self.length and len(other.items) == other.length:
+                return self.items == other.items
+            return self.items[:self.length] == other.items[:other.length]
+        return self.elements() == other.elements()
+
+    __hash__ = None
+
+    def __lt__(self, other):
+        if type(other) is not Tuple:
+            return NotImplemented
+        return self.elements() < other.elements()
+
+    def __le__(self, other):
+        if type(other) is not Tuple:
+            return NotImplemented
+        return self.elements() <= other.elements()
+
+    def __gt__(self, other):
+        if type(other) is not Tuple:
+            return NotImplemented
+        return self.elements() > other.elements()
+
+    def __ge__(self, other):
+        if type(other) is not Tuple:
+            return NotImplemented
+        return self.elements() >= other.elements()
+
+    def __add__(self, other):
+        if type(other) is not Tuple:
+            return NotImplemented
+        return makeTuple(self.elements() + other.elements())
+
+    def __mul__(self, other):
+        if not isinstance(other, int):
+            return NotImplemented
+        return makeTuple(self.elements() * other)
+
+    __rmul__ = __mul__
+
+    def __repr__(self):
+        return repr(self.elements())
+
+    __str__ = __repr__
+
+class TextBuffer:
+    """
+    Append-only character buffer shared by Text views.
+    Appended chunks are kept apart and only joined to the text when a character past the
+    joined part is read, so a string built by repeated 'Conc' is copied once when printed.
+    """
+    __slots__ = ("text", "chunks", "size")
+
+    def __init__(self, text):
+        self.text = text
+        self.chunks = []
+        self.size = len(text)
+
+    def append(self, text):
+        if text:
+            self.chunks.append(text)
+            self.size += len(text)
+
+    def flush(self):
+        if self.chunks:
+            self.chunks.insert(0, self.text)
+            self.text = "".join(self.chunks)
+            self.chunks = []
+
+    def charAt(self, index):
+        if index < len(self.text):
+            return self.text[index]
+        if index == self.size - 1:
+            return self.chunks[-1][-1]
+        self.flush()
+        return self.text[index]
+
+    def slice(self, start, end):
+        if end > len(self.text):
+            self.flush()
+        return self.text[start:end]
+
+def makeText(buffer, start, end):
+    """
+    Returns the characters start to end of the buffer, as a view unless they are few.
+    """
+    if end - start <= SHORT_TEXT_LENGTH:
+        return buffer.slice(start, end)
+    return Text(buffer, start, end)
+
+class Text:
+    """
+    Represents a long RPAL string produced at run time, as the characters start to end of a
+    shared TextBuffer. 'Stern' moves the start of a view and 'Conc' appends to the buffer of
+    its first operand when that operand ends at the end of its buffer, so both are O(1) on
+    the strings of the usual recursions over a string. The characters are only copied out
+    when the string is printed, compared or hashed.
+    Texts compare, concatenate and print like the Python strings they replace.
+    """
+    __slots__ = ("buffer", "start", "end")
+
+    def __init__(self, buffer, start, end):
+        self.buffer = buffer
+        self.start = start
+        self.end = end
+
+    def strip(self):
+        """
+        Returns the view without its leading and trailing single quotes, like str.strip("'").
+        """
+        buffer, start, end = self.buffer, self.start, self.end
+        while start < end and buffer.charAt(start) == "'":
+            start += 1
+        while end > start and buffer.charAt(end - 1) == "'":
+            end -= 1
+        if start == self.start and end == self.end:
+            return self
+        return makeText(buffer, start, end)
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __str__(self):
+        return self.buffer.slice(self.start, self.end)
+
+    def __repr__(self):
+        return repr(str(self))
+
+    def __eq__(self, other):
+        if not isString(other):
+            return NotImplemented
+        if len(self) != len(other):
+            return False
+        return str(self) == str(other)
+
+    def __hash__(self):
+        return hash(str(self))
+
+    def __lt__(self, other):
+        if not isString(other):
+            return NotImplemented
+        return str(self) < str(other)
+
+    def __le__(self, other):
+        if not isString(other):
+            return NotImplemented
+        return str(self) <= str(other)
+
+    def __gt__(self, other):
+        if not isString(other):
+            return NotImplemented
+        return str(self) > str(other)
+
+    def __ge__(self, other):
+        if not isString(other):
+            return NotImplemented
+        return str(self) >= str(other)
+
+    def __add__(self, other):
+        if not isString(other):
+            return NotImplemented
+        return str(self) + str(other)
+
+    def __radd__(self, other):
+        if not isString(other):
+            return NotImplemented
+        return str(other) + str(self)
+
+    def __mul__(self, other):
+        if not isinstance(other, int):
+            return NotImplemented
+        return str(self) * other
+
+    __rmul__ = __mul__
+
+def isString(value):
+    return type(value) is str or type(value) is Text
+
+def stripQuotes(value):
+    """
+    Returns the string value without its leading and trailing single quotes.
+    """
+    if type(value) is Text:
+        return value.strip()
+    return value.strip("'")
+
+def stem(value):
+    """
+    Returns the first character of the string value, or '' if it is empty.
+    """
+    value = stripQuotes(value)
+    if len(value) == 0:
+        return ''
+    if type(value) is Text:
+        return value.buffer.charAt(value.start)
+    return value[0]
+
+def stern(value):
+    """
+    Returns the string value without its first character, or '' if it has at most one.
+    """
+    if type(value) is str and len(value) > SHORT_TEXT_LENGTH:
+        value = Text(TextBuffer(value), 0, len(value))
+    value = stripQuotes(value)
+    if len(value) <= 1:
+        return ''
+    if type(value) is Text:
+        return makeText(value.buffer, value.start + 1, value.end)
+    return value[1:]
+
+def conc(value1, value2):
+    """
+    Returns the concatenation of the two string values.
+    """
+    first = stripQuotes(value1)
+    second = stripQuotes(value2)
+    if len(first) + len(second) <= SHORT_TEXT_LENGTH:
+        return str(first) + str(second)
+    if type(first) is Text and first.end == first.buffer.size:
+        # Nothing was appended after the first operand yet: extend its buffer in place
+        buffer, start = first.buffer, first.start
+    else:
+        buffer, start = TextBuffer(str(first)), 0
+    buffer.append(str(second))
+    return Text(buffer, start, buffer.size)
+
+def plainValue(value):
+    """
+    Converts a machine value to plain Python data for callers outside the interpreter.
+    """
+    if type(value) is Tuple:
+        return value.toList()
+    if type(value) is Text:
+        return str(value)
+    if type(value) is Keyword:
+        return value.name
+    return value
@@ -0,0 +1,191 @@
+import hashlib
+import mmap
+import os
+import stat
+import struct
+import tempfile
+from importlib.util import MAGIC_NUMBER
+
+from Interpreter.Cache.artifacts import decodeArtifact, encodeArtifact
+
+# Changed whenever the layout of the artifact files changes
+ARTIFACT_FORMAT_VERSION = 1
+# Directory of the stored artifacts, shared by the workers of the user running the server;
+# artifacts hold code that is run, so the directory must be private to that user
+ARTIFACT_DIRECTORY = os.environ.get("RPAL_CACHE_DIR", os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "rpal-artifacts"))
+# Total size of the stored artifacts in bytes, 0 to disable the store
+ARTIFACT_STORE_SIZE = int(os.environ.get("RPAL_CACHE_SIZE", 256 * 1024 * 1024))
+# Fraction of the size kept once the store evicts artifacts, so it does not evict on every store
+EVICTION_TARGET = 0.8
+# Magic, format version, artifact kind, interpreter version, payload length
+FILE_HEADER = struct.Struct("<4sHH32sQ")
+FILE_MAGIC = b"RPAL"
+FILE_SUFFIX = ".art"
+# Permission bits that let other users change a directory or file of the store
+SHARED_WRITE = stat.S_IWGRP | stat.S_IWOTH
+
+def computeInterpreterVersion():
+    """
+    Returns a digest of the interpreter's source files, the artifact format and the Python
+    bytecode version, so artifacts compiled by any other interpreter are never loaded.
+    """
+    digest = hashlib.sha256()
+    digest.update(MAGIC_NUMBER)
+    digest.update(str(ARTIFACT_FORMAT_VERSION).encode())
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sources = []
+    for directory, directories, files in os.walk(root):
+        directories[:] = sorted(name for name in directories if name != "__pycache__")
+        sources.extend(os.path.join(directory, name) for name in files if name.endswith(".py"))
+    for path in sorted(sources):
+        digest.update(os.path.relpath(path, root).encode())
+        with open(path, "rb") as file:
+            digest.update(file.read())
+    return digest.digest()
+
+# Computed on import, so the workers forked by the server share it
+INTERPRETER_VERSION = computeInterpreterVersion()
+
+def isPrivate(status):
+    """
+    Checks whether the status is that of a file or directory owned by the current user that
+    no other user can write to.
+    """
+    return status.st_uid == os.getuid() and not status.st_mode & SHARED_WRITE
+
+def artifactKey(code, engine, *options):
+    """
+    Returns the address of the artifact compiled from the RPAL source code by the engine
+    with the given options.
+    """
+    digest = hashlib.sha256(INTERPRETER_VERSION)
+    digest.update(f"{engine}:{options!r}:".encode())
+    digest.update(code.encode())
+    return digest.hexdigest()
+
+class ArtifactStore:
+    """
+    Content-addressed store of compiled programs shared by every process on the machine.
+    Each artifact is a file named by its artifactKey: a header holding the interpreter version
+    it was compiled by, then the payload written by encodeArtifact. Files are mapped with mmap
+    when loaded, so workers share their pages and bytecode is only read when it runs.
+    Files are renamed into place once written, so a worker never reads a partial file.
+    Loading an artifact marks it as recently used; once the files exceed the size of the store,
+    the least recently used are removed. The store is an optimization only: a file that cannot
+    be read, written or decoded counts as missing.
+    Artifacts are trusted code, so the directory is created with mode 0700, and the store is
+    not used unless the directory and the artifact file are owned by the current user and
+    cannot be written by any other.
+    """
+    def __init__(self, directory=ARTIFACT_DIRECTORY, size=ARTIFACT_STORE_SIZE):
+        """
+        Args:
+            directory (str): The directory holding the artifact files.
+            size (int): The largest total size of the files in bytes, 0 to disable the store.
+        """
+        self.directory = directory
+        self.size = size
+
+    def path(self, key):
+        return os.path.join(self.directory, key + FILE_SUFFIX)
+
+    def isUsable(self, create=False):
+        """
+        Checks whether the directory of the store is a private directory of the current user,
+        creating it first if create is set.
+        """
+        try:
+            if create:
+                os.makedirs(self.directory, mode=0o700, exist_ok=True)
+            status = os.lstat(self.directory)
+        except OSError:
+            return False
+        return stat.S_ISDIR(status.st_mode) and isPrivate(status)
+
+    def load(self, key, kind):
+        """
+        Returns the artifact of the given kind stored for key, or None.
+        """
+        if self.size <= 0 or not self.isUsable():
+            return None
+        path = self.path(key)
+        try:
+            with open(path, "rb") as file:
+                if not isPrivate(os.fstat(file.fileno())):
+                    return None
+                mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        try:
+            magic, version, storedKind, interpreter, length = FILE_HEADER.unpack_from(mapped, 0)
+            if magic != FILE_MAGIC or version != ARTIFACT_FORMAT_VERSION or interpreter != INTERPRETER_VERSION:
+                raise ValueError("Artifact of another interpreter version")
+            if storedKind != kind or FILE_HEADER.size + length != len(mapped):
+                raise ValueError("Malformed artifact")
+            artifact = decodeArtifact(kind, memoryview(mapped)[FILE_HEADER.size:])
+        except (ValueError, EOFError, TypeError, IndexError, KeyError, struct.error):
+            self.remove(path)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return artifact
+
+    def store(self, key, kind, artifact):
+        """
+        Stores the artifact of the given kind for key, then evicts artifacts if the store
+        grew past its size.
+        """
+        if self.size <= 0:
+            return
+        payload = encodeArtifact(kind, artifact)
+        header = FILE_HEADER.pack(FILE_MAGIC, ARTIFACT_FORMAT_VERSION, kind, INTERPRETER_VERSION, len(payload))
+        if not self.isUsable(create=True):
+            return
+        try:
+            descriptor, temporary = tempfile.mkstemp(dir=self.directory)
+        except OSError:
+            return
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                file.write(header)
+                file.write(payload)
+            os.replace(temporary, self.path(key))
+        except OSError:
+            self.remove(temporary)
+            return
+        self.evict()
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def evict(self):
+        """
+        Removes the least recently used artifacts until the files fit in the store again.
+        """
+        files = []
+        total = 0
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.name.endswith(FILE_SUFFIX):
+                        try:
+                            status = entry.stat()
+                        except OSError:
+                            continue
+                        files.append((status.st_mtime, status.st_size, entry.path))
+                        total += status.st_size
+        except OSError:
+            return
+        if total <= self.size:
+            return
+        files.sort()
+        for _, size, path in files:
+            if total <= self.size * EVICTION_TARGET:
+                break
+            self.remove(path)
+            total -= size
@@ -0,0 +1,180 @@
+import marshal
+import struct
+from array import array
+
+from Interpreter.Exception.RPALException import RPALException
+from Interpreter.CSE.generateCS import Constant, ControlStructure, Lambda, ParallelTau, Reference, Tau
+from Interpreter.Tokenizer.tokenizer import Token
+from Interpreter.VM.generateBytecode import Program
+
+# Kinds of compiled artifacts, one per engine that runs one
+CONTROL_STRUCTURES = 1
+BYTECODE = 2
+PYTHON_CODE = 3
+ARTIFACT_KINDS = {"cse": CONTROL_STRUCTURES, "vm": BYTECODE, "python": PYTHON_CODE}
+
+# Tags of the control structure elements
+STRING_ELEMENT = 0
+TOKEN_ELEMENT = 1
+LAMBDA_ELEMENT = 2
+TAU_ELEMENT = 3
+DELTA_ELEMENT = 4
+REFERENCE_ELEMENT = 5
+PARALLEL_TAU_ELEMENT = 6
+CONSTANT_ELEMENT = 7
+
+# Counts at the start of a bytecode payload: instructions, deltas, length of the tables
+PROGRAM_HEADER = struct.Struct("<III")
+
+def encodeName(name):
+    """
+    Encodes an identifier or variable, which is a Token or a string, as plain data.
+    """
+    if type(name) is Token:
+        return (name.getType(), name.getValue(), name.getLineNumber())
+    return name
+
+def decodeName(data):
+    if type(data) is tuple:
+        return Token(data[0], data[1], data[2])
+    return data
+
+def encodeLambda(template):
+    return (template.k, [encodeName(variable) for variable in template.variables], template.memoize)
+
+def decodeLambda(data):
+    k, variables, memoize = data
+    template = Lambda(k, [decodeName(variable) for variable in variables])
+    if memoize:
+        template.memoize = True
+    return template
+
+def encodeElement(element):
+    if type(element) is str:
+        return (STRING_ELEMENT, element)
+    if type(element) is Token:
+        return (TOKEN_ELEMENT, encodeName(element))
+    if type(element) is Lambda:
+        return (LAMBDA_ELEMENT, encodeLambda(element))
+    if type(element) is Tau:
+        return (TAU_ELEMENT, element.elementNumber)
+    if type(element) is ControlStructure:
+        return (DELTA_ELEMENT, element.number)
+    if type(element) is Reference:
+        return (REFERENCE_ELEMENT, (encodeName(element.name), element.depth, element.index))
+    if type(element) is Constant:
+        return (CONSTANT_ELEMENT, element.value)
+    if type(element) is ParallelTau:
+        return (PARALLEL_TAU_ELEMENT, (element.elementNumber, [component.number for component in element.components], element.remote))
+    raise RPALException(f"Cannot store control structure element {element!r}")
+
+def encodeControlStructures(controls):
+    """
+    Returns the control structures generated by CSGenerator as the payload of an artifact.
+    """
+    data = [(control.number, control.tailCall, [encodeElement(element) for element in control.elements]) for control in controls]
+    return marshal.dumps(data)
+
+def decodeControlStructures(payload):
+    """
+    Rebuilds the control structures stored by encodeControlStructures.
+    """
+    data = marshal.loads(payload)
+    controls = []
+    byNumber = {}
+    for number, tailCall, _ in data:
+        control = ControlStructure(number)
+        control.tailCall = tailCall
+        controls.append(control)
+        byNumber[number] = control
+    for control, (_, _, elements) in zip(controls, data):
+        for tag, value in elements:
+            if tag == STRING_ELEMENT:
+                element = value
+            elif tag == TOKEN_ELEMENT:
+                element = decodeName(value)
+            elif tag == LAMBDA_ELEMENT:
+                element = decodeLambda(value)
+            elif tag == TAU_ELEMENT:
+                element = Tau(value)
+            elif tag == DELTA_ELEMENT:
+                element = byNumber[value]
+            elif tag == REFERENCE_ELEMENT:
+                element = Reference(decodeName(value[0]), value[1], value[2])
+            elif tag == CONSTANT_ELEMENT:
+                element = Constant(value)
+            elif tag == PARALLEL_TAU_ELEMENT:
+                element = ParallelTau(value[0], [byNumber[number] for number in value[1]], value[2])
+            else:
+                raise ValueError(f"Unknown control structure element tag {tag}")
+            control.elements.append(element)
+    return controls
+
+def padding(length):
+    """
+    Returns the number of bytes that align a section of the given length to 8 bytes.
+    """
+    return -length % 8
+
+def encodeProgram(program):
+    """
+    Returns the bytecode of a Program as the payload of an artifact: the counts, then the
+    opcode, operand and entry arrays as raw machine values, each aligned to 8 bytes, then
+    the constants, names and lambda templates.
+    """
+    tables = marshal.dumps((
+        list(program.constants),
+        [encodeName(name) for name in program.names],
+        [encodeLambda(template) for template in program.lambdas],
+    ))
+    sections = [PROGRAM_HEADER.pack(len(program.ops), len(program.entries), len(tables))]
+    for section in (program.ops.tobytes(), array('i', program.args).tobytes(), array('i', program.entries).tobytes(), tables):
+        sections.append(b"\0" * padding(sum(len(part) for part in sections)))
+        sections.append(section)
+    return b"".join(sections)
+
+def decodeProgram(payload):
+    """
+    Rebuilds the Program stored by encodeProgram. The opcode, operand and entry arrays are
+    views of the payload, so a payload mapped from a file is neither copied nor read until
+    the machine runs the instructions.
+    """
+    payload = memoryview(payload)
+    count, deltas, tablesLength = PROGRAM_HEADER.unpack_from(payload, 0)
+    offset = PROGRAM_HEADER.size
+    sections = []
+    for length in (count, count * 4, deltas * 4, tablesLength):
+        offset += padding(offset)
+        if offset + length > len(payload):
+            raise ValueError("Truncated bytecode artifact")
+        sections.append(payload[offset:offset + length])
+        offset += length
+    program = Program()
+    program.ops = sections[0]
+    program.args = sections[1].cast('i')
+    program.entries = sections[2].cast('i')
+    constants, names, lambdas = marshal.loads(sections[3])
+    program.constants = constants
+    program.names = [decodeName(name) for name in names]
+    program.lambdas = [decodeLambda(template) for template in lambdas]
+    return program
+
+def encodeArtifact(kind, artifact):
+    """
+    Returns the payload storing an artifact of the given kind.
+    """
+    if kind == CONTROL_STRUCTURES:
+        return encodeControlStructures(artifact)
+    if kind == BYTECODE:
+        return encodeProgram(artifact)
+    return marshal.dumps(artifact)
+
+def decodeArtifact(kind, payload):
+    """
+    Rebuilds an artifact of the given kind from its payload.
+    """
+    if kind == CONTROL_STRUCTURES:
+        return decodeControlStructures(payload)
+    if kind == BYTECODE:
+        return decodeProgram(payload)
+    return marshal.loads(payload)
@@ -0,0 +1,262 @@
+import sys
+
+from Interpreter.Environment.Environment import Environment
+from Interpreter.Exception.RPALException import RPALException
+from Interpreter.CSE.CSEMachine import BUILTIN_FUNCTIONS, BUILTIN_OPERATORS, printableValue, recursiveClosure
+from Interpreter.CSE.generateCS import Eta
+from Interpreter.CSE.memo import MemoCache, MemoStatistics, addStore, memoKey, storeResults
+from Interpreter.CSE.values import Closure, Dummy, Nil, Tuple, conc, isString, stem, stern
+from Interpreter.Closure.closureCompiler import ClosureCompiler, TailCall
+
+# Python frames kept free below the recursion limit for the caller and the primitives
+RECURSION_MARGIN = 200
+# Upper bound on the Python frames used by direct calls, whatever the recursion limit
+MAX_DIRECT_FRAMES = 20000
+# Python frames used by an application on top of the frames of the lambda body
+CALL_FRAMES = 3
+
+def stackDepth():
+    """
+    Returns the number of Python frames below the caller.
+    """
+    depth = 0
+    frame = sys._getframe(1)
+    while frame is not None:
+        depth += 1
+        frame = frame.f_back
+    return depth
+
+class ClosureMachine:
+    """
+    The ClosureMachine runs a Standardized Tree compiled by ClosureCompiler into nested
+    Python closures. It follows the same rules as the CSEMachine, but each node is a closure
+    that evaluates its children by calling them, so nothing is dispatched at run time.
+    Lambdas are called on the Python stack while the calls fit below the recursion limit;
+    deeper calls run on a trampoline, where the body of every lambda is a generator and
+    the pending applications are kept in a list, so deep recursion never exhausts the
+    Python stack. Tail calls return a TailCall to the trampoline of their caller in both
+    cases, so tail-recursive loops run in constant space.
+    Closures are Closure instances whose c holds the defining Environment itself.
+    """
+
+    def __init__(self, node, environment):
+        """
+        Compiles the ST and prepares to run it in the given primitive environment.
+        """
+        self.environment = environment
+        self.totalEnvironments = 1
+        self.memoStatistics = MemoStatistics()
+        self.depth = 0
+        self.depthLimit = 0
+        compiler = ClosureCompiler(self)
+        self.program = compiler.compile(node)
+        self.bodies = compiler.bodies
+        self.innerLambdas = compiler.innerLambdas
+        self.frameCost = compiler.maxDepth + CALL_FRAMES
+
+    def statistics(self):
+        """
+        Returns the counters of the run, such as the memo hits of the recursive functions.
+        """
+        return self.memoStatistics.asDict()
+
+    def bind(self, function, argument):
+        """
+        Rules 4 and 11: returns the environment binding the argument(s) of the closure.
+        """
+        names = function.names
+        if len(names) == 1:
+            slots = [argument]
+        else:
+            if type(argument) is not Tuple:
+                raise RPALException("Expected a list of names on the stack for 'gamma' operation.")
+            if len(argument) != len(names):
+                raise RPALException("Number of names does not match number of variables in lambda.")
+            slots = argument.elements()
+        environment = Environment(self.totalEnvironments, function.c, names=names, values=slots)
+        self.totalEnvironments += 1
+        return environment
+
+    def call(self, function, argument):
+        """
+        Applies a closure on the Python stack, running its tail calls in a loop.
+        Calls nested too deep for the Python stack continue on a trampoline.
+        """
+        depth = self.depth
+        if depth >= self.depthLimit:
+            return self.trampoline(function, argument)
+        self.depth = depth + 1
+        bodies = self.bodies
+        stores = None
+        while True:
+            cache = function.cache
+            if cache is not None:
+                # A memoized recursive closure answers from its cache when it knows the argument
+                key = memoKey(argument)
+                if key is not None:
+                    found, result = cache.lookUp(key)
+                    if found:
+                        break
+                    stores = addStore(stores, cache, key)
+            result = bodies[function.k].run(self.bind(function, argument))
+            if type(result) is not TailCall:
+                break
+            function, argument = result.function, result.argument
+        self.depth = depth
+        if stores is not None:
+            storeResults(stores, result)
+        return result
+
+    def trampoline(self, function, argument):
+        """
+        Applies a closure without growing the Python stack: lambda bodies run as generators
+        whose applications are made by this loop.
+        """
+        generators = []
+        pending = []  # memo stores of the frame of each generator
+        stores = None
+        value = None
+        while True:
+            if function is not None:
+                # Enter the closure, or take its result from the memo cache
+                cache = function.cache
+                key = memoKey(argument) if cache is not None else None
+                found = False
+                if key is not None:
+                    found, value = cache.lookUp(key)
+                    if not found:
+                        stores = addStore(stores, cache, key)
+                if not found:
+                    body = self.bodies[function.k]
+                    environment = self.bind(function, argument)
+                    if body.resume is None:
+                        value = body.run(environment)
+                    else:
+                        generators.append(body.resume(environment))
+                        pending.append(stores)
+                        stores = None
+                        value = None
+                        function = None
+                        continue
+                function = None
+                if stores is not None:
+                    storeResults(stores, value)
+                    stores = None
+            if len(generators) == 0:
+                return value
+            try:
+                function, argument = generators[-1].send(value)
+            except StopIteration as stop:
+                generators.pop()
+                stores = pending.pop()
+                value = stop.value
+                if type(value) is TailCall:
+                    # The callee answers for the finished frame, memo stores included
+                    function, argument = value.function, value.argument
+                elif stores is not None:
+                    storeResults(stores, value)
+                    stores = None
+
+    def apply(self, function, argument):
+        """
+        Gamma: applies any value, in the same order as the CSEMachine checks rules 3, 4, 10,
+        11, 12, 13 and the built-in functions.
+        """
+        if type(function) is str and function in BUILTIN_OPERATORS:
+            return self.builtinOperator(function, argument)
+        elif type(function) is Closure:
+            return self.call(function, argument)
+        elif type(function) is Tuple and len(function) > 0:
+            return self.select(function, argument)
+        elif type(function) is str and function == "Y":
+            return self.recursive(argument)
+        elif type(function) is Eta:
+            # Rule 13: apply the unfolded lambda to the eta itself, then apply the result
+            return self.apply(self.call(function.toClosure(), function), argument)
+        elif function in BUILTIN_FUNCTIONS:
+            value = printableValue(argument)
+            print(value, end="")
+            return value
+        raise RPALException(f"Illegal Function Appication")
+
+    def recursive(self, function):
+        """
+        Rule 12: Y applied to a lambda.
+        """
+        if type(function) is not Closure:
+            raise RPALException("Expected a Lambda control structure on the stack for 'gamma' operation.")
+        inner = self.innerLambdas[function.k]
+        if len(function.names) == 1 and inner is not None:
+            # rec f = fn ...: bind f to the function itself, as rule 12 does
+            closure = recursiveClosure(function, inner, self.totalEnvironments)
+            self.totalEnvironments += 1
+            if inner.memoize:
+                closure.cache = MemoCache(self.memoStatistics)
+            return closure
+        return Eta(function)
+
+    def select(self, tupleElements, index):
+        """
+        Rule 10: selects a tuple element (1-based indexing).
+        """
+        if not isinstance(index, int):
+            raise RPALException("Index must be an integer.")
+        if index < 0 or index-1 >= len(tupleElements):
+            raise RPALException("Index out of bounds for tuple elements.")
+        return tupleElements[index-1]
+
+    def concatenate(self, value1, value2):
+        """
+        Conc applied to both of its operands.
+        """
+        if not isString(value1) or not isString(value2):
+            raise RPALException("Both operands must be strings for 'conc' operation.")
+        return conc(value1, value2)
+
+    def builtinOperator(self, operator, value):
+        """
+        Rule 3: applies one of the built-in operators (Stem, Isinteger, ...) to its operand.
+        Conc only reaches here when it is not applied to two operands.
+        """
+        if operator == 'conc':
+            raise RPALException("Both operands must be strings for 'conc' operation.")
+        elif operator == 'stem':
+            if not isString(value):
+                raise RPALException("Operand must be a string for 'stem' operation.")
+            return stem(value)
+        elif operator == 'stern':
+            if not isString(value):
+                raise RPALException("Operand must be a string for 'stern' operation.")
+            return stern(value)
+        elif operator == 'isInteger':
+            return isinstance(value, int)
+        elif operator == 'isString':
+            return isString(value)
+        elif operator == 'isTruthValue':
+            return isinstance(value, bool)
+        elif operator == 'isFunction':
+            return type(value) is Closure or type(value) is Eta
+        elif operator == 'isTuple':
+            return isinstance(value, Tuple) and len(value) > 0
+        elif operator == 'isDummy':
+            return value is Dummy
+        elif operator == "order":
+            if type(value) is not Tuple:
+                raise RPALException("Operand must be a list for 'order' operation.")
+            return len(value)
+        elif operator == "null":
+            if value is Nil:
+                return True
+            if type(value) is not Tuple:
+                raise RPALException("Operand must be a list for 'null' operation.")
+            return len(value) == 0
+
+    def interpret(self):
+        """
+        Runs the compiled program in the primitive environment and returns its value.
+        """
+        budget = min(sys.getrecursionlimit() - stackDepth() - RECURSION_MARGIN, MAX_DIRECT_FRAMES)
+        # Calls deeper than this continue on a trampoline
+        self.depthLimit = max(budget // self.frameCost, 0)
+        self.depth = 0
+        return self.program.run(self.environment)
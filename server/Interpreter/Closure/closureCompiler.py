@@ -0,0 +1,407 @@
+from Interpreter.Exception.RPALException import RPALException
+from Interpreter.CSE.generateCS import Lambda
+from Interpreter.CSE.values import Closure, Nil, Tuple, isString, makeTuple, stripQuotes
+from Interpreter.Tokenizer.tokenizer import Token
+
+class TailCall:
+    """
+    Application in a tail position, returned to the caller's trampoline instead of being
+    made on top of the current Python frame.
+    """
+    __slots__ = ("function", "argument")
+
+    def __init__(self, function, argument):
+        self.function = function
+        self.argument = argument
+
+class PendingConc:
+    """
+    Conc applied to its first operand, waiting for the enclosing application's argument.
+    """
+    __slots__ = ("first",)
+
+    def __init__(self, first):
+        self.first = first
+
+class Code:
+    """
+    The compiled form of an ST node.
+    run(env) evaluates the node directly, on the Python stack. resume(env) is a generator
+    function doing the same, which yields (closure, argument) for every lambda it applies
+    and receives the result back, so that the ClosureMachine can run it on a trampoline.
+    resume is None for nodes that apply no lambda, which are always run directly.
+    In a tail position either may return a TailCall instead of a value.
+    """
+    __slots__ = ("run", "resume", "depth")
+
+    def __init__(self, run, resume=None, depth=1):
+        self.run = run
+        self.resume = resume
+        self.depth = depth  # Python frames needed by run, not counting applied lambdas
+
+def binaryOperator(operator):
+    """
+    Returns a function computing the operator the way rule 6 does, with left the value of
+    the first operand and right the value of the second.
+    """
+    if operator == "+":
+        return lambda left, right: left + right
+    if operator == "-":
+        return lambda left, right: left - right
+    if operator == "*":
+        return lambda left, right: left * right
+    if operator == "/":
+        def divide(left, right):
+            if right == 0:
+                raise RPALException("Division by zero.")
+            return int(left / right)
+        return divide
+    if operator == "eq":
+        return lambda left, right: left == right
+    if operator == "gr":
+        return lambda left, right: left > right
+    if operator == "ge":
+        return lambda left, right: left >= right
+    if operator == "ls":
+        return lambda left, right: left < right
+    if operator == "le":
+        return lambda left, right: left <= right
+    if operator == "aug":
+        def aug(left, right):
+            if left is Nil:
+                return makeTuple([right])
+            if type(left) is Tuple:
+                return left.aug(right)
+            raise RPALException("Left operand of 'aug' must be a tuple or nil.")
+        return aug
+    if operator == "**":
+        def power(left, right):
+            if type(left) is not int or type(right) is not int:
+                raise RPALException("Both operands must be integers for '**' operation.")
+            return left ** right
+        return power
+    raise RPALException(f"Unknown operator: {operator}")
+
+BINARY_OPERATORS = ["+", "-", "*", "/", "eq", "gr", "ge", "ls", "le", "aug", "**"]
+UNARY_OPERATORS = ["not", "neg"]
+# Keywords the CSE machine resolves through the environment (rule 1)
+NAMED_KEYWORDS = ["nil", "Y", "Print"]
+
+def makeTupleOf(elements):
+    """
+    Rule 9 on evaluated elements, the first element first.
+    """
+    if elements[0] is Nil:
+        # The machines leave a tuple starting with nil unbuilt, so its value is nil
+        return Nil
+    for index in range(len(elements)):
+        if isString(elements[index]):
+            elements[index] = stripQuotes(elements[index])
+    return makeTuple(elements)
+
+class ClosureCompiler:
+    """
+    Compiles a Standardized Tree into nested Python closures for the ClosureMachine.
+    Every node becomes a Code whose functions are bound to the compiled children once, so
+    running the program only calls them. Evaluation order follows the CSE machine: the
+    operands of an application, operator and tuple are evaluated from the last to the first.
+    Lambdas are numbered exactly like CSGenerator numbers its control structures, so closures
+    print the same way on every machine.
+    """
+    def __init__(self, machine):
+        """
+        Args:
+            machine (ClosureMachine): The machine whose apply and call the code uses.
+        """
+        self.machine = machine
+        self.deltaCount = 0
+        self.bodies = []
+        self.templates = []
+        # Template of the lambda that is the whole body of each lambda, used by rule 12
+        self.innerLambdas = []
+        self.maxDepth = 1
+
+    def newDelta(self):
+        """
+        Reserves the next delta number.
+        """
+        number = self.deltaCount
+        self.deltaCount += 1
+        self.bodies.append(None)
+        self.templates.append(None)
+        self.innerLambdas.append(None)
+        return number
+
+    def compileLambda(self, node):
+        if node.child[0].head == ",":
+            variables = [var.head for var in node.child[0].child]
+            if len(variables) < 1:
+                raise RPALException("Lambda node with ',' must have at least one variable")
+        else:
+            if len(node.child) != 2:
+                raise RPALException("Lambda node must have exactly two children")
+            variables = node.child[0].head
+        k = self.newDelta()
+        inner = len(self.bodies)
+        body = self.compileNode(node.child[1], tail=True)
+        self.bodies[k] = body
+        self.maxDepth = max(self.maxDepth, body.depth)
+        if node.child[1].head == "lambda":
+            self.innerLambdas[k] = self.templates[inner]
+        template = Lambda(k, variables)
+        template.memoize = node.memoize
+        self.templates[k] = template
+
+        variables, names = template.variables, template.names
+        def makeClosure(env):
+            return Closure(k, variables, names, env)
+        return Code(makeClosure)
+
+    def compileConditional(self, node, tail):
+        if len(node.child) != 3:
+            raise RPALException("Node with head '->' must have exactly three children")
+        self.newDelta()
+        then = self.compileNode(node.child[1], tail)
+        self.newDelta()
+        other = self.compileNode(node.child[2], tail)
+        condition = self.compileNode(node.child[0])
+        test, thenRun, otherRun = condition.run, then.run, other.run
+
+        def run(env):
+            if test(env):
+                return thenRun(env)
+            return otherRun(env)
+
+        resume = None
+        if condition.resume or then.resume or other.resume:
+            testResume, thenResume, otherResume = condition.resume, then.resume, other.resume
+            def resume(env):
+                value = (yield from testResume(env)) if testResume else test(env)
+                if value:
+                    return (yield from thenResume(env)) if thenResume else thenRun(env)
+                return (yield from otherResume(env)) if otherResume else otherRun(env)
+        return Code(run, resume, 1 + max(condition.depth, then.depth, other.depth))
+
+    def compileTuple(self, node):
+        if len(node.child) < 2:
+            raise RPALException("Node with head 'tau' must have at least two children")
+        children = [self.compileNode(child) for child in node.child]
+        runs = [child.run for child in children]
+        count = len(runs)
+
+        def run(env):
+            elements = [None] * count
+            for index in range(count - 1, -1, -1):
+                elements[index] = runs[index](env)
+            return makeTupleOf(elements)
+
+        resume = None
+        if any(child.resume for child in children):
+            resumes = [child.resume for child in children]
+            def resume(env):
+                elements = [None] * count
+                for index in range(count - 1, -1, -1):
+                    if resumes[index]:
+                        elements[index] = yield from resumes[index](env)
+                    else:
+                        elements[index] = runs[index](env)
+                return makeTupleOf(elements)
+        return Code(run, resume, 1 + max(child.depth for child in children))
+
+    def compileApplication(self, node, tail, rator=False):
+        if len(node.child) != 2:
+            raise RPALException("Node with head 'gamma' must have exactly two children")
+        machine = self.machine
+        apply, call, concatenate = machine.apply, machine.call, machine.concatenate
+        # Conc is binary: applied as the function of another application, it takes the
+        # argument of that application as its second operand, as the CSE machine does
+        curried = node.child[0].head == "gamma"
+        function = self.compileNode(node.child[0], rator=curried)
+        operand = self.compileNode(node.child[1])
+        functionRun, operandRun = function.run, operand.run
+
+        def run(env):
+            argument = operandRun(env)
+            value = functionRun(env)
+            if type(value) is Closure:
+                if tail:
+                    return TailCall(value, argument)
+                return call(value, argument)
+            if type(value) is PendingConc:
+                return concatenate(value.first, argument)
+            if rator and type(value) is str and value == "conc":
+                return PendingConc(argument)
+            return apply(value, argument)
+
+        functionResume, operandResume = function.resume, operand.resume
+        def resume(env):
+            argument = (yield from operandResume(env)) if operandResume else operandRun(env)
+            value = (yield from functionResume(env)) if functionResume else functionRun(env)
+            if type(value) is Closure:
+                if tail:
+                    return TailCall(value, argument)
+                return (yield (value, argument))
+            if type(value) is PendingConc:
+                return concatenate(value.first, argument)
+            if rator and type(value) is str and value == "conc":
+                return PendingConc(argument)
+            return apply(value, argument)
+        return Code(run, resume, 1 + max(function.depth, operand.depth))
+
+    def compileOperator(self, node):
+        operator = node.head
+        if operator in UNARY_OPERATORS:
+            if len(node.child) != 1:
+                raise RPALException(f"Operator '{operator}' must have exactly one operand")
+            operand = self.compileNode(node.child[0])
+            operandRun = operand.run
+            if operator == "not":
+                def run(env):
+                    return not operandRun(env)
+            else:
+                def run(env):
+                    return -operandRun(env)
+            resume = None
+            if operand.resume:
+                operandResume, negate = operand.resume, operator == "neg"
+                def resume(env):
+                    value = yield from operandResume(env)
+                    return -value if negate else not value
+            return Code(run, resume, 1 + operand.depth)
+
+        if len(node.child) != 2:
+            raise RPALException(f"Operator '{operator}' must have exactly two operands")
+        left = self.compileNode(node.child[0])
+        right = self.compileNode(node.child[1])
+        leftRun, rightRun = left.run, right.run
+        compute = binaryOperator(operator)
+        if operator == "+":
+            def run(env):
+                value = rightRun(env)
+                return leftRun(env) + value
+        elif operator == "-":
+            def run(env):
+                value = rightRun(env)
+                return leftRun(env) - value
+        elif operator == "*":
+            def run(env):
+                value = rightRun(env)
+                return leftRun(env) * value
+        elif operator == "eq":
+            def run(env):
+                value = rightRun(env)
+                return leftRun(env) == value
+        elif operator == "ls":
+            def run(env):
+                value = rightRun(env)
+                return leftRun(env) < value
+        elif operator == "gr":
+            def run(env):
+                value = rightRun(env)
+                return leftRun(env) > value
+        else:
+            def run(env):
+                value = rightRun(env)
+                return compute(leftRun(env), value)
+
+        resume = None
+        if left.resume or right.resume:
+            leftResume, rightResume = left.resume, right.resume
+            def resume(env):
+                value = (yield from rightResume(env)) if rightResume else rightRun(env)
+                first = (yield from leftResume(env)) if leftResume else leftRun(env)
+                return compute(first, value)
+        return Code(run, resume, 1 + max(left.depth, right.depth))
+
+    def compileIllegal(self, node):
+        """
+        Nodes no machine can evaluate: their first two children are evaluated, then the
+        program stops, as on the CSE machine.
+        """
+        children = [self.compileNode(child) for child in node.child[:2]]
+        runs = [child.run for child in children]
+
+        def run(env):
+            for index in range(len(runs) - 1, -1, -1):
+                runs[index](env)
+            raise RPALException(f"Illegal Function Appication")
+
+        resume = None
+        if any(child.resume for child in children):
+            resumes = [child.resume for child in children]
+            def resume(env):
+                for index in range(len(runs) - 1, -1, -1):
+                    if resumes[index]:
+                        yield from resumes[index](env)
+                    else:
+                        runs[index](env)
+                raise RPALException(f"Illegal Function Appication")
+        return Code(run, resume, 1 + max((child.depth for child in children), default=0))
+
+    def compileLeaf(self, node):
+        label = node.head
+        if node.address is not None:
+            # Identifier resolved by the LexicalResolver
+            depth, index = node.address
+            if depth == 0:
+                return Code(lambda env: env.values[index])
+            if depth == 1:
+                return Code(lambda env: env.parent.values[index])
+            if depth == 2:
+                return Code(lambda env: env.parent.parent.values[index])
+            return Code(lambda env: env.lookUpSlot(depth, index))
+        if type(label) is Token:
+            if label.getType() == "INT":
+                value = int(label.getValue())
+                return Code(lambda env: value)
+            if label.getType() in ("STRING", "TRUTHVALUE"):
+                value = label.getValue()
+                return Code(lambda env: value)
+            return Code(lambda env: env.lookUpValue(label))
+        if label in NAMED_KEYWORDS:
+            return Code(lambda env: env.lookUpValue(label))
+        return None
+
+    def compileNode(self, node, tail=False, rator=False):
+        """
+        Compiles the node, numbering the lambdas and conditional branches inside it in the
+        order the CSGenerator numbers them.
+        Args:
+            node (Node): The ST node to compile.
+            tail (bool): Whether the value of the node is the result of the enclosing lambda.
+            rator (bool): Whether the node is the function of an application.
+        Returns:
+            Code: The compiled node.
+        """
+        if node.head == "lambda":
+            return self.compileLambda(node)
+        if node.head == "->":
+            return self.compileConditional(node, tail)
+        if node.head == "tau":
+            return self.compileTuple(node)
+        if not node.child:
+            code = self.compileLeaf(node)
+            if code is not None:
+                return code
+            return self.compileIllegal(node)
+        if node.head == "gamma":
+            return self.compileApplication(node, tail, rator)
+        if node.head in BINARY_OPERATORS or node.head in UNARY_OPERATORS:
+            return self.compileOperator(node)
+        return self.compileIllegal(node)
+
+    def compile(self, node):
+        """
+        Entry point for compiling the ST.
+        Args:
+            node (Node): The root node of the Standardized Tree.
+        Returns:
+            Code: The compiled program, run in the primitive environment.
+        """
+        if node is None:
+            raise RPALException("Node cannot be None")
+        self.newDelta()
+        program = self.compileNode(node)
+        self.bodies[0] = program
+        self.maxDepth = max(self.maxDepth, program.depth)
+        return program
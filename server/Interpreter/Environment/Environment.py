@@ -5,9 +5,12 @@ class Environment:
     """
     Represents an environment for variable bindings, supporting nested (parent) environments.
     Used for variable lookup and scope management in an interpreter.
+    Bindings are stored as a slot array (values) next to the tuple of their names, so
+    identifiers resolved at compile time are read by (depth, index) without hashing.
     """
+    __slots__ = ("parent", "names", "values", "number", "__weakref__")
 
-    def __init__(self, number, parent=None, variables=None):
+    def __init__(self, number, parent=None, variables=None, names=None, values=None):
         """
         Initialize a new Environment.
 
@@ -15,11 +18,33 @@ class Environment:
             number (int): Unique identifier for the environment.
             parent (Environment, optional): Reference to the parent environment. Defaults to None.
             variables (dict, optional): Dictionary of variable bindings. Defaults to empty dict.
+            names (tuple, optional): Names of the slots, used instead of variables.
+            values (list, optional): Values of the slots, in the same order as names.
         """
         self.parent = parent  # Reference to the parent environment (for nested scopes)
-        self.variables = variables if variables is not None else {}  # Variable bindings in this environment
+        if variables is not None:
+            names = tuple(variables)
+            values = list(variables.values())
+        self.names = names if names is not None else ()  # Names of the bindings in this environment
+        self.values = values if values is not None else []  # Values of the bindings, slot by slot
         self.number = number  # Unique identifier for this environment
 
+    @property
+    def variables(self):
+        """
+        The bindings of this environment as a dictionary, for debugging.
+        """
+        return dict(zip(self.names, self.values))
+
+    def lookUpSlot(self, depth, index):
+        """
+        Return the value in slot index of the environment depth levels up the chain.
+        """
+        env = self
+        for _ in range(depth):
+            env = env.parent
+        return env.values[index]
+
     def lookUpValue(self, name, line=0):
         """
         Look up the value of a variable or token in the environment chain.
@@ -34,7 +59,7 @@ class Environment:
             RPALException: If the identifier is not found in any environment.
         """
         #print(f"Looking up value for: {name} in environment {self.number}")
-        
+
         # If name is a Token, extract its line number and value
         if type(name) is Token:
             if name.getType() == "INT":
@@ -43,16 +68,19 @@ class Environment:
             if name.getType() == "STRING":
                 # If the token is a string, return its string value directly
                 return name.getValue()
-            
+            if name.getType() == "TRUTHVALUE":
+                # Truth values only come from folded constants
+                return name.getValue()
+
             line = name.getLineNumber()
             name = name.getValue()
-        # Check if the name exists in the current environment
-        if name in self.variables:
-            #print(f"Found {name} in environment {self.number}")
-            return self.variables[name]
-        # If not found in the current environment, check the parent environment recursively
-        elif self.parent is not None:
-            return self.parent.lookUpValue(name,line)
+        # Walk up the chain; a later slot with the same name shadows an earlier one
+        env = self
+        while env is not None:
+            names = env.names
+            for index in range(len(names) - 1, -1, -1):
+                if names[index] == name:
+                    return env.values[index]
+            env = env.parent
         # If not found in any environment, raise an exception with the line number
-        else:
-            raise RPALException(f"Undeclared Identifier <{name}> in line {line}")
\ No newline at end of file
+        raise RPALException(f"Undeclared Identifier <{name}> in line {line}")
@@ -0,0 +1,84 @@
+from Interpreter.Exception.RPALException import RPALException
+from Interpreter.Parser.parser import Node
+from Interpreter.Tokenizer.tokenizer import Token
+
+# Keywords that the machines look up in the environment like identifiers
+NAMED_KEYWORDS = ["nil", "Y", "true", "false", "dummy"]
+
+def variableNames(lambdaNode):
+    """
+    Returns the names bound by a standardized 'lambda' node, in slot order.
+    """
+    variableNode = lambdaNode.child[0]
+    if variableNode.head == ",":
+        heads = [var.head for var in variableNode.child]
+    else:
+        heads = [variableNode.head]
+    return [head.getValue() if type(head) is Token else head for head in heads]
+
+class LexicalResolver:
+    """
+    Resolves identifiers of a Standardized Tree to lexical addresses.
+    Every 'lambda' opens a scope whose slots are its variables, in order. An identifier bound
+    by a lambda gets address (depth, index): depth is the number of scopes between the use and
+    the binding lambda, index its slot. Names of the primitive environment are addressed at the
+    depth of the outermost scope. Unbound identifiers keep address None and are looked up by
+    name at run time, which reports them as undeclared when they are reached.
+    """
+    def __init__(self, globalNames):
+        """
+        Args:
+            globalNames (iterable): Names of the primitive environment, in slot order.
+        """
+        self.globalSlots = {}
+        for index, name in enumerate(globalNames):
+            self.globalSlots[name] = index
+        self.scopes = []
+
+    def lookUp(self, name):
+        """
+        Returns the (depth, index) address of the name in the current scopes, or None.
+        """
+        depth = 0
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return (depth, scope[name])
+            depth += 1
+        if name in self.globalSlots:
+            return (depth, self.globalSlots[name])
+        return None
+
+    def resolveNode(self, node):
+        head = node.head
+        if head == "lambda":
+            scope = {}
+            for index, name in enumerate(variableNames(node)):
+                scope[name] = index  # a repeated name is bound to its last slot
+            self.scopes.append(scope)
+            for child in node.child[1:]:
+                self.resolveNode(child)
+            self.scopes.pop()
+            return
+
+        if (type(head) is Token and head.getType() == "ID") or (type(head) is str and head in NAMED_KEYWORDS):
+            node.address = self.lookUp(head.getValue() if type(head) is Token else head)
+            return
+
+        for child in node.child:
+            self.resolveNode(child)
+
+    def resolve(self, node):
+        """
+        Entry point for resolving the identifiers of the ST in place.
+        Args:
+            node (Node): The root node of the Standardized Tree.
+        Returns:
+            Node: The same tree, with address set on resolved identifier nodes.
+        """
+        if node is None:
+            raise RPALException("Node is None")
+        if not isinstance(node, Node):
+            raise RPALException("Node is not an instance of Node class")
+        self.scopes = []
+        self.resolveNode(node)
+        return node
@@ -0,0 +1,137 @@
+from Interpreter.Environment.resolver import NAMED_KEYWORDS, variableNames
+from Interpreter.Tokenizer.tokenizer import Token
+
+# Helpers shared by the optimization passes to inspect Standardized Tree nodes
+
+# Primitive functions that only compute a value from their argument
+PURE_FUNCTIONS = {
+    "Conc", "Stem", "Stern", "Order", "Null", "Isinteger", "Isstring", "Istruthvalue",
+    "Isfunction", "Istuple", "Isdummy",
+}
+# Reserved words of the truth values, which no definition can rebind, and their values
+TRUTH_VALUE_KEYWORDS = {"true": True, "false": False}
+
+def identifierName(node):
+    """
+    Returns the name looked up by an identifier node, or None if the node is not one.
+    The standardizer's 'Y' and the keywords of primitive values are looked up by name too.
+    """
+    head = node.head
+    if type(head) is Token:
+        return head.getValue() if head.getType() == "ID" else None
+    if head in NAMED_KEYWORDS:
+        return head
+    return None
+
+def isLiteral(node):
+    """
+    Checks whether the node is an integer, string or truth value literal, or the 'true' or
+    'false' keyword.
+    """
+    if node.child:
+        return False
+    if type(node.head) is Token:
+        return node.head.getType() in ("INT", "STRING", "TRUTHVALUE")
+    return node.head in TRUTH_VALUE_KEYWORDS
+
+def treeSize(node):
+    """
+    Returns the number of nodes in the tree.
+    """
+    size = 1
+    for child in node.child:
+        size += treeSize(child)
+    return size
+
+def freeVariables(node, bound=frozenset(), result=None):
+    """
+    Returns the set of names the tree looks up without binding them itself.
+    """
+    if result is None:
+        result = set()
+    if node.head == "lambda":
+        inner = bound | set(variableNames(node))
+        for child in node.child[1:]:
+            freeVariables(child, inner, result)
+        return result
+    name = identifierName(node)
+    if name is not None:
+        if name not in bound:
+            result.add(name)
+        return result
+    for child in node.child:
+        freeVariables(child, bound, result)
+    return result
+
+def boundVariables(node, result=None):
+    """
+    Returns the set of names bound by any lambda inside the tree.
+    """
+    if result is None:
+        result = set()
+    if node.head == "lambda":
+        result.update(variableNames(node))
+        for child in node.child[1:]:
+            boundVariables(child, result)
+        return result
+    for child in node.child:
+        boundVariables(child, result)
+    return result
+
+def countOccurrences(node, name):
+    """
+    Counts the uses of name in the tree that refer to its outer binding.
+    """
+    if node.head == "lambda":
+        if name in variableNames(node):
+            return 0
+        return sum(countOccurrences(child, name) for child in node.child[1:])
+    if identifierName(node) == name:
+        return 1
+    return sum(countOccurrences(child, name) for child in node.child)
+
+def countApplications(node, name):
+    """
+    Counts the uses of name in the tree that are the function of a 'gamma' node.
+    """
+    if node.head == "lambda":
+        if name in variableNames(node):
+            return 0
+        return sum(countApplications(child, name) for child in node.child[1:])
+    count = 0
+    if node.head == "gamma" and len(node.child) == 2 and identifierName(node.child[0]) == name:
+        count = 1
+    return count + sum(countApplications(child, name) for child in node.child)
+
+def replaceNode(node, other):
+    """
+    Makes node a copy of the other node, keeping its identity in the parent.
+    """
+    node.head = other.head
+    node.child = other.child
+    node.address = other.address
+
+def isPureFunction(node, rebound):
+    """
+    Checks whether the node names a primitive in PURE_FUNCTIONS that the program never rebinds.
+    """
+    name = identifierName(node)
+    return name in PURE_FUNCTIONS and name not in rebound
+
+def mayHaveEffects(node, rebound, pure=frozenset()):
+    """
+    Checks whether evaluating the tree may print or run code that is not known to be pure.
+    Every application is assumed to have effects unless it applies a lambda, Y or a pure
+    primitive; Print and functions passed around as values are therefore treated as effects.
+    Args:
+        node (Node): The tree to check.
+        rebound (set): Names bound anywhere in the program, see boundVariables.
+        pure (set, optional): Names of functions whose applications are known to be pure.
+    """
+    if node.head == "gamma" and len(node.child) == 2:
+        function = node.child[0]
+        if function.head == "gamma" and len(function.child) == 2 and identifierName(function.child[0]) == "Conc":
+            function = function.child[0]
+        if not (function.head == "lambda" or (identifierName(function) == "Y" and "Y" not in rebound) or isPureFunction(function, rebound) or identifierName(function) in pure):
+            return True
+    return any(mayHaveEffects(child, rebound, pure) for child in node.child)
@@ -0,0 +1,273 @@
+import bisect
+import copy
+
+from Interpreter.Exception.RPALException import RPALException
+from Interpreter.Environment.resolver import variableNames
+from Interpreter.Optimizer.analysis import (
+    boundVariables, freeVariables, identifierName, isPureFunction, mayHaveEffects, replaceNode,
+)
+from Interpreter.Parser.parser import Node
+from Interpreter.Tokenizer.tokenizer import Token
+
+# Weight of an application of a primitive function, on top of its nodes
+APPLICATION_COST = 4
+# Smallest saving, in weighted nodes, for which a repeated subexpression is bound once
+MIN_HOIST_COST = 6
+# Upper bound on the subexpressions bound in one region
+MAX_HOISTS_PER_REGION = 32
+# Prefix of the bound names; RPAL identifiers start with a letter, so they never clash
+HOIST_PREFIX = "_cse"
+
+def isLet(node):
+    """
+    Checks whether the node applies a lambda directly, as 'let' and 'where' standardize to.
+    """
+    return node.head == "gamma" and len(node.child) == 2 and node.child[0].head == "lambda" and len(node.child[0].child) == 2
+
+def applicationCost(node):
+    """
+    Returns the weighted size of the tree, counting primitive applications as expensive.
+    """
+    cost = 1 + (APPLICATION_COST if node.head == "gamma" else 0)
+    for child in node.child:
+        cost += applicationCost(child)
+    return cost
+
+def firstLine(node):
+    """
+    Returns the line number of the first token in the tree.
+    """
+    if type(node.head) is Token:
+        return node.head.getLineNumber()
+    for child in node.child:
+        line = firstLine(child)
+        if line is not None:
+            return line
+    return None
+
+class Scope:
+    """
+    A 'let' body and the names its lambda binds, linked to the scope it is nested in, so
+    entering a 'let' never copies the names bound outside it.
+    """
+    __slots__ = ("body", "names", "parent")
+
+    def __init__(self, body, names, parent):
+        self.body = body
+        self.names = names
+        self.parent = parent
+
+def bindingOf(scope, name):
+    """
+    Returns the 'let' body the name is bound for in the scope, or None if no 'let' binds it.
+    """
+    while scope is not None:
+        if name in scope.names:
+            return scope.body
+        scope = scope.parent
+    return None
+
+class SubexpressionEliminator:
+    """
+    Binds repeated pure subexpressions of a Standardized Tree once with a 'let':
+        E[e, e]  =>  gamma(lambda(t, E[t, t]), e)
+    A region is the part of the tree evaluated unconditionally whenever its root is: the whole
+    program, a lambda body or a conditional branch, followed through the bodies of the 'let's
+    inside it. Within a region the occurrences of an expression are found in the order the
+    machine evaluates them, and the binding is placed at the start of the innermost 'let' body
+    (or region) where all its free names are bound.
+    An expression is pure when it is built from literals, identifiers, operators, tuples and
+    applications of PURE_FUNCTIONS. Print and every other application are effects, and so is a
+    conditional with an effect in a branch: an expression is only moved when no effect is
+    evaluated between its new place and its first occurrence, so the output is unchanged even
+    when evaluating the expression fails.
+    """
+    def __init__(self):
+        self.eliminated = 0
+        self.nameCount = 0
+        self.rebound = set()
+        # The 'let' body every name is bound for at the node being visited
+        self.bindings = {}
+
+    def record(self, node, key, scope):
+        self.occurrences.setdefault(key, []).append((self.index, node, scope))
+
+    def visit(self, node, scope):
+        """
+        Walks the region in evaluation order, recording the occurrences of pure subexpressions
+        and the position of effects.
+        Returns a key identifying the value of the node if it is pure, or None.
+        """
+        head = node.head
+        if head == "lambda":
+            self.index += 1
+            return None
+
+        if not node.child:
+            self.index += 1
+            name = identifierName(node)
+            if name is not None:
+                # The same name is the same value only under the same binding
+                return ("ID", name, id(self.bindings.get(name)))
+            if type(head) is Token:
+                return (head.getType(), head.getValue())
+            return (head,)
+
+        if head == "->" and len(node.child) == 3:
+            self.visit(node.child[0], scope)
+            if mayHaveEffects(node.child[1], self.rebound) or mayHaveEffects(node.child[2], self.rebound):
+                self.effects.append(self.index)
+            self.index += 1
+            return None
+
+        if isLet(node):
+            function, argument = node.child
+            self.visit(argument, scope)
+            self.index += 1
+            body = function.child[1]
+            names = set(variableNames(function))
+            # Bound for the body only; the outer bindings are restored after it
+            saved = {name: self.bindings.get(name) for name in names}
+            for name in names:
+                self.bindings[name] = body
+            self.starts[id(body)] = self.index
+            self.visit(body, Scope(body, names, scope))
+            for name, binding in saved.items():
+                if binding is None:
+                    del self.bindings[name]
+                else:
+                    self.bindings[name] = binding
+            return None
+
+        if head == "gamma" and len(node.child) == 2:
+            function, argument = node.child
+            argumentKey = self.visit(argument, scope)
+            if function.head == "gamma" and len(function.child) == 2 and identifierName(function.child[0]) == "Conc" and isPureFunction(function.child[0], self.rebound):
+                # Conc takes both operands in one step, so only the full application is shared
+                firstKey = self.visit(function.child[1], scope)
+                self.visit(function.child[0], scope)
+                self.index += 1
+                if argumentKey is None or firstKey is None:
+                    return None
+                key = ("Conc", firstKey, argumentKey)
+            else:
+                functionKey = self.visit(function, scope)
+                self.index += 1
+                name = identifierName(function)
+                if name == "Y" and "Y" not in self.rebound:
+                    return None
+                if name == "Conc" or not isPureFunction(function, self.rebound):
+                    self.effects.append(self.index)
+                    return None
+                if argumentKey is None:
+                    return None
+                key = ("gamma", functionKey, argumentKey)
+            self.record(node, key, scope)
+            return key
+
+        keys = [None] * len(node.child)
+        for index in range(len(node.child) - 1, -1, -1):
+            keys[index] = self.visit(node.child[index], scope)
+        self.index += 1
+        if None in keys:
+            return None
+        key = (head,) + tuple(keys)
+        self.record(node, key, scope)
+        return key
+
+    def findCandidate(self, region):
+        """
+        Returns the repeated subexpression of the region that saves the most work when bound
+        once, as (occurrences, binding point), or None.
+        """
+        self.index = 0
+        self.occurrences = {}
+        self.effects = []
+        self.starts = {id(region): 0}
+        self.bindings = {}
+        self.visit(region, None)
+
+        best = None
+        bestSaving = 0
+        for uses in self.occurrences.values():
+            if len(uses) < 2:
+                continue
+            index, node, scope = uses[0]
+            saving = (len(uses) - 1) * applicationCost(node)
+            if saving < MIN_HOIST_COST or saving <= bestSaving:
+                continue
+            point = region
+            for name in freeVariables(node):
+                binding = bindingOf(scope, name)
+                if binding is not None and self.starts[id(binding)] > self.starts[id(point)]:
+                    point = binding
+            # No effect may happen between the binding point and the first occurrence
+            start = self.starts[id(point)]
+            position = bisect.bisect_right(self.effects, start)
+            if position < len(self.effects) and self.effects[position] < index:
+                continue
+            best = (uses, point)
+            bestSaving = saving
+        return best
+
+    def hoist(self, uses, point):
+        """
+        Binds the expression of the occurrences at the start of point and replaces each
+        occurrence by the bound name.
+        """
+        name = f"{HOIST_PREFIX}{self.nameCount}"
+        self.nameCount += 1
+        value = copy.deepcopy(uses[0][1])
+        line = firstLine(value)
+        for _, occurrence, _ in uses:
+            replaceNode(occurrence, Node(Token("ID", name, line)))
+        body = Node(point.head, point.child)
+        body.address = point.address
+        replaceNode(point, Node("gamma", [Node("lambda", [Node(Token("ID", name, line)), body]), value]))
+        self.eliminated += len(uses) - 1
+
+    def collectRegions(self, node, regions):
+        """
+        Appends the regions nested directly inside the region containing node.
+        """
+        if node.head == "lambda":
+            regions.append(node.child[1])
+            return
+        if node.head == "->" and len(node.child) == 3:
+            self.collectRegions(node.child[0], regions)
+            regions.append(node.child[1])
+            regions.append(node.child[2])
+            return
+        if isLet(node):
+            self.collectRegions(node.child[1], regions)
+            self.collectRegions(node.child[0].child[1], regions)
+            return
+        for child in node.child:
+            self.collectRegions(child, regions)
+
+    def eliminateRegion(self, region):
+        for _ in range(MAX_HOISTS_PER_REGION):
+            candidate = self.findCandidate(region)
+            if candidate is None:
+                break
+            self.hoist(*candidate)
+        regions = []
+        self.collectRegions(region, regions)
+        for nested in regions:
+            self.eliminateRegion(nested)
+
+    def eliminate(self, node):
+        """
+        Entry point for eliminating the common subexpressions of the ST in place.
+        Args:
+            node (Node): The root node of the Standardized Tree.
+        Returns:
+            Node: The same root node, with repeated pure subexpressions bound once.
+        """
+        if node is None:
+            raise RPALException("Node is None")
+        if not isinstance(node, Node):
+            raise RPALException("Node is not an instance of Node class")
+        self.rebound = boundVariables(node)
+        self.eliminateRegion(node)
+        return node
@@ -0,0 +1,133 @@
+from Interpreter.Exception.RPALException import RPALException
+from Interpreter.Optimizer.analysis import TRUTH_VALUE_KEYWORDS, replaceNode
+from Interpreter.Parser.parser import Node
+from Interpreter.Tokenizer.tokenizer import Token
+
+# Operators folded when all their operands are constants, with the exact semantics of rules 6 and 7
+BINARY_FOLDS = {
+    "+": lambda a, b: a + b,
+    "-": lambda a, b: a - b,
+    "*": lambda a, b: a * b,
+    "/": lambda a, b: int(a / b),
+    "eq": lambda a, b: a == b,
+    "gr": lambda a, b: a > b,
+    "ge": lambda a, b: a >= b,
+    "ls": lambda a, b: a < b,
+    "le": lambda a, b: a <= b,
+    "**": lambda a, b: a ** b,
+}
+UNARY_FOLDS = {
+    "not": lambda a: not a,
+    "neg": lambda a: -a,
+}
+
+# Results of '**' larger than this many bits are left for the machine to compute
+MAX_POWER_BITS = 4096
+
+def constantValue(node):
+    """
+    Returns (True, value) if the node is a literal or the 'true' or 'false' keyword, with the
+    value the machine would push for it, or (False, None) otherwise.
+    """
+    if node.child:
+        return False, None
+    if type(node.head) is not Token:
+        if node.head in TRUTH_VALUE_KEYWORDS:
+            return True, TRUTH_VALUE_KEYWORDS[node.head]
+        return False, None
+    if node.head.getType() == "INT":
+        return True, int(node.head.getValue())
+    if node.head.getType() in ("STRING", "TRUTHVALUE"):
+        return True, node.head.getValue()
+    return False, None
+
+def constantToken(value, line):
+    """
+    Builds the literal token for a folded value.
+    """
+    if type(value) is bool:
+        return Token("TRUTHVALUE", value, line)
+    if type(value) is int:
+        return Token("INT", value, line)
+    return Token("STRING", value, line)
+
+class ConstantFolder:
+    """
+    Folds closed operator subexpressions of a Standardized Tree into literals and replaces
+    conditionals with a constant guard by the branch that is taken.
+    Only operators whose operands are all literals are folded, and only when the result is
+    an integer, a string or a truth value computed exactly as the CSE machine would. Any
+    expression that would fail at run time (e.g. division by zero) is left untouched so the
+    error is still reported when it is reached.
+    """
+    def __init__(self):
+        self.folded = 0
+
+    def foldOperator(self, node):
+        operator = node.head
+        if operator in BINARY_FOLDS and len(node.child) == 2:
+            isConstant1, operand1 = constantValue(node.child[0])
+            isConstant2, operand2 = constantValue(node.child[1])
+            if not (isConstant1 and isConstant2):
+                return
+            if operator == "/" and operand2 == 0:
+                return
+            if operator == "*" and (type(operand1) is str or type(operand2) is str):
+                return
+            if operator == "**":
+                if type(operand1) is not int or type(operand2) is not int or operand2 < 0:
+                    return
+                if abs(operand1) > 1 and operand2 * operand1.bit_length() > MAX_POWER_BITS:
+                    return
+            try:
+                result = BINARY_FOLDS[operator](operand1, operand2)
+            except (TypeError, ValueError, OverflowError, ZeroDivisionError):
+                return
+        elif operator in UNARY_FOLDS and len(node.child) == 1:
+            isConstant, operand = constantValue(node.child[0])
+            if not isConstant:
+                return
+            try:
+                result = UNARY_FOLDS[operator](operand)
+            except TypeError:
+                return
+        else:
+            return
+        if type(result) not in (bool, int, str):
+            return
+        # Keywords carry no line; the folded token takes the line of the first literal, if any
+        line = next((child.head.getLineNumber() for child in node.child if type(child.head) is Token), None)
+        node.changeHead(constantToken(result, line))
+        node.clearAllChildren()
+        self.folded += 1
+
+    def foldNode(self, node):
+        # Fold the children first so constants propagate upwards
+        for child in node.child:
+            self.foldNode(child)
+
+        if node.head == "->" and len(node.child) == 3:
+            isConstant, guard = constantValue(node.child[0])
+            if isConstant:
+                # Dead-branch elimination: the branch that is not taken (and its delta) goes away
+                replaceNode(node, node.child[1] if guard else node.child[2])
+                self.folded += 1
+            return
+
+        if type(node.head) is str:
+            self.foldOperator(node)
+
+    def fold(self, node):
+        """
+        Entry point for folding the constants of the ST in place.
+        Args:
+            node (Node): The root node of the Standardized Tree.
+        Returns:
+            Node: The same root node, folded.
+        """
+        if node is None:
+            raise RPALException("Node is None")
+        if not isinstance(node, Node):
+            raise RPALException("Node is not an instance of Node class")
+        self.foldNode(node)
+        return node
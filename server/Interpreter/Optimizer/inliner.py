@@ -0,0 +1,139 @@
+import copy
+
+from Interpreter.Exception.RPALException import RPALException
+from Interpreter.Environment.resolver import NAMED_KEYWORDS, variableNames
+from Interpreter.Optimizer.analysis import (
+    boundVariables, countApplications, countOccurrences, freeVariables, identifierName,
+    isLiteral, replaceNode, treeSize,
+)
+from Interpreter.Parser.parser import Node
+from Interpreter.Tokenizer.tokenizer import Token
+
+# Largest lambda (in nodes) substituted for a name that is used once
+INLINE_SIZE_LIMIT = 64
+# Largest lambda (in nodes) substituted for a name that is used more than once
+TRIVIAL_SIZE_LIMIT = 12
+# Total number of nodes the inliner may add to a program by duplicating lambdas
+GROWTH_LIMIT = 256
+
+class Inliner:
+    """
+    Beta-reduces 'gamma' nodes whose function is a 'lambda' of a single variable and whose
+    argument is already a value, i.e. the let-bindings and applications of a Standardized Tree
+    that do not need an environment at run time:
+        gamma(lambda(x, E), V)  =>  E[V/x]
+    V must be a lambda, a literal, 'nil' or an identifier bound by an enclosing lambda, so
+    evaluating it has no effect and cannot fail, and moving it does not change the result.
+    Substituting a let-bound lambda turns its call sites into new redexes, which are reduced
+    in turn when their arguments are values too.
+    Lambdas are only substituted where every use applies them, when they are small enough for
+    the number of uses, and within a growth budget for the whole program. Recursive functions
+    are bound through Y and are never substituted. Substitution is skipped whenever a lambda
+    inside E binds a name that V refers to, so no identifier changes its binding.
+    """
+    def __init__(self):
+        self.inlined = 0
+        self.growth = 0
+        self.scopes = []
+
+    def isBound(self, name):
+        for scope in self.scopes:
+            if name in scope:
+                return True
+        return False
+
+    def isValue(self, node):
+        """
+        Checks whether evaluating the node only pushes a value that is already known.
+        """
+        if node.head == "lambda" or isLiteral(node):
+            return True
+        if node.head == "nil" and not node.child:
+            return True
+        if type(node.head) is Token and node.head.getType() == "ID":
+            return self.isBound(node.head.getValue())
+        return False
+
+    def substitute(self, node, name, value):
+        """
+        Replaces the uses of name in the tree that refer to its outer binding by copies of value.
+        """
+        if node.head == "lambda":
+            if name in variableNames(node):
+                return
+            for child in node.child[1:]:
+                self.substitute(child, name, value)
+            return
+        if identifierName(node) == name:
+            replaceNode(node, copy.deepcopy(value))
+            return
+        for child in node.child:
+            self.substitute(child, name, value)
+
+    def reduce(self, node):
+        """
+        Beta-reduces the node in place if it is a redex worth reducing.
+        Returns True if the node was replaced.
+        """
+        if node.head != "gamma" or len(node.child) != 2:
+            return False
+        function, argument = node.child
+        if function.head != "lambda" or len(function.child) != 2 or function.child[0].head == ",":
+            return False
+        variable = function.child[0].head
+        if type(variable) is not Token or variable.getType() != "ID" or variable.getValue() in NAMED_KEYWORDS:
+            return False
+        if not self.isValue(argument):
+            return False
+
+        name = variable.getValue()
+        body = function.child[1]
+        uses = countOccurrences(body, name)
+        if uses > 0:
+            if boundVariables(body) & freeVariables(argument):
+                return False
+            if argument.head == "lambda":
+                size = treeSize(argument)
+                if countApplications(body, name) != uses:
+                    return False
+                if size > (INLINE_SIZE_LIMIT if uses == 1 else TRIVIAL_SIZE_LIMIT):
+                    return False
+                if self.growth + (uses - 1) * size > GROWTH_LIMIT:
+                    return False
+                self.growth += (uses - 1) * size
+            self.substitute(body, name, argument)
+
+        replaceNode(node, body)
+        self.inlined += 1
+        return True
+
+    def inlineNode(self, node):
+        if node.head == "lambda":
+            self.scopes.append(set(variableNames(node)))
+            for child in node.child[1:]:
+                self.inlineNode(child)
+            self.scopes.pop()
+            return
+
+        for child in node.child:
+            self.inlineNode(child)
+
+        # The reduced tree may hold new redexes where the substituted lambda was applied
+        if self.reduce(node):
+            self.inlineNode(node)
+
+    def inline(self, node):
+        """
+        Entry point for inlining the let-bound lambdas of the ST in place.
+        Args:
+            node (Node): The root node of the Standardized Tree.
+        Returns:
+            Node: The same root node, with the redexes reduced.
+        """
+        if node is None:
+            raise RPALException("Node is None")
+        if not isinstance(node, Node):
+            raise RPALException("Node is not an instance of Node class")
+        self.scopes = []
+        self.inlineNode(node)
+        return node
@@ -0,0 +1,62 @@
+from Interpreter.Exception.RPALException import RPALException
+from Interpreter.Environment.resolver import variableNames
+from Interpreter.Optimizer.analysis import boundVariables, identifierName, mayHaveEffects
+from Interpreter.Parser.parser import Node
+
+class RecursionMemoizer:
+    """
+    Marks the recursive functions of a Standardized Tree whose results the machines may cache.
+    A 'rec' function standardizes to
+        gamma(Y, lambda(f, lambda(x, E)))
+    and is marked when E has no effect other than calling f itself, see mayHaveEffects: the
+    result then only depends on the argument and on the environment of the closure, which
+    never changes, so each recursive closure keeps its own cache.
+    Curried functions, whose body is another lambda, are not marked, since caching their
+    first application only saves building a closure.
+    """
+    def __init__(self):
+        self.marked = 0
+        self.rebound = set()
+
+    def isPure(self, function):
+        """
+        Checks whether the lambda bound through Y is a pure recursive function.
+        """
+        if function.head != "lambda" or len(function.child) != 2 or function.child[0].head == ",":
+            return False
+        names = variableNames(function)
+        if len(names) != 1:
+            return False
+        inner = function.child[1]
+        if inner.head != "lambda" or len(inner.child) != 2 or inner.child[1].head == "lambda":
+            return False
+        name = names[0]
+        if name in boundVariables(inner):
+            # Another binding of the name inside the function may not be the function itself
+            return False
+        return not mayHaveEffects(inner.child[1], self.rebound, pure={name})
+
+    def markNode(self, node):
+        if node.head == "gamma" and len(node.child) == 2:
+            function, argument = node.child
+            if identifierName(function) == "Y" and "Y" not in self.rebound and self.isPure(argument):
+                argument.child[1].memoize = True
+                self.marked += 1
+        for child in node.child:
+            self.markNode(child)
+
+    def mark(self, node):
+        """
+        Entry point for marking the pure recursive functions of the ST.
+        Args:
+            node (Node): The root node of the Standardized Tree.
+        Returns:
+            Node: The same root node, with the lambdas of pure recursive functions marked.
+        """
+        if node is None:
+            raise RPALException("Node is None")
+        if not isinstance(node, Node):
+            raise RPALException("Node is not an instance of Node class")
+        self.rebound = boundVariables(node)
+        self.markNode(node)
+        return node
@@ -0,0 +1,40 @@
+from Interpreter.Exception.RPALException import RPALException
+from Interpreter.Optimizer.folder import ConstantFolder
+from Interpreter.Optimizer.eliminator import SubexpressionEliminator
+from Interpreter.Optimizer.inliner import Inliner
+
+# Level 0 runs the standardized tree as is, level 1 enables the tree optimizations
+OPTIMIZATION_LEVELS = [0, 1]
+# Upper bound on the inlining and folding rounds run at level 1
+MAX_INLINE_ROUNDS = 4
+
+class Optimizer:
+    """
+    Runs the optimization passes over a Standardized Tree before control structures are generated.
+    """
+    def __init__(self, level=1):
+        """
+        Args:
+            level (int): Optimization level; 0 keeps the tree exactly as standardized.
+        """
+        if level not in OPTIMIZATION_LEVELS:
+            raise RPALException(f"Unknown optimization level: {level}")
+        self.level = level
+
+    def optimize(self, node):
+        """
+        Optimizes the ST in place and returns its root.
+        """
+        if self.level == 0:
+            return node
+        ConstantFolder().fold(node)
+        # Inlining exposes new constants and folding exposes new redexes, so alternate them
+        inliner = Inliner()
+        for _ in range(MAX_INLINE_ROUNDS):
+            inlined = inliner.inlined
+            inliner.inline(node)
+            if inliner.inlined == inlined:
+                break
+            ConstantFolder().fold(node)
+        SubexpressionEliminator().eliminate(node)
+        return node
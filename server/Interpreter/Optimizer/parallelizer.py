@@ -0,0 +1,182 @@
+from Interpreter.Exception.RPALException import RPALException
+from Interpreter.Environment.resolver import variableNames
+from Interpreter.Optimizer.analysis import boundVariables, identifierName, isPureFunction
+from Interpreter.Parser.parser import Node
+
+# Estimated work of applying a recursive function, which usually dominates a component
+RECURSIVE_CALL_WORK = 1000
+# Smallest estimated work of a component evaluated by a worker process
+PARALLEL_WORK_THRESHOLD = 1000
+# Smallest number of costly components for which a tuple is evaluated in parallel
+MIN_PARALLEL_COMPONENTS = 2
+# Primitives whose applications write the output
+PRINT_FUNCTIONS = {"Print", "print"}
+
+def applicationHead(node):
+    """
+    Returns the function applied by a chain of curried applications.
+    """
+    while node.head == "gamma" and len(node.child) == 2:
+        node = node.child[0]
+    return node
+
+def recursiveFunction(node):
+    """
+    Returns the lambda of the function defined by gamma(Y, lambda(f, lambda(x, E))), or None.
+    """
+    if node.head != "gamma" or len(node.child) != 2 or identifierName(node.child[0]) != "Y":
+        return None
+    function = node.child[1]
+    if function.head != "lambda" or len(function.child) != 2 or function.child[0].head == ",":
+        return None
+    if function.child[1].head != "lambda":
+        return None
+    return function
+
+class TupleParallelizer:
+    """
+    Marks the tuples of a Standardized Tree whose components the CSE machine may evaluate in
+    worker processes. A tuple is marked when evaluating its components cannot print, so the
+    order they run in is not observable, and at least MIN_PARALLEL_COMPONENTS of them are
+    costly: their estimated work, in which every application of a recursive function counts
+    RECURSIVE_CALL_WORK, reaches PARALLEL_WORK_THRESHOLD.
+    A program that never names Print cannot print at all. Otherwise a component must not apply
+    anything but lambdas, Y, pure primitives and functions defined once in the program whose
+    bodies are pure themselves; functions passed around as values are treated as printing.
+    The 'tau' node gets parallel, the list of the components that are costly.
+    """
+    def __init__(self):
+        self.marked = 0
+        self.rebound = set()
+        # Functions defined by a 'let' or 'rec' of the program, by name
+        self.functions = {}
+        self.recursive = set()
+        self.pure = set()
+        # Set when the program never names a primitive that prints
+        self.silent = False
+        self.work = {}
+
+    def countBindings(self, node, counts):
+        """
+        Counts the lambdas binding each name; the lambda through which a 'rec' function
+        refers to itself is not another binding of its name.
+        """
+        if node.head == "lambda":
+            for name in variableNames(node):
+                counts[name] = counts.get(name, 0) + 1
+        elif node.head == "gamma" and len(node.child) == 2 and node.child[0].head == "lambda":
+            function = recursiveFunction(node.child[1])
+            names = variableNames(node.child[0])
+            if function is not None and variableNames(function) == names:
+                counts[names[0]] = counts.get(names[0], 0) - 1
+        for child in node.child:
+            self.countBindings(child, counts)
+
+    def findFunctions(self, node, counts):
+        """
+        Collects the functions bound by gamma(lambda(f, E), F) to a name bound only there.
+        """
+        if node.head == "gamma" and len(node.child) == 2 and node.child[0].head == "lambda":
+            names = variableNames(node.child[0])
+            value = node.child[1]
+            if len(names) == 1 and counts.get(names[0]) == 1:
+                function = recursiveFunction(value)
+                if function is not None:
+                    self.functions[names[0]] = function.child[1]
+                    self.recursive.add(names[0])
+                elif value.head == "lambda":
+                    self.functions[names[0]] = value
+        for child in node.child:
+            self.findFunctions(child, counts)
+
+    def mayPrint(self, node, pure):
+        """
+        Checks whether evaluating the tree may apply something not known to be pure.
+        """
+        if node.head == "gamma" and len(node.child) == 2:
+            head = applicationHead(node)
+            name = identifierName(head)
+            if not (head.head == "lambda" or (name == "Y" and "Y" not in self.rebound) or isPureFunction(head, self.rebound) or name in pure):
+                return True
+        return any(self.mayPrint(child, pure) for child in node.child)
+
+    def findPureFunctions(self):
+        """
+        Finds the functions whose applications are pure, assuming the recursive calls of a
+        function to itself are.
+        """
+        changed = True
+        while changed:
+            changed = False
+            for name, function in self.functions.items():
+                if name not in self.pure and not self.mayPrint(function, self.pure | {name}):
+                    self.pure.add(name)
+                    changed = True
+
+    def functionWork(self, name):
+        """
+        Returns the estimated work of applying the named function.
+        """
+        if name in self.recursive:
+            return RECURSIVE_CALL_WORK
+        if name not in self.work:
+            # Guards against a function that refers to itself without 'rec'
+            self.work[name] = 0
+            self.work[name] = self.estimateWork(self.functions[name].child[1])
+        return self.work[name]
+
+    def estimateWork(self, node):
+        """
+        Returns the estimated work of evaluating the tree once.
+        """
+        work = 1
+        if node.head == "gamma" and len(node.child) == 2:
+            head = applicationHead(node)
+            name = identifierName(head)
+            if name == "Y":
+                work += RECURSIVE_CALL_WORK
+            elif name in self.functions:
+                work += self.functionWork(name)
+        for child in node.child:
+            work += self.estimateWork(child)
+        return work
+
+    def namesPrint(self, node):
+        """
+        Checks whether the tree names a primitive that prints.
+        """
+        if identifierName(node) in PRINT_FUNCTIONS:
+            return True
+        return any(self.namesPrint(child) for child in node.child)
+
+    def markNode(self, node):
+        if node.head == "tau":
+            if self.silent or not any(self.mayPrint(child, self.pure) for child in node.child):
+                costly = [self.estimateWork(child) >= PARALLEL_WORK_THRESHOLD for child in node.child]
+                if sum(costly) >= MIN_PARALLEL_COMPONENTS:
+                    node.parallel = costly
+                    self.marked += 1
+        for child in node.child:
+            self.markNode(child)
+
+    def mark(self, node):
+        """
+        Entry point for marking the tuples of the ST evaluated in parallel.
+        Args:
+            node (Node): The root node of the Standardized Tree.
+        Returns:
+            Node: The same root node, with the costly components of pure tuples marked.
+        """
+        if node is None:
+            raise RPALException("Node is None")
+        if not isinstance(node, Node):
+            raise RPALException("Node is not an instance of Node class")
+        self.rebound = boundVariables(node)
+        counts = {}
+        self.countBindings(node, counts)
+        self.findFunctions(node, counts)
+        self.silent = not self.namesPrint(node)
+        if not self.silent:
+            self.findPureFunctions()
+        self.markNode(node)
+        return node
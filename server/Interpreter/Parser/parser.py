@@ -7,6 +7,9 @@ class Node:
     def __init__(self,head,arr = None):
         self.head = head
         self.child = []
+        self.address = None  # (depth, index) of an identifier, set by the LexicalResolver
+        self.memoize = False  # set on the lambda of a pure recursive function by the RecursionMemoizer
+        self.parallel = None  # costly components of a pure tuple, set by the TupleParallelizer
         if arr != None:
             for i in range(len(arr)):
                 if(arr[i]!=None):
@@ -385,7 +388,7 @@ class Parser:
             else:
                 raise RPALException(f"Exception at line {self.gettoken().getLineNumber() if type(self.gettoken()) is Token else 'last line'}. got ''{self.gettoken().getValue()  if type(self.gettoken()) is Token else 'null'}'' where expected value '')''")
         
-        elif self.matchtype("dummy"):
+        elif self.match("dummy"):
             l2 = Node("dummy")
             self.movenext()
             #print( "Rn -> dummy")
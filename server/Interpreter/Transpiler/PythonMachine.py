@@ -0,0 +1,204 @@
+import sys
+import threading
+
+from Interpreter.Exception.RPALException import RPALException
+from Interpreter.CSE.generateCS import Eta
+from Interpreter.CSE.memo import MemoCache, MemoStatistics, addStore, memoKey, storeResults
+from Interpreter.Closure.ClosureMachine import ClosureMachine
+from Interpreter.Closure.closureCompiler import PendingConc, TailCall, binaryOperator, makeTupleOf
+from Interpreter.CSE.values import Closure, Dummy, Nil, Tuple
+
+# Python frames available to the program; each RPAL application takes one or two
+RECURSION_LIMIT = 300000
+# Stack of the thread running the program, large enough for the recursion limit
+THREAD_STACK_SIZE = 512 * 1024 * 1024
+
+def makeClosure(k, names, function):
+    """
+    Returns the closure of the lambda numbered k: a Closure whose c is the Python function
+    of the lambda, which holds the bindings of the closure.
+    """
+    return Closure(k, list(names), names, function)
+
+def finish(result, stores=None):
+    """
+    Makes the tail calls returned by the function of a closure, until one returns a value.
+    A memoized closure called in a tail position answers from its cache, or adds its store
+    to the stores of the frame, so memoized tail calls run in constant stack too.
+    """
+    while type(result) is TailCall:
+        function, argument = result.function, result.argument
+        cache = function.cache
+        if cache is None:
+            result = function.c(argument)
+            continue
+        key = memoKey(argument)
+        if key is not None:
+            found, value = cache.lookUp(key)
+            if found:
+                result = value
+                break
+            stores = addStore(stores, cache, key)
+        result = function.c.body(argument)
+    if stores is not None:
+        storeResults(stores, result)
+    return result
+
+def bind(argument, count):
+    """
+    Rule 11: returns the elements of the tuple bound to the count variables of a lambda.
+    """
+    if type(argument) is not Tuple:
+        raise RPALException("Expected a list of names on the stack for 'gamma' operation.")
+    if len(argument) != count:
+        raise RPALException("Number of names does not match number of variables in lambda.")
+    return argument.elements()
+
+def memoized(function, cache):
+    """
+    Returns the function of a memoized recursive closure, answering from its cache when it
+    knows the argument.
+    """
+    def call(argument):
+        key = memoKey(argument)
+        if key is None:
+            return finish(function(argument))
+        found, result = cache.lookUp(key)
+        if found:
+            return result
+        return finish(function(argument), [(cache, key)])
+    # The function itself, called by finish for the tail calls of the closure
+    call.body = function
+    return call
+
+def undeclared(name, line):
+    raise RPALException(f"Undeclared Identifier <{name}> in line {line}")
+
+def illegal():
+    return RPALException(f"Illegal Function Appication")
+
+class PythonMachine(ClosureMachine):
+    """
+    The PythonMachine runs a Standardized Tree translated by the PythonTranspiler into a
+    Python module, so the program runs as CPython bytecode. It shares the application rules
+    of the ClosureMachine; a closure is called by calling its Python function.
+    RPAL applications are Python calls, so the program runs in its own thread with a large
+    stack and a raised recursion limit; recursion deeper than RECURSION_LIMIT frames stops
+    the program with an RPALException. Tail calls are returned as a TailCall and made by the
+    caller, so tail-recursive loops of any length run in constant Python stack.
+    """
+
+    def __init__(self, code, environment):
+        """
+        Args:
+            code (code): The module compiled by PythonTranspiler.compile.
+            environment (Environment): The primitive environment.
+        """
+        self.environment = environment
+        self.totalEnvironments = 1
+        self.memoStatistics = MemoStatistics()
+        self.code = code
+        self.innerLambdas = frozenset()
+        self.memoized = frozenset()
+
+    def call(self, function, argument):
+        """
+        Applies a closure: calls its Python function, then the tail calls it returns.
+        """
+        return finish(function.c(argument))
+
+    def applyValue(self, function, argument):
+        """
+        Gamma on a value the generated code did not find to be a closure.
+        """
+        if type(function) is PendingConc:
+            return self.concatenate(function.first, argument)
+        return self.apply(function, argument)
+
+    def applyRator(self, function, argument):
+        """
+        Gamma whose result is the function of another application: Conc then takes the
+        argument of that application as its second operand, as on the CSE machine.
+        """
+        if type(function) is str and function == "conc":
+            return PendingConc(argument)
+        return self.applyValue(function, argument)
+
+    def recursive(self, function):
+        """
+        Rule 12: Y applied to a lambda.
+        """
+        if type(function) is not Closure:
+            raise RPALException("Expected a Lambda control structure on the stack for 'gamma' operation.")
+        if len(function.names) == 1 and function.k in self.innerLambdas:
+            # rec f = fn ...: the function of the lambda returns the inner closure, whose
+            # cell for f is then set to that closure itself
+            closure = finish(function.c(None))
+            body = closure.c
+            name = function.c.__code__.co_varnames[0]
+            if name in body.__code__.co_freevars:
+                body.__closure__[body.__code__.co_freevars.index(name)].cell_contents = closure
+            self.totalEnvironments += 1
+            if closure.k in self.memoized:
+                closure.cache = MemoCache(self.memoStatistics)
+                closure.c = memoized(body, closure.cache)
+            return closure
+        return Eta(function)
+
+    def namespace(self):
+        """
+        Returns the globals of the generated module.
+        """
+        return {
+            "Closure": Closure,
+            "TailCall": TailCall,
+            "Nil": Nil,
+            "Dummy": Dummy,
+            "makeClosure": makeClosure,
+            "makeTupleOf": makeTupleOf,
+            "bind": bind,
+            "applyValue": self.applyValue,
+            "applyRator": self.applyRator,
+            "concatenate": self.concatenate,
+            "divide": binaryOperator("/"),
+            "aug": binaryOperator("aug"),
+            "power": binaryOperator("**"),
+            "undeclared": undeclared,
+            "illegal": illegal,
+        }
+
+    def interpret(self):
+        """
+        Runs the compiled program and returns its value.
+        """
+        namespace = self.namespace()
+        exec(self.code, namespace)
+        self.innerLambdas = frozenset(namespace["INNER_LAMBDAS"])
+        self.memoized = frozenset(namespace["MEMOIZED"])
+        program = namespace["program"]
+        outcome = {}
+
+        def run():
+            try:
+                outcome["value"] = finish(program())
+            except RecursionError:
+                outcome["error"] = RPALException("Recursion is too deep for the python engine.")
+            except Exception as error:
+                outcome["error"] = error
+
+        recursionLimit = sys.getrecursionlimit()
+        stackSize = threading.stack_size()
+        sys.setrecursionlimit(max(recursionLimit, RECURSION_LIMIT))
+        try:
+            threading.stack_size(THREAD_STACK_SIZE)
+            thread = threading.Thread(target=run)
+            try:
+                thread.start()
+            finally:
+                threading.stack_size(stackSize)
+            thread.join()
+        finally:
+            sys.setrecursionlimit(recursionLimit)
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome["value"]
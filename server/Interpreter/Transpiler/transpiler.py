@@ -0,0 +1,469 @@
+import ast
+
+from Interpreter.Exception.RPALException import RPALException
+from Interpreter.Closure.closureCompiler import BINARY_OPERATORS, NAMED_KEYWORDS, UNARY_OPERATORS
+from Interpreter.CSE.values import Dummy, Nil
+from Interpreter.Environment.resolver import variableNames
+from Interpreter.Tokenizer.tokenizer import Token
+
+# Operators of rule 6 that are Python operators on the operand values
+ARITHMETIC_OPERATORS = {"+": ast.Add, "-": ast.Sub, "*": ast.Mult}
+COMPARISON_OPERATORS = {"eq": ast.Eq, "gr": ast.Gt, "ge": ast.GtE, "ls": ast.Lt, "le": ast.LtE}
+# Operators of rule 6 computed by a function of the PythonMachine
+OPERATOR_FUNCTIONS = {"/": "divide", "aug": "aug", "**": "power"}
+
+def load(name):
+    return ast.Name(id=name, ctx=ast.Load())
+
+def store(name):
+    return ast.Name(id=name, ctx=ast.Store())
+
+def call(name, *arguments):
+    return ast.Call(func=load(name), args=list(arguments), keywords=[])
+
+def pythonName(name, k, index):
+    """
+    Returns the Python variable holding slot index of the lambda numbered k.
+    RPAL identifiers start with a letter, so they never clash with the temporaries (_t1,
+    ...) or with the functions of the PythonMachine, which have no numbered suffix.
+    """
+    if not name.isidentifier():
+        name = "v"
+    return f"{name}_{k}_{index}"
+
+class Value:
+    """
+    The Python expression computing an ST node, once the statements it depends on have run.
+    A simple value is a variable or a constant: it can be evaluated any number of times, in
+    any order. Other values may fail when evaluated, but never have an effect.
+    """
+    __slots__ = ("expression", "simple")
+
+    def __init__(self, expression, simple=False):
+        self.expression = expression
+        self.simple = simple
+
+class FunctionScope:
+    """
+    A Python function being generated: the program, or the function of a lambda.
+    """
+    def __init__(self, node=None, k=0, names=()):
+        self.node = node
+        self.k = k
+        self.names = names  # Python variable of each slot of the lambda
+        self.statements = []
+        # Variable bound to the function itself by Y, when calls to it in a tail position
+        # may restart the function instead
+        self.selfName = None
+        self.loops = False
+
+class PythonTranspiler:
+    """
+    Translates a Standardized Tree into a Python module, compiled with compile() and run by
+    the PythonMachine.
+    Every lambda becomes a nested Python function, so RPAL variables are Python locals and
+    closure cells. Values are those of the other machines: a closure is a Closure whose c is
+    the Python function. Evaluation order follows the CSE machine: the operands of an
+    application, operator and tuple are evaluated from the last to the first. Applications
+    are assigned to temporaries in that order, while operators on variables and constants
+    stay Python expressions.
+    A recursive function calling itself in a tail position restarts its own loop, unless a
+    nested lambda captures its variables or its results are memoized. Any other closure
+    applied in a tail position is returned as a TailCall, which the caller calls in a loop,
+    so tail calls never grow the Python stack.
+    Lambdas are numbered exactly like CSGenerator numbers its control structures, so closures
+    print the same way on every machine.
+    The module defines program(), INNER_LAMBDAS, the numbers of the lambdas whose body is a
+    lambda (rule 12), and MEMOIZED, the numbers of the lambdas marked by RecursionMemoizer.
+    """
+    def __init__(self, environment):
+        """
+        Args:
+            environment (Environment): The primitive environment, whose values are constants.
+        """
+        self.primitiveNames = environment.names
+        self.primitiveValues = environment.values
+        self.deltaCount = 0
+        self.numbers = {}
+        self.captured = set()
+        self.innerLambdas = []
+        self.memoized = []
+        self.fixpoints = set()
+        self.scopes = []
+        self.temporaries = 0
+
+    def newDelta(self):
+        number = self.deltaCount
+        self.deltaCount += 1
+        return number
+
+    def binding(self, node, lambdas):
+        """
+        Returns what the leaf node reads: ("slot", depth, index) for a variable of the
+        enclosing lambdas, ("constant", value) for a literal or a primitive, ("undeclared",
+        name, line) for an unbound identifier, or None for a node no machine can evaluate.
+        """
+        label = node.head
+        if node.address is not None:
+            depth, index = node.address
+            if depth < len(lambdas):
+                return ("slot", depth, index)
+            return ("constant", self.primitiveValues[index])
+        if type(label) is Token:
+            if label.getType() == "INT":
+                return ("constant", int(label.getValue()))
+            if label.getType() in ("STRING", "TRUTHVALUE"):
+                return ("constant", label.getValue())
+            name, line = label.getValue(), label.getLineNumber()
+        elif label in NAMED_KEYWORDS:
+            name, line = label, 0
+        else:
+            return None
+        # Looked up by name like Environment.lookUpValue: the innermost, last slot first
+        for depth in range(len(lambdas)):
+            names = variableNames(lambdas[-1 - depth])
+            for index in range(len(names) - 1, -1, -1):
+                if names[index] == name:
+                    return ("slot", depth, index)
+        for index in range(len(self.primitiveNames) - 1, -1, -1):
+            if self.primitiveNames[index] == name:
+                return ("constant", self.primitiveValues[index])
+        return ("undeclared", name, line)
+
+    def number(self, node, lambdas):
+        """
+        Numbers the lambdas in the order CSGenerator numbers its control structures, and
+        finds the lambdas whose variables are read inside a nested lambda.
+        """
+        if node.head == "lambda":
+            self.numbers[id(node)] = self.newDelta()
+            lambdas.append(node)
+            self.number(node.child[1], lambdas)
+            lambdas.pop()
+            return
+        if node.head == "->":
+            self.newDelta()
+            self.number(node.child[1], lambdas)
+            self.newDelta()
+            self.number(node.child[2], lambdas)
+            self.number(node.child[0], lambdas)
+            return
+        if not node.child:
+            binding = self.binding(node, lambdas)
+            if binding is not None and binding[0] == "slot" and binding[1] > 0:
+                self.captured.add(id(lambdas[-1 - binding[1]]))
+            return
+        children = node.child
+        if node.head not in ("gamma", "tau") and node.head not in BINARY_OPERATORS and node.head not in UNARY_OPERATORS:
+            # Only the first two children of an illegal node are evaluated
+            children = children[:2]
+        for child in children:
+            self.number(child, lambdas)
+
+    def isPrimitive(self, node, value):
+        """
+        Checks whether the node is an identifier bound to the given primitive value.
+        """
+        if node.child or node.address is None:
+            return False
+        return self.binding(node, [scope.node for scope in self.scopes[1:]]) == ("constant", value)
+
+    def slotName(self, node):
+        """
+        Returns the Python variable read by the leaf node, or None if it reads no slot.
+        """
+        binding = self.binding(node, [scope.node for scope in self.scopes[1:]])
+        if binding is None or binding[0] != "slot":
+            return None
+        return self.scopes[-1 - binding[1]].names[binding[2]]
+
+    def emit(self, statement):
+        self.scopes[-1].statements.append(statement)
+
+    def temporary(self, expression):
+        """
+        Assigns the expression to a new temporary and returns the temporary as a Value.
+        """
+        self.temporaries += 1
+        name = f"_t{self.temporaries}"
+        self.emit(ast.Assign(targets=[store(name)], value=expression))
+        return Value(load(name), True)
+
+    def evaluate(self, nodes, rator=None):
+        """
+        Compiles the nodes in the given evaluation order.
+        A value that may fail is assigned to a temporary before the statements of a later
+        node, and at most one such value is left for Python to evaluate, so errors are
+        raised in the order of the CSE machine.
+        Args:
+            nodes (list): The nodes, the first evaluated first.
+            rator (Node, optional): The node among them that is the function of an application.
+        Returns:
+            list: The Value of each node, in the same order.
+        """
+        values = []
+        for node in nodes:
+            statements = self.scopes[-1].statements
+            mark = len(statements)
+            value = self.compileValue(node, rator=node is rator)
+            if len(statements) > mark:
+                pending = statements[mark:]
+                del statements[mark:]
+                for index in range(len(values)):
+                    if not values[index].simple:
+                        values[index] = self.temporary(values[index].expression)
+                statements.extend(pending)
+            values.append(value)
+        failing = [index for index in range(len(values)) if not values[index].simple]
+        for index in failing[:-1]:
+            values[index] = self.temporary(values[index].expression)
+        return values
+
+    def compileLeaf(self, node):
+        binding = self.binding(node, [scope.node for scope in self.scopes[1:]])
+        if binding is None:
+            return self.compileIllegal(node)
+        if binding[0] == "slot":
+            return Value(load(self.slotName(node)), True)
+        if binding[0] == "constant":
+            if binding[1] is Nil or binding[1] is Dummy:
+                # Singletons are names of the machine's namespace, not literals
+                return Value(load("Nil" if binding[1] is Nil else "Dummy"), True)
+            return Value(ast.Constant(value=binding[1]), True)
+        return Value(call("undeclared", ast.Constant(value=binding[1]), ast.Constant(value=binding[2])))
+
+    def compileIllegal(self, node):
+        """
+        Nodes no machine can evaluate: their first two children are evaluated, then the
+        program stops, as on the CSE machine.
+        """
+        values = self.evaluate(list(reversed(node.child[:2])))
+        for value in values:
+            if not value.simple:
+                self.emit(ast.Expr(value=value.expression))
+        self.emit(ast.Raise(exc=call("illegal"), cause=None))
+        return Value(ast.Constant(value=None), True)
+
+    def compileOperator(self, node):
+        operator = node.head
+        if operator in UNARY_OPERATORS:
+            if len(node.child) != 1:
+                raise RPALException(f"Operator '{operator}' must have exactly one operand")
+            operand = self.compileValue(node.child[0])
+            python = ast.Not() if operator == "not" else ast.USub()
+            return Value(ast.UnaryOp(op=python, operand=operand.expression))
+        if len(node.child) != 2:
+            raise RPALException(f"Operator '{operator}' must have exactly two operands")
+        right, left = self.evaluate([node.child[1], node.child[0]])
+        if operator in ARITHMETIC_OPERATORS:
+            expression = ast.BinOp(left=left.expression, op=ARITHMETIC_OPERATORS[operator](), right=right.expression)
+        elif operator in COMPARISON_OPERATORS:
+            expression = ast.Compare(left=left.expression, ops=[COMPARISON_OPERATORS[operator]()], comparators=[right.expression])
+        else:
+            expression = call(OPERATOR_FUNCTIONS[operator], left.expression, right.expression)
+        return Value(expression)
+
+    def compileTuple(self, node):
+        if len(node.child) < 2:
+            raise RPALException("Node with head 'tau' must have at least two children")
+        values = self.evaluate(list(reversed(node.child)))
+        elements = ast.List(elts=[value.expression for value in reversed(values)], ctx=ast.Load())
+        return Value(call("makeTupleOf", elements))
+
+    def compileConditional(self, node, tail):
+        if len(node.child) != 3:
+            raise RPALException("Node with head '->' must have exactly three children")
+        condition = self.compileValue(node.child[0])
+        scope = self.scopes[-1]
+        statements = scope.statements
+        if tail:
+            scope.statements = then = []
+            self.compileTail(node.child[1])
+            scope.statements = other = []
+            self.compileTail(node.child[2])
+            scope.statements = statements
+            self.emit(ast.If(test=condition.expression, body=then, orelse=other))
+            return None
+        scope.statements = then = []
+        thenValue = self.compileValue(node.child[1])
+        scope.statements = other = []
+        otherValue = self.compileValue(node.child[2])
+        scope.statements = statements
+        if not then and not other:
+            return Value(ast.IfExp(test=condition.expression, body=thenValue.expression, orelse=otherValue.expression))
+        self.temporaries += 1
+        name = f"_t{self.temporaries}"
+        then.append(ast.Assign(targets=[store(name)], value=thenValue.expression))
+        other.append(ast.Assign(targets=[store(name)], value=otherValue.expression))
+        self.emit(ast.If(test=condition.expression, body=then, orelse=other))
+        return Value(load(name), True)
+
+    def compileApplication(self, node, tail, rator=False):
+        if len(node.child) != 2:
+            raise RPALException("Node with head 'gamma' must have exactly two children")
+        function, argument = node.child
+        if function.head == "gamma" and len(function.child) == 2 and self.isPrimitive(function.child[0], "conc"):
+            # Conc applied to both operands
+            second, first = self.evaluate([argument, function.child[1]])
+            return Value(call("concatenate", first.expression, second.expression))
+        if self.isPrimitive(function, "Y") and argument.head == "lambda" and argument.child[0].head != "," and argument.child[1].head == "lambda":
+            # rec f = fn ...: rule 12 binds f to the closure of the inner lambda itself
+            self.fixpoints.add(id(argument))
+
+        scope = self.scopes[-1]
+        if tail and scope.selfName is not None and not function.child:
+            if self.slotName(function) == scope.selfName:
+                # The function calls itself in a tail position: restart it with the argument
+                value = self.evaluate([argument])[0]
+                parameter = scope.names[0] if len(scope.names) == 1 else "argument"
+                self.emit(ast.Assign(targets=[store(parameter)], value=value.expression))
+                self.emit(ast.Continue())
+                scope.loops = True
+                return None
+
+        curried = function.head == "gamma"
+        value, operator = self.evaluate([argument, function], rator=function if curried else None)
+        applyName = "applyRator" if curried else "applyValue"
+        if type(operator.expression) is ast.Constant:
+            expression = call(applyName, operator.expression, value.expression)
+        else:
+            if not operator.simple:
+                operator = self.temporary(operator.expression)
+            closure = operator.expression
+            expression = ast.IfExp(
+                test=ast.Compare(left=call("type", closure), ops=[ast.Is()], comparators=[load("Closure")]),
+                body=ast.Call(func=ast.Attribute(value=closure, attr="c", ctx=ast.Load()), args=[value.expression], keywords=[]),
+                orelse=call(applyName, closure, value.expression))
+        if tail:
+            if scope.node is not None and type(operator.expression) is not ast.Constant:
+                # A closure applied in a tail position is called by the caller's loop, so
+                # tail calls run in constant Python stack
+                expression.body = call("TailCall", closure, value.expression)
+            self.emit(ast.Return(value=expression))
+            return None
+        result = self.temporary(expression)
+        if type(operator.expression) is not ast.Constant:
+            # Make the tail calls the closure returned
+            self.emit(ast.While(
+                test=ast.Compare(left=call("type", result.expression), ops=[ast.Is()], comparators=[load("TailCall")]),
+                body=[ast.Assign(targets=[store(result.expression.id)], value=ast.Call(
+                    func=ast.Attribute(value=ast.Attribute(value=result.expression, attr="function", ctx=ast.Load()), attr="c", ctx=ast.Load()),
+                    args=[ast.Attribute(value=result.expression, attr="argument", ctx=ast.Load())], keywords=[]))],
+                orelse=[]))
+        return result
+
+    def compileFunction(self, node):
+        """
+        Generates the Python function of a lambda and returns the Value of its closure.
+        """
+        if node.child[0].head == ",":
+            if len(node.child[0].child) < 1:
+                raise RPALException("Lambda node with ',' must have at least one variable")
+        elif len(node.child) != 2:
+            raise RPALException("Lambda node must have exactly two children")
+        k = self.numbers[id(node)]
+        names = variableNames(node)
+        parent = self.scopes[-1]
+        scope = FunctionScope(node, k, [pythonName(name, k, index) for index, name in enumerate(names)])
+        if node.child[1].head == "lambda":
+            self.innerLambdas.append(k)
+        if node.memoize:
+            self.memoized.append(k)
+        elif id(parent.node) in self.fixpoints and parent.node.child[1] is node and id(node) not in self.captured:
+            scope.selfName = parent.names[0]
+
+        self.scopes.append(scope)
+        self.compileTail(node.child[1])
+        self.scopes.pop()
+        body = scope.statements
+        if len(names) == 1:
+            parameter = scope.names[0]
+        else:
+            parameter = "argument"
+            unpack = ast.Assign(
+                targets=[ast.Tuple(elts=[store(name) for name in scope.names], ctx=ast.Store())],
+                value=call("bind", load(parameter), ast.Constant(value=len(names))))
+            body.insert(0, unpack)
+        if scope.loops:
+            body = [ast.While(test=ast.Constant(value=True), body=body, orelse=[])]
+        function = f"lambda_{k}"
+        self.emit(ast.FunctionDef(
+            name=function,
+            args=ast.arguments(posonlyargs=[], args=[ast.arg(arg=parameter)], kwonlyargs=[], kw_defaults=[], defaults=[]),
+            body=body, decorator_list=[], returns=None))
+        return Value(call("makeClosure", ast.Constant(value=k), ast.Constant(value=tuple(names)), load(function)))
+
+    def compileValue(self, node, rator=False):
+        """
+        Compiles the node, emitting the statements it needs, and returns its Value.
+        Args:
+            node (Node): The ST node to compile.
+            rator (bool): Whether the node is the function of an application.
+        Returns:
+            Value: The expression computing the node.
+        """
+        if node.head == "lambda":
+            return self.compileFunction(node)
+        if node.head == "->":
+            return self.compileConditional(node, False)
+        if node.head == "tau":
+            return self.compileTuple(node)
+        if not node.child:
+            return self.compileLeaf(node)
+        if node.head == "gamma":
+            return self.compileApplication(node, False, rator)
+        if node.head in BINARY_OPERATORS or node.head in UNARY_OPERATORS:
+            return self.compileOperator(node)
+        return self.compileIllegal(node)
+
+    def compileTail(self, node):
+        """
+        Compiles the node as the result of the function being generated, ending every path
+        with a return, or with a restart of the function.
+        """
+        if node.head == "->":
+            self.compileConditional(node, True)
+        elif node.head == "gamma" and len(node.child) == 2:
+            value = self.compileApplication(node, True)
+            if value is not None:
+                self.emit(ast.Return(value=value.expression))
+        else:
+            self.emit(ast.Return(value=self.compileValue(node).expression))
+
+    def transpile(self, node):
+        """
+        Entry point for translating the ST.
+        Args:
+            node (Node): The root node of the Standardized Tree, resolved by the LexicalResolver.
+        Returns:
+            ast.Module: The module defining program(), INNER_LAMBDAS and MEMOIZED.
+        """
+        if node is None:
+            raise RPALException("Node cannot be None")
+        self.newDelta()
+        self.number(node, [])
+        program = FunctionScope()
+        self.scopes = [program]
+        self.compileTail(node)
+        self.scopes = []
+        noArguments = ast.arguments(posonlyargs=[], args=[], kwonlyargs=[], kw_defaults=[], defaults=[])
+        module = ast.Module(body=[
+            ast.FunctionDef(name="program", args=noArguments, body=program.statements, decorator_list=[], returns=None),
+            ast.Assign(targets=[store("INNER_LAMBDAS")], value=ast.Constant(value=tuple(self.innerLambdas))),
+            ast.Assign(targets=[store("MEMOIZED")], value=ast.Constant(value=tuple(self.memoized))),
+        ], type_ignores=[])
+        return ast.fix_missing_locations(module)
+
+    def compile(self, node):
+        """
+        Translates the ST and compiles the module.
+        Args:
+            node (Node): The root node of the Standardized Tree, resolved by the LexicalResolver.
+        Returns:
+            code: The code object of the module, run by the PythonMachine.
+        """
+        module = self.transpile(node)
+        try:
+            return compile(module, "<rpal>", "exec")
+        except (RecursionError, MemoryError):
+            raise RPALException("Program is too deeply nested for the python engine.")
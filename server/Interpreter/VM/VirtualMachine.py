@@ -0,0 +1,393 @@
+from Interpreter.Environment.Environment import Environment
+from Interpreter.Exception.RPALException import RPALException
+from Interpreter.CSE.CSEMachine import BUILTIN_FUNCTIONS, BUILTIN_OPERATORS, printableValue, recursiveClosure
+from Interpreter.CSE.generateCS import Eta
+from Interpreter.CSE.memo import MemoCache, MemoStatistics, addStore, memoKey, storeResults
+from Interpreter.CSE.values import Closure, Dummy, Nil, Tuple, conc, isString, makeTuple, stem, stern, stripQuotes
+from Interpreter.VM.generateBytecode import (
+    HALT, LOAD_NAME, LOAD_CONST, MAKE_CLOSURE, APPLY, RETURN, BETA, JUMP, TAU, ADD, SUB, MUL,
+    DIV, EQ, GR, GE, LS, LE, AUG, POW, NOT, NEG, ILLEGAL, LOAD_LOCAL, LOAD_OUTER, TAIL_APPLY,
+    OPCODE_NAMES, MAX_SLOT_INDEX,
+)
+
+class VirtualMachine:
+    """
+    The VirtualMachine executes the flat bytecode produced by BytecodeGenerator.
+    It follows the same rules as the CSEMachine, but the control stack is replaced by a
+    program counter and a stack of return frames, and every instruction is dispatched
+    through a jump table indexed by its opcode.
+    Closures are Closure instances whose c holds the defining Environment itself.
+    """
+
+    def __init__(self, program, environment):
+        """
+        Initializes the VirtualMachine with the given program and primitive environment.
+        """
+        if len(program.entries) == 0 or program.entries[0] < 0:
+            raise RPALException("Program has no entry point.")
+        self.program = program
+        self.stack = []
+        # (return pc, environment, pending memo stores) of every active function application
+        self.frames = []
+        self.memoStatistics = MemoStatistics()
+        self.currentEnvironment = environment
+        self.totalEnvironments = 1
+        self.pc = program.entries[0]
+        self.running = False
+
+        handlers = [None] * len(OPCODE_NAMES)
+        handlers[HALT] = self.halt
+        handlers[LOAD_NAME] = self.loadName
+        handlers[LOAD_CONST] = self.loadConst
+        handlers[MAKE_CLOSURE] = self.makeClosure
+        handlers[APPLY] = self.apply
+        handlers[RETURN] = self.ret
+        handlers[BETA] = self.beta
+        handlers[JUMP] = self.jump
+        handlers[TAU] = self.tau
+        handlers[ADD] = self.add
+        handlers[SUB] = self.sub
+        handlers[MUL] = self.mul
+        handlers[DIV] = self.div
+        handlers[EQ] = self.eq
+        handlers[GR] = self.gr
+        handlers[GE] = self.ge
+        handlers[LS] = self.ls
+        handlers[LE] = self.le
+        handlers[AUG] = self.aug
+        handlers[POW] = self.pow
+        handlers[NOT] = self.logicalNot
+        handlers[NEG] = self.neg
+        handlers[ILLEGAL] = self.illegal
+        handlers[LOAD_LOCAL] = self.loadLocal
+        handlers[LOAD_OUTER] = self.loadOuter
+        handlers[TAIL_APPLY] = self.tailApply
+        self.handlers = handlers
+
+    def statistics(self):
+        """
+        Returns the counters of the run, such as the memo hits of the recursive functions.
+        """
+        return self.memoStatistics.asDict()
+
+    def halt(self, arg):
+        self.running = False
+
+    def loadName(self, arg):
+        """
+        Rule 1 for identifiers: looks the name up in the current environment.
+        """
+        self.stack.append(self.currentEnvironment.lookUpValue(self.program.names[arg]))
+
+    def loadLocal(self, arg):
+        """
+        Rule 1 for an identifier bound by the innermost lambda.
+        """
+        self.stack.append(self.currentEnvironment.values[arg])
+
+    def loadOuter(self, arg):
+        """
+        Rule 1 for an identifier bound arg >> 16 environments up the chain.
+        """
+        env = self.currentEnvironment
+        for _ in range(arg >> 16):
+            env = env.parent
+        self.stack.append(env.values[arg & MAX_SLOT_INDEX])
+
+    def loadConst(self, arg):
+        """
+        Rule 1 for literals, which are resolved at compile time.
+        """
+        self.stack.append(self.program.constants[arg])
+
+    def makeClosure(self, arg):
+        """
+        Rule 2: pushes a closure of the lambda over the current environment.
+        """
+        template = self.program.lambdas[arg]
+        self.stack.append(Closure(template.k, template.variables, template.names, self.currentEnvironment))
+
+    def ret(self, arg):
+        """
+        Rule 5: leaves the current environment and resumes the caller.
+        """
+        self.pc, self.currentEnvironment, stores = self.frames.pop()
+        if stores is not None:
+            storeResults(stores, self.stack[-1])
+
+    def beta(self, arg):
+        """
+        Rule 8: jumps to the 'then' branch when the condition holds, otherwise falls through
+        to the 'else' branch.
+        """
+        if self.stack.pop():
+            self.pc = arg
+
+    def jump(self, arg):
+        self.pc = arg
+
+    def tau(self, arg):
+        """
+        Rule 9: collects the top arg values into a tuple.
+        """
+        stack = self.stack
+        if len(stack) > 0 and stack[-1] is Nil:
+            return
+        listOfElements = []
+        for i in range(arg):
+            if len(stack) == 0:
+                return
+            element = stack.pop()
+            if isString(element):
+                element = stripQuotes(element)
+            listOfElements.append(element)
+        stack.append(makeTuple(listOfElements))
+
+    def add(self, arg):
+        stack = self.stack
+        operand1 = stack.pop()
+        stack[-1] = operand1 + stack[-1]
+
+    def sub(self, arg):
+        stack = self.stack
+        operand1 = stack.pop()
+        stack[-1] = operand1 - stack[-1]
+
+    def mul(self, arg):
+        stack = self.stack
+        operand1 = stack.pop()
+        stack[-1] = operand1 * stack[-1]
+
+    def div(self, arg):
+        stack = self.stack
+        operand1 = stack.pop()
+        if stack[-1] == 0:
+            raise RPALException("Division by zero.")
+        stack[-1] = int(operand1 / stack[-1])
+
+    def eq(self, arg):
+        stack = self.stack
+        operand1 = stack.pop()
+        stack[-1] = (operand1 == stack[-1])
+
+    def gr(self, arg):
+        stack = self.stack
+        operand1 = stack.pop()
+        stack[-1] = (operand1 > stack[-1])
+
+    def ge(self, arg):
+        stack = self.stack
+        operand1 = stack.pop()
+        stack[-1] = (operand1 >= stack[-1])
+
+    def ls(self, arg):
+        stack = self.stack
+        operand1 = stack.pop()
+        stack[-1] = (operand1 < stack[-1])
+
+    def le(self, arg):
+        stack = self.stack
+        operand1 = stack.pop()
+        stack[-1] = (operand1 <= stack[-1])
+
+    def aug(self, arg):
+        stack = self.stack
+        operand1 = stack.pop()
+        if operand1 is Nil:
+            stack[-1] = makeTuple([stack[-1]])
+        elif type(operand1) is Tuple:
+            stack[-1] = operand1.aug(stack[-1])
+        else:
+            raise RPALException("Left operand of 'aug' must be a tuple or nil.")
+
+    def pow(self, arg):
+        stack = self.stack
+        operand1 = stack.pop()
+        operand2 = stack[-1]
+        if type(operand1) is not int or type(operand2) is not int:
+            raise RPALException("Both operands must be integers for '**' operation.")
+        stack[-1] = operand1 ** operand2
+
+    def logicalNot(self, arg):
+        self.stack[-1] = not self.stack[-1]
+
+    def neg(self, arg):
+        self.stack[-1] = -self.stack[-1]
+
+    def illegal(self, arg):
+        raise RPALException(f"Illegal Function Appication")
+
+    def apply(self, arg):
+        """
+        Gamma: dispatches on the value being applied, in the same order as the CSEMachine
+        checks rules 3, 4, 10, 11, 12, 13 and the built-in functions.
+        """
+        rator = self.stack[-1]
+        if type(rator) is str and rator in BUILTIN_OPERATORS:
+            self.builtinOperator()
+        elif type(rator) is Closure:
+            self.applyLambda()
+        elif type(rator) is Tuple and len(rator) > 0:
+            self.select()
+        elif type(rator) is str and rator == "Y":
+            stack = self.stack
+            stack.pop()
+            lambdaControl = stack.pop()
+            if type(lambdaControl) is not Closure:
+                raise RPALException("Expected a Lambda control structure on the stack for 'gamma' operation.")
+            program = self.program
+            entry = program.entries[lambdaControl.k]
+            if len(lambdaControl.names) == 1 and program.ops[entry] == MAKE_CLOSURE and program.ops[entry + 1] == RETURN:
+                # rec f = fn ...: bind f to the function itself, as rule 12 does
+                body = program.lambdas[program.args[entry]]
+                closure = recursiveClosure(lambdaControl, body, self.totalEnvironments)
+                self.totalEnvironments += 1
+                if body.memoize:
+                    closure.cache = MemoCache(self.memoStatistics)
+                stack.append(closure)
+            else:
+                stack.append(Eta(lambdaControl))
+        elif type(rator) is Eta:
+            # Rule 13: apply the unfolded lambda to the eta itself, then run this gamma again
+            self.stack.append(rator.toClosure())
+            self.pc -= 1
+            self.applyLambda()
+        elif rator in BUILTIN_FUNCTIONS:
+            self.stack.pop()
+            value = printableValue(self.stack.pop())
+            self.stack.append(value)
+            print(value, end="")
+        else:
+            raise RPALException(f"Illegal Function Appication")
+
+    def tailApply(self, arg):
+        """
+        Gamma in a tail position: a lambda is entered without saving the current frame, so its
+        RETURN goes straight back to the caller of the current function. Any other value is
+        applied as usual.
+        """
+        if type(self.stack[-1]) is Closure:
+            self.applyLambda(tail=True)
+        else:
+            self.apply(arg)
+
+    def applyLambda(self, tail=False):
+        """
+        Rules 4 and 11: binds the argument(s) in a new environment and enters the lambda body.
+        With tail set, the current frame is replaced instead of saved.
+        """
+        stack = self.stack
+        lambdaControl = stack.pop()
+        value = stack.pop()
+        names = lambdaControl.names
+        if len(names) == 1:
+            slots = [value]
+        else:
+            if type(value) is not Tuple:
+                raise RPALException("Expected a list of names on the stack for 'gamma' operation.")
+            if len(value) != len(names):
+                raise RPALException("Number of names does not match number of variables in lambda.")
+            slots = value.elements()
+        # A memoized recursive closure answers from its cache when it knows the argument
+        key = memoKey(value) if lambdaControl.cache is not None else None
+        if key is not None:
+            found, result = lambdaControl.cache.lookUp(key)
+            if found:
+                stack.append(result)
+                return
+        if not tail:
+            stores = None if key is None else addStore(None, lambdaControl.cache, key)
+            self.frames.append((self.pc, self.currentEnvironment, stores))
+        elif key is not None:
+            # The callee answers the call of the current frame as well
+            pc, environment, stores = self.frames[-1]
+            self.frames[-1] = (pc, environment, addStore(stores, lambdaControl.cache, key))
+        self.currentEnvironment = Environment(self.totalEnvironments, lambdaControl.c, names=names, values=slots)
+        self.totalEnvironments += 1
+        self.pc = self.program.entries[lambdaControl.k]
+
+    def select(self):
+        """
+        Rule 10: selects a tuple element (1-based indexing).
+        """
+        stack = self.stack
+        tupleElements = stack.pop()
+        index = stack.pop()
+        if not isinstance(index, int):
+            raise RPALException("Index must be an integer.")
+        if index < 0 or index-1 >= len(tupleElements):
+            raise RPALException("Index out of bounds for tuple elements.")
+        stack.append(tupleElements[index-1])
+
+    def builtinOperator(self):
+        """
+        Rule 3: applies one of the built-in operators (Conc, Stem, Isinteger, ...).
+        """
+        stack = self.stack
+        operator = stack.pop()
+        if operator == 'conc':
+            # Conc is binary, so it consumes the following gamma as well
+            if self.program.ops[self.pc] != APPLY and self.program.ops[self.pc] != TAIL_APPLY:
+                raise RPALException("Both operands must be strings for 'conc' operation.")
+            self.pc += 1
+            value1 = stack.pop()
+            value2 = stack.pop()
+            if not isString(value1) or not isString(value2):
+                raise RPALException("Both operands must be strings for 'conc' operation.")
+            result = conc(value1, value2)
+        elif operator == 'stem':
+            value = stack.pop()
+            if not isString(value):
+                raise RPALException("Operand must be a string for 'stem' operation.")
+            result = stem(value)
+        elif operator == 'stern':
+            value = stack.pop()
+            if not isString(value):
+                raise RPALException("Operand must be a string for 'stern' operation.")
+            result = stern(value)
+        elif operator == 'isInteger':
+            result = isinstance(stack.pop(), int)
+        elif operator == 'isString':
+            result = isString(stack.pop())
+        elif operator == 'isTruthValue':
+            result = isinstance(stack.pop(), bool)
+        elif operator == 'isFunction':
+            value = stack.pop()
+            result = type(value) is Closure or type(value) is Eta
+        elif operator == 'isTuple':
+            value = stack.pop()
+            result = isinstance(value, Tuple) and len(value) > 0
+        elif operator == 'isDummy':
+            value = stack.pop()
+            result = value is Dummy
+        elif operator == "order":
+            value = stack.pop()
+            if type(value) is not Tuple:
+                raise RPALException("Operand must be a list for 'order' operation.")
+            result = len(value)
+        else:
+            value = stack.pop()
+            if value is Nil:
+                result = True
+            else:
+                if type(value) is not Tuple:
+                    raise RPALException("Operand must be a list for 'null' operation.")
+                result = (len(value) == 0)
+        stack.append(result)
+
+    def interpret(self):
+        """
+        Main interpreter loop.
+        Fetches the instruction at pc and dispatches it through the jump table until HALT.
+        Returns the final result of the computation.
+        """
+        ops = self.program.ops
+        args = self.program.args
+        handlers = self.handlers
+        self.running = True
+        while self.running:
+            pc = self.pc
+            self.pc = pc + 1
+            handlers[ops[pc]](args[pc])
+
+        return self.stack[-1] if len(self.stack) > 0 else None
@@ -0,0 +1,278 @@
+from array import array
+
+from Interpreter.Exception.RPALException import RPALException
+from Interpreter.CSE.generateCS import Lambda
+from Interpreter.Tokenizer.tokenizer import Token
+
+# Opcodes understood by the VirtualMachine. Each one indexes the machine's jump table,
+# so the numbering must stay dense and start at 0.
+HALT = 0
+LOAD_NAME = 1      # operand: index into Program.names
+LOAD_CONST = 2     # operand: index into Program.constants
+MAKE_CLOSURE = 3   # operand: index into Program.lambdas
+APPLY = 4
+RETURN = 5
+BETA = 6           # operand: pc of the 'then' branch, taken when the condition is true
+JUMP = 7           # operand: target pc
+TAU = 8            # operand: number of tuple elements
+ADD = 9
+SUB = 10
+MUL = 11
+DIV = 12
+EQ = 13
+GR = 14
+GE = 15
+LS = 16
+LE = 17
+AUG = 18
+POW = 19
+NOT = 20
+NEG = 21
+ILLEGAL = 22
+LOAD_LOCAL = 23    # operand: slot index in the current environment
+LOAD_OUTER = 24    # operand: depth << 16 | slot index
+TAIL_APPLY = 25    # APPLY whose result is returned by the enclosing lambda
+
+OPCODE_NAMES = [
+    "HALT", "LOAD_NAME", "LOAD_CONST", "MAKE_CLOSURE", "APPLY", "RETURN", "BETA", "JUMP",
+    "TAU", "ADD", "SUB", "MUL", "DIV", "EQ", "GR", "GE", "LS", "LE", "AUG", "POW", "NOT",
+    "NEG", "ILLEGAL", "LOAD_LOCAL", "LOAD_OUTER", "TAIL_APPLY",
+]
+
+# Operators the CSE machine handles through rule 6 and rule 7
+OPERATOR_OPCODES = {
+    "+": ADD, "-": SUB, "*": MUL, "/": DIV, "eq": EQ, "gr": GR, "ge": GE, "ls": LS,
+    "le": LE, "aug": AUG, "**": POW, "not": NOT, "neg": NEG,
+}
+
+# Largest depth and slot index that fit in a LOAD_OUTER operand
+MAX_OUTER_DEPTH = 0x7FFF
+MAX_SLOT_INDEX = 0xFFFF
+
+# Keywords the CSE machine resolves through the environment (rule 1)
+NAMED_KEYWORDS = ["nil", "Y", "Print"]
+
+
+class Branch:
+    """
+    Placeholder for a conditional inside a block under construction.
+    Holds the 'then' and 'else' blocks which are laid out inline when the block is flattened.
+    """
+    def __init__(self, thenBlock, elseBlock):
+        self.thenBlock = thenBlock
+        self.elseBlock = elseBlock
+
+
+class Program:
+    """
+    Flat bytecode for a whole RPAL program.
+    All deltas share the same opcode/operand arrays; entries maps a delta number to the pc
+    of its first instruction (-1 for deltas that were inlined as conditional branches).
+    """
+    def __init__(self):
+        self.ops = array('B')
+        self.args = array('i')
+        self.entries = array('i')
+        self.constants = []
+        self.names = []
+        self.lambdas = []
+
+    def emit(self, op, arg=0):
+        """
+        Appends an instruction and returns its pc.
+        """
+        self.ops.append(op)
+        self.args.append(arg)
+        return len(self.ops) - 1
+
+    def disassemble(self):
+        """
+        Prints the instructions of the program, one per line.
+        """
+        starts = {pc: k for k, pc in enumerate(self.entries) if pc >= 0}
+        for pc in range(len(self.ops)):
+            if pc in starts:
+                print(f"delta {starts[pc]}:")
+            op, arg = self.ops[pc], self.args[pc]
+            if op == LOAD_NAME:
+                operand = self.names[arg].getValue() if type(self.names[arg]) is Token else self.names[arg]
+            elif op == LOAD_CONST:
+                operand = repr(self.constants[arg])
+            elif op == MAKE_CLOSURE:
+                operand = f"lambda {self.lambdas[arg].k}"
+            elif op in (BETA, JUMP, TAU, LOAD_LOCAL):
+                operand = arg
+            elif op == LOAD_OUTER:
+                operand = f"{arg >> 16}.{arg & MAX_SLOT_INDEX}"
+            else:
+                operand = ""
+            print(f"  {pc:5} {OPCODE_NAMES[op]:<12} {operand}")
+
+
+class BytecodeGenerator:
+    """
+    Compiles a Standardized Tree into flat bytecode for the VirtualMachine.
+    Deltas are numbered exactly like CSGenerator numbers its control structures, so closures
+    print the same way on both machines.
+    """
+    def __init__(self):
+        self.program = Program()
+        self.deltaCount = 0
+        self.blocks = {}
+        self.constantIndex = {}
+
+    def newDelta(self):
+        """
+        Reserves the next delta number.
+        """
+        number = self.deltaCount
+        self.deltaCount += 1
+        self.program.entries.append(-1)
+        return number
+
+    def addConstant(self, value):
+        key = (type(value), value)
+        if key not in self.constantIndex:
+            self.constantIndex[key] = len(self.program.constants)
+            self.program.constants.append(value)
+        return self.constantIndex[key]
+
+    def addName(self, name):
+        self.program.names.append(name)
+        return len(self.program.names) - 1
+
+    def createBlock(self, number, node):
+        """
+        Builds the block for delta 'number' from the given node.
+        """
+        block = []
+        self.blocks[number] = block
+        self.addToBlock(block, node)
+        return block
+
+    def addToBlock(self, block, node):
+        """
+        Appends instructions for the node to the block in control structure (preorder) order.
+        The block is reversed into execution order when it is flattened.
+        Args:
+            block (list): The block to add instructions to.
+            node (Node): The ST node to compile.
+        """
+        # Handle lambda abstraction nodes
+        if node.head == "lambda":
+            if node.child[0].head == ",":
+                variables = [var.head for var in node.child[0].child]
+                if len(variables) < 1:
+                    raise RPALException("Lambda node with ',' must have at least one variable")
+            else:
+                if len(node.child) != 2:
+                    raise RPALException("Lambda node must have exactly two children")
+                variables = node.child[0].head
+            k = self.newDelta()
+            self.createBlock(k, node.child[1])
+            lambdaControl = Lambda(k, variables)
+            lambdaControl.memoize = node.memoize
+            self.program.lambdas.append(lambdaControl)
+            block.append((MAKE_CLOSURE, len(self.program.lambdas) - 1))
+            return
+
+        # Handle conditional (if-then-else) nodes, the branches are inlined
+        if node.head == "->":
+            if len(node.child) != 3:
+                raise RPALException("Node with head '->' must have exactly three children")
+            self.newDelta()
+            thenBlock = []
+            self.addToBlock(thenBlock, node.child[1])
+            self.newDelta()
+            elseBlock = []
+            self.addToBlock(elseBlock, node.child[2])
+            block.append(Branch(thenBlock, elseBlock))
+            self.addToBlock(block, node.child[0])
+            return
+
+        # Handle tuple (tau) nodes
+        if node.head == "tau":
+            if len(node.child) < 2:
+                raise RPALException("Node with head 'tau' must have at least two children")
+            block.append((TAU, len(node.child)))
+            for child in node.child:
+                self.addToBlock(block, child)
+            return
+
+        # Handle all other nodes (e.g., operators, constants, identifiers)
+        label = node.head
+        if node.address is not None and node.address[1] <= MAX_SLOT_INDEX and node.address[0] <= MAX_OUTER_DEPTH:
+            # Identifier resolved by the LexicalResolver
+            depth, index = node.address
+            if depth == 0:
+                block.append((LOAD_LOCAL, index))
+            else:
+                block.append((LOAD_OUTER, depth << 16 | index))
+        elif type(label) is Token:
+            if label.getType() == "INT":
+                block.append((LOAD_CONST, self.addConstant(int(label.getValue()))))
+            elif label.getType() in ("STRING", "TRUTHVALUE"):
+                block.append((LOAD_CONST, self.addConstant(label.getValue())))
+            else:
+                block.append((LOAD_NAME, self.addName(label)))
+        elif label in NAMED_KEYWORDS:
+            block.append((LOAD_NAME, self.addName(label)))
+        elif label == "gamma":
+            block.append((APPLY, 0))
+        elif label in OPERATOR_OPCODES:
+            block.append((OPERATOR_OPCODES[label], 0))
+        else:
+            block.append((ILLEGAL, 0))
+        if node.child and len(node.child) > 0:
+            self.addToBlock(block, node.child[0])
+            if len(node.child) > 1:
+                self.addToBlock(block, node.child[1])
+
+    def flatten(self, block):
+        """
+        Emits the block into the program in execution order, laying out branches as jumps.
+        """
+        program = self.program
+        for item in reversed(block):
+            if type(item) is Branch:
+                beta = program.emit(BETA)
+                self.flatten(item.elseBlock)
+                jump = program.emit(JUMP)
+                program.args[beta] = len(program.ops)
+                self.flatten(item.thenBlock)
+                program.args[jump] = len(program.ops)
+            else:
+                program.emit(item[0], item[1])
+
+    def generate(self, node):
+        """
+        Entry point for generating bytecode from the ST.
+        Args:
+            node (Node): The root node of the Standardized Tree.
+        Returns:
+            Program: The compiled program, delta 0 being its entry point.
+        """
+        if node is None:
+            raise RPALException("Node cannot be None")
+        self.createBlock(self.newDelta(), node)
+        for number in sorted(self.blocks):
+            self.program.entries[number] = len(self.program.ops)
+            self.flatten(self.blocks[number])
+            self.program.emit(HALT if number == 0 else RETURN)
+        self.markTailCalls()
+        return self.program
+
+    def markTailCalls(self):
+        """
+        Turns every APPLY that is followed by RETURN, directly or through a JUMP, into
+        TAIL_APPLY, so the machine can enter the callee without keeping the caller's frame.
+        """
+        ops, args = self.program.ops, self.program.args
+        for pc in range(len(ops) - 1):
+            if ops[pc] != APPLY:
+                continue
+            following = pc + 1
+            if ops[following] == JUMP:
+                following = args[following]
+            if ops[following] == RETURN:
+                ops[pc] = TAIL_APPLY
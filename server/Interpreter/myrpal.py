@@ -3,7 +3,21 @@ from Interpreter.Parser.parser import Parser
 from Interpreter.Parser.standardizer import StandardizeAST
 from Interpreter.CSE.generateCS import CSGenerator
 from Interpreter.Environment.Environment import Environment
+from Interpreter.Environment.resolver import LexicalResolver
+from Interpreter.Optimizer.optimizer import Optimizer
+from Interpreter.Optimizer.memoizer import RecursionMemoizer
+from Interpreter.Optimizer.parallelizer import TupleParallelizer
 from Interpreter.CSE.CSEMachine import CSEMachine
+from Interpreter.CSE.trace import TRACE_WINDOW, TracingCSEMachine
+from Interpreter.CSE.profiler import ProfilingCSEMachine
+from Interpreter.CSE.values import Dummy, Nil, plainValue
+from Interpreter.VM.generateBytecode import BytecodeGenerator
+from Interpreter.VM.VirtualMachine import VirtualMachine
+from Interpreter.Closure.ClosureMachine import ClosureMachine
+from Interpreter.Transpiler.transpiler import PythonTranspiler
+from Interpreter.Transpiler.PythonMachine import PythonMachine
+from Interpreter.Cache.ArtifactStore import ArtifactStore, artifactKey
+from Interpreter.Cache.artifacts import ARTIFACT_KINDS
 import copy
 import multiprocessing
 import time
@@ -11,7 +25,10 @@ import time
 # Predefined primitive environment variables for the interpreter
 PRIMITIVE_ENVIRONMENT_VARIABLES = {
     "Print": "print",
-    "nil": "nil",
+    "nil": Nil,
+    "true": True,
+    "false": False,
+    "dummy": Dummy,
     "Y": "Y",
     "print": "print",
     "Conc": "conc",
@@ -27,6 +44,9 @@ PRIMITIVE_ENVIRONMENT_VARIABLES = {
     "Null": "null",
 }
 
+# Execution engines that can run the standardized tree
+ENGINES = ["cse", "vm", "closure", "python"]
+
 """
 Main entry for the program. Handles command-line args, reads the input file, and tokenizes its contents.
 
@@ -50,11 +70,16 @@ Behavior:
     - Handles errors gracefully.
 """
 
-def execute_with_timeout(code,sendAST=False, sendST=False, timeout=10):
+def execute_with_timeout(code,sendAST=False, sendST=False, timeout=10, engine="cse", optimize=1, memoize=False, parallel=False, trace=False, profile=False, traceStart=None, traceCount=TRACE_WINDOW):
+    # Errors raised in the child process never reach the caller, so the options are checked here
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine: {engine}")
+    if trace and profile:
+        raise ValueError("A run cannot be traced and profiled at once.")
     manager = multiprocessing.Manager()
     return_dict = manager.dict()
 
-    process = multiprocessing.Process(target=interpret, args=(code, return_dict, sendAST, sendST))
+    process = multiprocessing.Process(target=interpret, args=(code, return_dict, sendAST, sendST, engine, optimize, memoize, parallel, trace, profile, traceStart, traceCount))
     process.start()
     process.join(timeout)
 
@@ -65,49 +90,120 @@ def execute_with_timeout(code,sendAST=False, sendST=False, timeout=10):
 
     return return_dict.get("result", None)
 
-def interpret(code, return_dict,sendAST=False, sendST=False):
+def interpret(code, return_dict,sendAST=False, sendST=False, engine="cse", optimize=1, memoize=False, parallel=False, trace=False, profile=False, traceStart=None, traceCount=TRACE_WINDOW):
     """
     Main function to handle command-line arguments, file reading, tokenization,
     parsing, AST standardization, control structure generation, and interpretation.
+    engine selects the CSE machine ("cse"), the bytecode virtual machine ("vm"), the
+    machine running the tree compiled to Python closures ("closure") or the machine running
+    the tree translated to a Python module ("python").
+    optimize is the optimization level of the ST; 0 runs the tree exactly as standardized.
+    memoize caches the results of the recursive functions that never print.
+    parallel evaluates the costly components of tuples that never print in worker processes;
+    only the cse engine does, the other engines evaluate them in order.
+    trace records the last steps of the cse engine, returned as the state before them and the
+    changes every step made; the other engines are not traced. Only traceCount steps are
+    returned, from the step traceStart or, by default, the last ones; None returns them all.
+    profile attributes the steps, time and environments of the cse engine to the lambdas of
+    the program, returned as the top functions and the collapsed stacks for flame graphs.
+    Programs compiled for the cse, vm and python engines are kept in the ArtifactStore, so a
+    program run again skips the front end and the compilation.
     """
 
-    res = {"resAST": None, "resST": None, "resOut": None}
+    res = {"resAST": None, "resST": None, "resOut": None, "resStats": None, "resTrace": None, "resProfile": None}
     if not code:
         raise ValueError("No code provided for interpretation.")
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine: {engine}")
+    if trace and profile:
+        raise ValueError("A run cannot be traced and profiled at once.")
 
     
  
 
     # Read the input file and process its contents
     try:
-        # Tokenize the input lines
-        code_list = code.splitlines()
-        tokens = tokenize(code_list)
-        print(f"Tokens: {[str(token) for token in tokens]}")  # Debugging output
-        # Parse tokens into an AST
-        par = Parser(tokens)
-        ast = par.E()
-        if sendAST:
-            res["resAST"] = copy.deepcopy(ast)
-
-        # Optionally print the AST if requested
-            #sys.exit(0) # -ast.  This switch prints the abstract syntax tree, and nothing else.
-            
-
-        # Standardize the AST for further processing
-        StandardizeAST().standardize(ast)
-        if sendST:
-            res["resST"] = ast
-        # Generate control structures from the standardized AST
-        csGenerator = CSGenerator()
-        controlStructures = csGenerator.generate(ast)
-
         # Initialize the primitive environment
         primitiveEnvironment = Environment(0, variables=PRIMITIVE_ENVIRONMENT_VARIABLES)
-        # Create and run the CSE machine interpreter
-        machine = CSEMachine(controlStructures, primitiveEnvironment)
+        # Load the program compiled by an earlier run, unless the trees are requested
+        store = None
+        artifact = None
+        if engine in ARTIFACT_KINDS and not sendAST and not sendST:
+            store = ArtifactStore()
+            key = artifactKey(code, engine, optimize, memoize, parallel)
+            artifact = store.load(key, ARTIFACT_KINDS[engine])
+        cacheHit = artifact is not None
+
+        if artifact is None:
+            # Tokenize the input lines
+            code_list = code.splitlines()
+            tokens = tokenize(code_list)
+            print(f"Tokens: {[str(token) for token in tokens]}")  # Debugging output
+            # Parse tokens into an AST
+            par = Parser(tokens)
+            ast = par.E()
+            if sendAST:
+                res["resAST"] = copy.deepcopy(ast)
+
+            # Optionally print the AST if requested
+                #sys.exit(0) # -ast.  This switch prints the abstract syntax tree, and nothing else.
+            
+
+            # Standardize the AST for further processing
+            StandardizeAST().standardize(ast)
+            if sendST:
+                res["resST"] = copy.deepcopy(ast)
+            # Optimize the standardized AST
+            Optimizer(optimize).optimize(ast)
+            if memoize:
+                # Mark the recursive functions whose results can be cached
+                RecursionMemoizer().mark(ast)
+            if parallel and engine == "cse":
+                # Mark the tuples whose components are evaluated in worker processes
+                TupleParallelizer().mark(ast)
+            # Resolve identifiers to (depth, slot) addresses
+            LexicalResolver(primitiveEnvironment.names).resolve(ast)
+            if engine == "vm":
+                # Compile the standardized AST to bytecode
+                artifact = BytecodeGenerator().generate(ast)
+            elif engine == "closure":
+                # The closure machine compiles the standardized AST itself
+                artifact = ast
+            elif engine == "python":
+                # Translate the standardized AST to a Python module and compile it
+                artifact = PythonTranspiler(primitiveEnvironment).compile(ast)
+            else:
+                # Generate control structures from the standardized AST
+                csGenerator = CSGenerator()
+                artifact = csGenerator.generate(ast)
+            if store is not None:
+                store.store(key, ARTIFACT_KINDS[engine], artifact)
+
+        if engine == "vm":
+            # Run the bytecode on the virtual machine
+            machine = VirtualMachine(artifact, primitiveEnvironment)
+        elif engine == "closure":
+            # Compile the standardized AST to Python closures and run them
+            machine = ClosureMachine(artifact, primitiveEnvironment)
+        elif engine == "python":
+            # Run the compiled Python module
+            machine = PythonMachine(artifact, primitiveEnvironment)
+        elif profile:
+            # Run the CSE machine, attributing its costs to the lambdas
+            machine = ProfilingCSEMachine(artifact, primitiveEnvironment, parallel=parallel)
+        elif trace:
+            # Run the CSE machine, recording its steps
+            machine = TracingCSEMachine(artifact, primitiveEnvironment, parallel=parallel)
+        else:
+            # Create and run the CSE machine interpreter
+            machine = CSEMachine(artifact, primitiveEnvironment, parallel=parallel)
         output = machine.interpret()
-        res["resOut"] = output
+        res["resOut"] = plainValue(output)
+        res["resStats"] = dict(machine.statistics(), artifactCacheHit=cacheHit)
+        if type(machine) is TracingCSEMachine:
+            res["resTrace"] = machine.recorder.export(traceStart, traceCount)
+        if type(machine) is ProfilingCSEMachine:
+            res["resProfile"] = machine.profiler.export()
         return_dict["result"] = res
 
     except Exception as e:
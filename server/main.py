@@ -1,6 +1,8 @@
+from typing import Optional
 from fastapi import FastAPI
 from pydantic import BaseModel
 from Interpreter.myrpal import execute_with_timeout as interpret
+from Interpreter.CSE.trace import TRACE_WINDOW
 from fastapi.middleware.cors import CORSMiddleware
 
 TIM_LIMIT = 10  # seconds
@@ -8,6 +10,14 @@ class CodeInput(BaseModel):
     code: str
     ast : bool = False
     st : bool = False
+    engine : str = "cse"
+    optimize : int = 1
+    memoize : bool = False
+    parallel : bool = False
+    trace : bool = False
+    traceStart : Optional[int] = None
+    traceCount : Optional[int] = TRACE_WINDOW
+    profile : bool = False
 
 app = FastAPI()
 
@@ -42,10 +52,15 @@ async def health_check_head():
 async def interpret_code(code: CodeInput):
     print(f"Received code: {code.code}")
     try:
-        result = interpret(code.code, sendAST=code.ast, sendST=code.st, timeout=TIM_LIMIT)
+        result = interpret(code.code, sendAST=code.ast, sendST=code.st, timeout=TIM_LIMIT, engine=code.engine, optimize=code.optimize, memoize=code.memoize, parallel=code.parallel, trace=code.trace, profile=code.profile, traceStart=code.traceStart, traceCount=code.traceCount)
+        if result is None:
+            return {"error": "The interpretation failed without a result."}
         return {"result": result.get("resOut", None),
                 "ast": result.get("resAST", None),
-                "st": result.get("resST", None)}
+                "st": result.get("resST", None),
+                "stats": result.get("resStats", None),
+                "trace": result.get("resTrace", None),
+                "profile": result.get("resProfile", None)}
     except Exception as e:
         return {"error": str(e)}
     